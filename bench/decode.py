@@ -0,0 +1,73 @@
+# -*- Mode: Python -*-
+
+# decode speed of the generated python code for Pair and MsgA (test/t0.asn),
+#  with the fused tag/length fast paths versus the generic next_XXX() calls.
+# both run over the pure-python Decoder: with the cython codec the
+#  generated classes always use the generic calls.
+#
+# usage: python bench/decode.py
+
+import os
+import shutil
+import tempfile
+
+from asn1ate import parser
+from asn1ate.sema import build_semantic_model
+
+from tinyber import py_nodes
+from tinyber.walker import Walker
+from utils import load_pure, timeit
+
+class Args:
+    no_standalone = False
+
+def generate (name, path, fast):
+    with open (os.path.join ('test', 't0.asn')) as f:
+        modules = build_semantic_model (parser.parse_asn1 (f.read()))
+    saved = py_nodes.c_base_type.fast_lengths
+    if not fast:
+        # no fast path anywhere: every field goes through the generic call.
+        py_nodes.c_base_type.fast_lengths = lambda self: None
+    try:
+        walker = Walker (modules[0], py_nodes)
+        walker.walk()
+        py_nodes.PythonBackend (Args(), walker, name, path).generate_code()
+    finally:
+        py_nodes.c_base_type.fast_lengths = saved
+    return load_pure (name, os.path.join (path, name + '_ber.py'))
+
+def msga (m):
+    a = m.MsgA()
+    a.toctet = b'abcdefgh'
+    a.t8int = 50
+    a.t16int = 10001
+    a.t32int = 398234234
+    a.tarray = [m.Pair (a=i, b=100 + i) for i in range (4)]
+    a.tbool = True
+    a.tenum = m.Color ('blue')
+    return a
+
+def main():
+    path = tempfile.mkdtemp()
+    try:
+        generic = generate ('bench_generic', path, False)
+        fused = generate ('bench_fused', path, True)
+    finally:
+        shutil.rmtree (path)
+    print ('%8s %14s %14s %10s' % ('type', 'generic (us)', 'fused (us)', 'speedup'))
+    for name, make in (('Pair', lambda m: m.Pair (a=10, b=101)), ('MsgA', msga)):
+        data = make (generic).encode()
+        assert make (fused).encode() == data
+        times = []
+        for m in (generic, fused):
+            klass = getattr (m, name)
+
+            def run():
+                for i in range (1000):
+                    klass().decode (data)
+            times.append (timeit (run) * 1000)
+        print ('%8s %14.2f %14.2f %9.1fx' % (name, times[0], times[1], times[0] / times[1]))
+
+
+if __name__ == '__main__':
+    main()
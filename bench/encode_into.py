@@ -0,0 +1,59 @@
+# -*- Mode: Python -*-
+
+# encoding to bytes with a new Encoder per message (as encode() used to),
+#  with the per-thread pooled encoder (encode()), and into a preallocated
+#  buffer (encode_into()), for generated python over the pure-python codec
+#  and, when it is built, over tinyber._codec.
+#
+# usage: python bench/encode_into.py
+
+import os
+import shutil
+import sys
+import tempfile
+
+from tinyber import py_nodes
+from suite import Args, SCHEMAS, walk
+from utils import load_pure, load_source, timeit
+
+def bench (m, messages, label):
+    buffer = bytearray (1 << 20)
+    for name, type_name, msg in messages:
+        def fresh():
+            for i in range (100):
+                e = m.Encoder()
+                msg._encode (e)
+                e.done()
+
+        def pooled():
+            for i in range (100):
+                msg.encode()
+
+        def into():
+            for i in range (100):
+                msg.encode_into (buffer)
+        times = [timeit (fun, 0.5) / 100 for fun in (fresh, pooled, into)]
+        print ('%-8s %-14s %10.2f %10.2f %10.2f' % ((label, name) + tuple (t * 1e6 for t in times)))
+        sys.stdout.flush()
+
+def main():
+    path = tempfile.mkdtemp()
+    try:
+        print ('%-8s %-14s %10s %10s %10s' % ('codec', 'message', 'fresh us', 'pooled us', 'into us'))
+        for schema, filename, messages in SCHEMAS[:2]:
+            name = 'bench_into_' + schema
+            py_nodes.PythonBackend (Args(), walk (filename, py_nodes), name, path).generate_code()
+            py_path = os.path.join (path, name + '_ber.py')
+            bench (load_pure (name, py_path), messages (load_pure (name, py_path)), 'python')
+            try:
+                import tinyber._codec
+            except ImportError:
+                continue
+            m = load_source (name + '_codec', py_path)
+            bench (m, messages (m), '_codec')
+    finally:
+        shutil.rmtree (path)
+
+
+if __name__ == '__main__':
+    main()
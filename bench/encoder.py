@@ -0,0 +1,112 @@
+# -*- Mode: Python -*-
+
+# compare the pure-python Encoder against the original list-based
+#  encoder (which prepended every chunk with list.insert(0, ...)).
+#
+# usage: python bench/encoder.py [--legacy-limit N]
+
+import argparse
+
+from utils import pure_codec, timeit
+
+codec = pure_codec()
+TAG, FLAG = codec.TAG, codec.FLAG
+
+class ListEncoder:
+
+    # the encoder as it was before the switch to a reverse-filled bytearray.
+
+    def __init__ (self):
+        self.r = []
+        self.length = 0
+
+    def _chr (self, x):
+        return bytearray ((x,))
+
+    def emit (self, data):
+        self.r.insert (0, data)
+        self.length += len (data)
+
+    def emit_length (self, n):
+        if n < 0x80:
+            self.emit (self._chr (n))
+        else:
+            r = []
+            while n:
+                r.insert (0, self._chr (n & 0xff))
+                n >>= 8
+            r.insert (0, self._chr (0x80 | len (r)))
+            self.emit (bytearray().join (r))
+
+    def emit_tag (self, tag, flags=0):
+        if tag < 0x1f:
+            self.emit (self._chr (tag | flags))
+        else:
+            while tag:
+                if tag < 0x80:
+                    self.emit (self._chr (tag))
+                else:
+                    self.emit (self._chr ((tag & 0x7f) | 0x80))
+                tag >>= 7
+            self.emit (self._chr (0x1f | flags))
+
+    def TLV (self, tag, flags=0):
+        return codec.EncoderContext (self, tag, flags)
+
+    def done (self):
+        return bytearray().join (self.r)
+
+    def emit_integer (self, n):
+        i = 0
+        n0 = n
+        byte = 0x80
+        r = []
+        while 1:
+            n >>= 8
+            if n0 == n:
+                if n == -1 and ((not byte & 0x80) or i == 0):
+                    r.insert (0, self._chr (0xff))
+                    i = i + 1
+                elif n == 0 and (byte & 0x80):
+                    r.insert (0, self._chr (0x00))
+                    i = i + 1
+                break
+            else:
+                byte = n0 & 0xff
+                r.insert (0, self._chr (byte))
+                i += 1
+                n0 = n
+        self.emit (bytearray().join (r))
+
+    def emit_INTEGER (self, n):
+        with self.TLV (TAG.INTEGER):
+            self.emit_integer (n)
+
+# what a generated encoder emits for 'SEQUENCE OF Pair' (see test/t0.asn).
+def encode_pairs (enc, pairs):
+    with enc.TLV (TAG.SEQUENCE, FLAG.STRUCTURED):
+        for a, b in reversed (pairs):
+            with enc.TLV (TAG.SEQUENCE, FLAG.STRUCTURED):
+                enc.emit_INTEGER (b)
+                enc.emit_INTEGER (a)
+    return enc.done()
+
+def main():
+    p = argparse.ArgumentParser (description='pure-python Encoder benchmark')
+    p.add_argument ('--legacy-limit', type=int, default=10000,
+                    help="skip the (quadratic) list encoder above this many elements")
+    args = p.parse_args()
+    print ('%10s %14s %14s %10s' % ('elements', 'list (s)', 'bytearray (s)', 'speedup'))
+    for n in (10, 1000, 100000):
+        pairs = [(i & 0xff, 100 + (i % 100)) for i in range (n)]
+        new = timeit (lambda: encode_pairs (codec.Encoder(), pairs))
+        if n <= args.legacy_limit:
+            assert encode_pairs (ListEncoder(), pairs) == encode_pairs (codec.Encoder(), pairs)
+            old = timeit (lambda: encode_pairs (ListEncoder(), pairs))
+            print ('%10d %14.6f %14.6f %9.1fx' % (n, old, new, old / new))
+        else:
+            print ('%10d %14s %14.6f %10s' % (n, 'skipped', new, '-'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+# -*- Mode: Python -*-
+
+# code generator scaling: time each step of tinyber_gen (asn1ate parse,
+#  semantic model, walk, C and python output) on synthetic schemas of
+#  100, 1k and 10k types.  every type refers to two others, so the walker
+#  resolves two references per type.
+#
+# usage: python bench/generator.py [N ...]
+
+import shutil
+import sys
+import tempfile
+import time
+
+from asn1ate import parser
+from asn1ate.sema import build_semantic_model
+
+from tinyber import c_nodes, py_nodes
+from tinyber.walker import Walker
+
+class Args:
+    no_standalone = False
+
+def schema (n):
+    lines = [
+        'Synthetic DEFINITIONS ::= BEGIN',
+        '  Base ::= SEQUENCE { a INTEGER (0..255), b OCTET STRING SIZE (0..8) }',
+        '  T0 ::= SEQUENCE { x INTEGER (0..65535), base Base }',
+    ]
+    for i in range (1, n):
+        lines.append (
+            '  T%d ::= SEQUENCE { x INTEGER (0..65535), flag BOOLEAN, up T%d, items SEQUENCE SIZE (0..4) OF Base }' % (i, i // 2)
+        )
+    lines.append ('END')
+    return '\n'.join (lines) + '\n'
+
+def clock (times, name, fun):
+    t0 = time.time()
+    r = fun()
+    times.append ((name, time.time() - t0))
+    return r
+
+def run (n):
+    times = []
+    text = schema (n)
+    parse_tree = clock (times, 'parse', lambda: parser.parse_asn1 (text))
+    module = clock (times, 'sema', lambda: build_semantic_model (parse_tree)[0])
+    path = tempfile.mkdtemp()
+    try:
+        for lang, nodes, Backend in (('c', c_nodes, c_nodes.CBackend), ('python', py_nodes, py_nodes.PythonBackend)):
+            walker = Walker (module, nodes)
+            clock (times, 'walk/' + lang, walker.walk)
+            backend = Backend (Args(), walker, 'synthetic', path)
+            clock (times, 'gen/' + lang, backend.generate_code)
+    finally:
+        shutil.rmtree (path)
+    return times
+
+def main():
+    sizes = [int (x) for x in sys.argv[1:]] or [100, 1000, 10000]
+    for n in sizes:
+        times = run (n)
+        print ('%6d types: %s' % (n, '  '.join ('%s %.2fs' % (name, t) for name, t in times)))
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
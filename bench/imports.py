@@ -0,0 +1,88 @@
+# -*- Mode: Python -*-
+
+# import time of a large generated python module (the synthetic schema
+#  from generator.py, 1000 types by default), in three flavours:
+#
+#   standalone:  codec.py pasted into the module (the default)
+#   shared:      -ns, i.e. 'from tinyber.codec import *'
+#   lazy:        -ns --lazy, each class built on first use
+#
+# each import runs in a fresh interpreter, from an already compiled .pyc.
+#  'first use' is the time to then build (and instantiate) the type that
+#  refers to the most others, 'all' the time to build every class.
+#
+# usage: python bench/imports.py [N]
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from asn1ate import parser
+from asn1ate.sema import build_semantic_model
+
+from tinyber import py_nodes
+from tinyber.walker import Walker
+from generator import schema
+
+FLAVOURS = [
+    ('standalone', False, False),
+    ('shared', True, False),
+    ('lazy', True, True),
+]
+
+# runs in the child.
+PROBE = """
+import time
+t0 = time.time()
+import %(name)s as m
+t1 = time.time()
+m.%(last)s()
+t2 = time.time()
+for i in range (%(n)d):
+    getattr (m, 'T%%d' %% (i,))
+t3 = time.time()
+print ('%%f %%f %%f' %% (t1 - t0, t2 - t1, t3 - t2))
+"""
+
+class Args:
+    def __init__ (self, no_standalone, lazy):
+        self.no_standalone = no_standalone
+        self.lazy = lazy
+
+def probe (path, name, n, rounds):
+    env = dict (os.environ)
+    env['PYTHONPATH'] = os.pathsep.join ([path] + sys.path)
+    code = PROBE % {'name': name, 'last': 'T%d' % (n - 1,), 'n': n}
+    # a first run writes the .pyc files, as any normal install would have.
+    env.pop ('PYTHONDONTWRITEBYTECODE', None)
+    subprocess.check_output ([sys.executable, '-c', code], env=env)
+    runs = []
+    for i in range (rounds):
+        out = subprocess.check_output ([sys.executable, '-c', code], env=env)
+        runs.append ([float (x) for x in out.split()])
+    # best of each column.
+    return [min (col) for col in zip (*runs)]
+
+def main():
+    n = int (sys.argv[1]) if len (sys.argv) > 1 else 1000
+    module = build_semantic_model (parser.parse_asn1 (schema (n)))[0]
+    path = tempfile.mkdtemp()
+    try:
+        print ('%d types' % (n,))
+        print ('%-12s %10s %10s %10s' % ('', 'import', 'first use', 'all'))
+        for label, no_standalone, lazy in FLAVOURS:
+            name = 'synthetic_%s' % (label,)
+            walker = Walker (module, py_nodes)
+            walker.walk()
+            py_nodes.PythonBackend (Args (no_standalone, lazy), walker, name, path).generate_code()
+            t_import, t_first, t_all = probe (path, name + '_ber', n, 5)
+            print ('%-12s %8.1fms %8.1fms %8.1fms' % (label, t_import * 1e3, t_first * 1e3, t_all * 1e3))
+            sys.stdout.flush()
+    finally:
+        shutil.rmtree (path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+# -*- Mode: Python -*-
+
+# memory held by decoded messages: bytes per decoded MsgA and MsgB
+#  (test/t0.asn), with the default generated python and with --compact.
+#  every object reachable from the messages is counted once (with
+#  sys.getsizeof), so objects shared between messages - small ints,
+#  ENUMERATED values under --compact - are spread across all of them.
+#
+# usage: python bench/memory.py [N]
+
+import os
+import shutil
+import sys
+import tempfile
+
+from asn1ate import parser
+from asn1ate.sema import build_semantic_model
+
+from tinyber import py_nodes
+from tinyber.walker import Walker
+from utils import load_pure
+
+class Args:
+    no_standalone = False
+
+    def __init__ (self, compact):
+        self.compact = compact
+
+def deep_size (objs, base):
+    # total size of <objs> and everything they hold, each object counted once.
+    seen = set()
+    total = 0
+    stack = list (objs)
+    while stack:
+        ob = stack.pop()
+        if id (ob) in seen:
+            continue
+        seen.add (id (ob))
+        total += sys.getsizeof (ob)
+        if isinstance (ob, (list, tuple, set, frozenset)):
+            stack.extend (ob)
+        elif isinstance (ob, dict):
+            stack.extend (ob.keys())
+            stack.extend (ob.values())
+        elif isinstance (ob, base):
+            d = getattr (ob, '__dict__', None)
+            if d is not None:
+                stack.append (d)
+            for klass in type (ob).__mro__:
+                for name in klass.__dict__.get ('__slots__', ()):
+                    if hasattr (ob, name):
+                        stack.append (getattr (ob, name))
+    return total
+
+def messages (m):
+    a = m.MsgA()
+    a.toctet = b'abcdefgh'
+    a.t8int = 50
+    a.t16int = 10001
+    a.t32int = 398234234
+    a.tarray = [m.Pair (a=i, b=100 + i) for i in range (4)]
+    a.tbool = True
+    a.tenum = m.Color ('blue')
+    b = m.MsgB (a=-123456789, b=False, x=[True, False], y=[7, 8])
+    return [('MsgA', m.MsgA, a.encode()), ('MsgB', m.MsgB, b.encode())]
+
+def main():
+    n = int (sys.argv[1]) if len (sys.argv) > 1 else 10000
+    with open (os.path.join ('test', 't0.asn')) as f:
+        module = build_semantic_model (parser.parse_asn1 (f.read()))[0]
+    path = tempfile.mkdtemp()
+    try:
+        for label, compact in (('default', False), ('compact', True)):
+            name = 't0_mem_%s' % (label,)
+            walker = Walker (module, py_nodes)
+            walker.walk()
+            py_nodes.PythonBackend (Args (compact), walker, name, path).generate_code()
+            m = load_pure (name, os.path.join (path, name + '_ber.py'))
+            for type_name, klass, data in messages (m):
+                decoded = []
+                for i in range (n):
+                    ob = klass()
+                    ob.decode (data)
+                    decoded.append (ob)
+                size = deep_size (decoded, m.ASN1) - sys.getsizeof (decoded)
+                print ('%-8s %-5s %6d bytes/message' % (label, type_name, size // n))
+    finally:
+        shutil.rmtree (path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+// -*- Mode: C -*-
+
+// encode/decode throughput of the generated C codec itself, for
+//  suite.py: no python in the loop.  suite.py writes "cases.h", which
+//  includes the generated header and defines
+//
+//   BENCH_TYPES(T):  T(type) for every type used below
+//   BENCH_CASES(C):  C("schema/label/c", type, "encoded message")
+//
+// and passes -DMIN_TIME=<seconds>.  for each case, prints:
+//
+//   <key> <size> <encode msgs/sec> <decode msgs/sec>
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <stdint.h>
+#include <string.h>
+#include <time.h>
+
+#include "cases.h"
+
+#ifndef MIN_TIME
+#define MIN_TIME 0.2
+#endif
+
+#define BATCH 1000
+
+typedef struct {
+  const char * key;
+  const uint8_t * data;
+  unsigned int size;
+  unsigned int max_size;
+  unsigned int type_size;
+  int (*decode) (void * dst, buf_t * src);
+  int (*encode) (buf_t * dst, const void * src);
+} bench_case_t;
+
+#define THUNKS(type)                                                    \
+  static int decode_##type##_thunk (void * dst, buf_t * src) { return decode_##type (dst, src); } \
+  static int encode_##type##_thunk (buf_t * dst, const void * src) { return encode_##type (dst, src); }
+BENCH_TYPES (THUNKS)
+
+#define CASE(key, type, data) \
+  {key, (const uint8_t *) data, sizeof(data) - 1, type##_MAX_SIZE, sizeof(type##_t), decode_##type##_thunk, encode_##type##_thunk},
+static bench_case_t cases[] = {
+  BENCH_CASES (CASE)
+};
+
+static
+double
+now (void)
+{
+  struct timespec ts;
+  clock_gettime (CLOCK_MONOTONIC, &ts);
+  return ts.tv_sec + ts.tv_nsec * 1e-9;
+}
+
+static
+void
+fail (const bench_case_t * c, const char * what)
+{
+  fprintf (stderr, "%s: %s failed\n", c->key, what);
+  exit (1);
+}
+
+static
+void
+decode_once (const bench_case_t * c, void * val)
+{
+  buf_t src;
+  init_ibuf (&src, (uint8_t *) c->data, c->size);
+  if (c->decode (val, &src) != 0 || src.pos != c->size) {
+    fail (c, "decode");
+  }
+}
+
+static
+unsigned int
+encode_once (const bench_case_t * c, const void * val, uint8_t * buffer)
+{
+  buf_t dst;
+  init_obuf (&dst, buffer, c->max_size);
+  if (c->encode (&dst, val) != 0) {
+    fail (c, "encode");
+  }
+  return dst.pos;
+}
+
+int
+main (int argc, char * argv[])
+{
+  unsigned int i, n;
+  for (i=0; i < sizeof(cases) / sizeof(cases[0]); i++) {
+    const bench_case_t * c = &cases[i];
+    void * val = malloc (c->type_size);
+    uint8_t * buffer = malloc (c->max_size);
+    double t0, t1, rates[2];
+    int what;
+    long count;
+    decode_once (c, val);
+    // the C encoding must be the one the python backend produced.
+    n = encode_once (c, val, buffer);
+    if (c->max_size - n != c->size || memcmp (buffer + n, c->data, c->size) != 0) {
+      fail (c, "re-encode");
+    }
+    for (what=0; what < 2; what++) {
+      count = 0;
+      t0 = now();
+      do {
+        for (n=0; n < BATCH; n++) {
+          if (what == 0) {
+            encode_once (c, val, buffer);
+          } else {
+            decode_once (c, val);
+          }
+        }
+        count += BATCH;
+        t1 = now();
+      } while (t1 - t0 < MIN_TIME);
+      rates[what] = count / (t1 - t0);
+    }
+    printf ("%s %u %.0f %.0f\n", c->key, c->size, rates[0], rates[1]);
+    free (val);
+    free (buffer);
+  }
+  return 0;
+}
@@ -0,0 +1,88 @@
+# -*- Mode: Python -*-
+
+# reading a file of back-to-back ThingMsg records (test/t0.asn), ~24MB by
+#  default, three ways:
+#
+#   read:     f.read() the whole file, then decode_many()
+#   records:  RecordFile.records(), the raw views only
+#   decode:   RecordFile.decode()
+#
+# each runs in a fresh interpreter; peak RSS is ru_maxrss of that child.
+#
+# usage: python bench/records.py [N]
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from tinyber import py_nodes
+from suite import Args, walk
+
+PROBE = """
+import sys, time
+sys.path.insert (0, %(path)r)
+import %(name)s as m
+t0 = time.time()
+n = 0
+if %(mode)r == 'read':
+    with open (%(data)r, 'rb') as f:
+        n = len (m.decode_many (m.ThingMsg, f.read()))
+else:
+    with m.RecordFile (%(data)r) as f:
+        if %(mode)r == 'records':
+            for offset, view in f.records():
+                n += 1
+            del view
+        else:
+            for msg in f.decode (m.ThingMsg):
+                n += 1
+print ('%%d %%f' %% (n, time.time() - t0))
+"""
+
+def messages (m):
+    a = m.MsgA()
+    a.toctet = b'abcdefgh'
+    a.t8int = 50
+    a.t16int = 10001
+    a.t32int = 398234234
+    a.tarray = [m.Pair (a=i, b=100 + i) for i in range (4)]
+    a.tbool = True
+    a.tenum = m.Color ('blue')
+    b = m.MsgB (a=-123456789, b=False, x=[True, False], y=[7, 8])
+    return [bytes (m.ThingMsg (a).encode()), bytes (m.ThingMsg (b).encode())]
+
+def main():
+    n = int (sys.argv[1]) if len (sys.argv) > 1 else 500000
+    path = tempfile.mkdtemp()
+    try:
+        name = 'bench_records_t0'
+        py_nodes.PythonBackend (Args(), walk (os.path.join ('test', 't0.asn'), py_nodes), name, path).generate_code()
+        sys.path.insert (0, path)
+        m = __import__ (name + '_ber')
+        data = os.path.join (path, 'records.ber')
+        with open (data, 'wb') as f:
+            for i in range (n // 2):
+                f.write (b''.join (messages (m)))
+        print ('%d records, %.1f MB' % (n, os.path.getsize (data) / 1e6))
+        print ('%-8s %10s %10s' % ('', 'seconds', 'peak MB'))
+        for mode in ('read', 'records', 'decode'):
+            code = PROBE % {'path': path, 'name': name + '_ber', 'mode': mode, 'data': data}
+            # ru_maxrss is the largest of any child so far: one helper process per mode.
+            out = subprocess.check_output ([
+                sys.executable, '-c',
+                'import resource, subprocess, sys; '
+                'sys.stdout.write (subprocess.check_output ([sys.executable, "-c", sys.argv[1]]).decode()); '
+                'print (resource.getrusage (resource.RUSAGE_CHILDREN).ru_maxrss)',
+                code])
+            count, seconds, peak = out.split()
+            assert int (count) == n // 2 * 2
+            print ('%-8s %10.2f %10.1f' % (mode, float (seconds), int (peak) / 1024.0))
+            sys.stdout.flush()
+    finally:
+        shutil.rmtree (path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+// -*- Mode: C -*-
+
+// microbenchmark for the C runtime (tinyber.c): TLV decoding, INTEGER
+//  encoding and sizing.  build it against any tinyber.c to compare:
+//
+//   cc -O3 -I tinyber/data bench/runtime.c tinyber/data/tinyber.c -o runtime
+//   ./runtime
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <stdint.h>
+#include <string.h>
+#include <time.h>
+
+#include "tinyber.h"
+
+#define NVALS 4096
+#define ROUNDS 2000
+
+#define CHECK(x) do { if ((x) == -1) { fprintf (stderr, "*** line %d ***\n", __LINE__); exit (1); } } while (0)
+
+static asn1int_t values[NVALS];
+static uint8_t encoded[NVALS * 128];
+static unsigned int encoded_pos;
+
+static
+double
+now (void)
+{
+  struct timespec ts;
+  clock_gettime (CLOCK_MONOTONIC, &ts);
+  return ts.tv_sec + ts.tv_nsec * 1e-9;
+}
+
+static
+void
+report (const char * name, double t0, long n)
+{
+  printf ("%-24s %7.2f ns/op\n", name, (now() - t0) * 1e9 / n);
+}
+
+// integers of every size, both signs.
+static
+void
+setup (void)
+{
+  buf_t obuf;
+  int i;
+  srand (42);
+  for (i=0; i < NVALS; i++) {
+    asn1int_t n = ((asn1int_t) rand() << 32) ^ rand();
+    n >>= rand() % 64;
+    values[i] = (i & 1) ? -n : n;
+  }
+  init_obuf (&obuf, encoded, sizeof(encoded));
+  for (i=0; i < NVALS; i++) {
+    uint8_t payload[100];
+    asn1bool_t b = i & 1;
+    unsigned int mark = obuf.pos;
+    // SEQUENCE { INTEGER, BOOLEAN, OCTET STRING }, written backward.
+    memset (payload, 'x', sizeof(payload));
+    CHECK (encode_OCTET_STRING (&obuf, payload, i % sizeof(payload)));
+    CHECK (encode_BOOLEAN (&obuf, &b));
+    CHECK (encode_INTEGER (&obuf, &values[i]));
+    CHECK (encode_TLV (&obuf, mark, TAG_SEQUENCE, FLAG_STRUCTURED));
+  }
+  encoded_pos = obuf.pos;
+}
+
+int
+main (int argc, char * argv[])
+{
+  uint8_t buffer[NVALS * 16];
+  long sum = 0;
+  double t0;
+  int i, r;
+
+  setup();
+
+  t0 = now();
+  for (r=0; r < ROUNDS; r++) {
+    buf_t obuf;
+    init_obuf (&obuf, buffer, sizeof(buffer));
+    for (i=0; i < NVALS; i++) {
+      CHECK (encode_INTEGER (&obuf, &values[i]));
+    }
+    sum += obuf.pos;
+  }
+  report ("encode_INTEGER", t0, (long) ROUNDS * NVALS);
+
+  t0 = now();
+  for (r=0; r < ROUNDS; r++) {
+    for (i=0; i < NVALS; i++) {
+      sum += size_INTEGER (values[i] + r);
+    }
+  }
+  report ("size_INTEGER", t0, (long) ROUNDS * NVALS);
+
+  t0 = now();
+  for (r=0; r < ROUNDS; r++) {
+    buf_t obuf;
+    init_obuf (&obuf, buffer, sizeof(buffer));
+    for (i=0; i < NVALS; i++) {
+      // long lengths (0x81 xx, 0x82 xx xx).
+      obuf.pos -= 3;
+      CHECK (encode_TLV (&obuf, obuf.pos + 128 + (i & 0x3ff), TAG_OCTETSTRING, FLAG_UNIVERSAL));
+    }
+    sum += obuf.pos;
+  }
+  report ("encode_TLV (long)", t0, (long) ROUNDS * NVALS);
+
+  t0 = now();
+  for (r=0; r < ROUNDS; r++) {
+    buf_t src;
+    asn1raw_t tlv;
+    init_ibuf (&src, encoded + encoded_pos, sizeof(encoded) - encoded_pos);
+    while (src.pos < src.size) {
+      buf_t src0;
+      CHECK (decode_TLV (&tlv, &src));
+      init_ibuf (&src0, tlv.value, tlv.length);
+      CHECK (decode_TLV (&tlv, &src0));
+      sum += decode_INTEGER (&tlv);
+      CHECK (decode_TLV (&tlv, &src0));
+      sum += decode_BOOLEAN (&tlv);
+      CHECK (decode_TLV (&tlv, &src0));
+      sum += tlv.length;
+    }
+  }
+  // four TLVs per element.
+  report ("decode_TLV", t0, (long) ROUNDS * NVALS * 4);
+
+  // keep the compiler from dropping the loops.
+  fprintf (stderr, "[%ld]\n", sum);
+  return 0;
+}
@@ -0,0 +1,238 @@
+# -*- Mode: Python -*-
+
+# encode/decode throughput of every backend, on test/t0.asn and the
+#  larger schemas in bench/schemas:
+#
+#   python:  generated python over the pure-python codec.py
+#   _codec:  the same generated python over the cython codec (tinyber._codec)
+#   cython:  -l cython
+#   cbind:   -l cbind: the C codec, measured through its generated python
+#            wrappers, i.e. including the conversion to and from the python
+#            objects.
+#   c:       -l c on its own, from C (native.c): to and from the C structs,
+#            no python in the loop.
+#
+# backends that can't be built here (no Cython, no _codec, no C compiler)
+#  are skipped.
+# the results (messages/sec and MB/sec) can be written as JSON and compared
+#  against a previous run: any rate that drops by more than --threshold
+#  is a regression, as is a result in the baseline that this run didn't
+#  produce (e.g. a backend that no longer builds), and the exit status is 1.
+#
+# usage: python bench/suite.py [--json out.json] [--baseline base.json] [--threshold 0.2]
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from tinyber import py_nodes
+from utils import build_cbind, build_cython, build_native, load_pure, load_source, timeit, walk
+
+class Args:
+    no_standalone = False
+    octet_pointers = False
+    soa = False
+
+# ---------- messages ----------
+
+# each schema has a function returning [(label, type_name, value), ...]
+#  for a generated module.
+
+def t0_messages (m):
+    a = m.MsgA()
+    a.toctet = b'abcdefgh'
+    a.t8int = 50
+    a.t16int = 10001
+    a.t32int = 398234234
+    a.tarray = [m.Pair (a=i, b=100 + i) for i in range (4)]
+    a.tbool = True
+    a.tenum = m.Color ('blue')
+    b = m.MsgB (a=-123456789, b=False, x=[True, False], y=[7, 8])
+    c = m.MsgC (lstr=b'x' * 300, tbool=True)
+    return [
+        ('Pair', 'Pair', m.Pair (a=10, b=101)),
+        ('MsgA', 'MsgA', a),
+        ('ThingMsg', 'ThingMsg', m.ThingMsg (b)),
+        ('MsgC', 'MsgC', c),
+    ]
+
+def records_messages (m):
+    def batch (n):
+        records = []
+        for i in range (n):
+            name = ('item-%d' % (i,)).encode ('ascii')
+            records.append (m.Record (id=1000000 + i, price=i * 37 % 1000000, qty=i % 2000 - 1000, flag=bool (i & 1), name=name))
+        return m.Batch (seq=n, records=records)
+    return [
+        ('Record', 'Record', batch (1).records[0]),
+        ('Batch-10', 'Batch', batch (10)),
+        ('Batch-200', 'Batch', batch (200)),
+    ]
+
+def wide_messages (m):
+    w = m.WideMsg()
+    w.i0, w.i1, w.i2, w.i3 = 200, 60000, 4000000000, -30000
+    w.i4, w.i5, w.i6, w.i7 = 1, 2, 3, -4
+    w.b0, w.b1, w.b2, w.b3 = True, False, True, False
+    w.s0 = b'a' * 10
+    w.s1 = b'b' * 64
+    w.s2 = b'c' * 200
+    w.color = m.Color ('green')
+    w.origin = m.Point (x=1, y=2, label=b'origin')
+    w.path = [m.Point (x=i, y=i * 2, label=b'p') for i in range (8)]
+    return [
+        ('WideMsg', 'WideMsg', w),
+        ('Event', 'Event', m.Event (m.Point (x=5, y=6, label=b'pt'))),
+    ]
+
+
+SCHEMAS = [
+    ('t0', os.path.join ('test', 't0.asn'), t0_messages),
+    ('records', os.path.join ('bench', 'schemas', 'records.asn'), records_messages),
+    ('wide', os.path.join ('bench', 'schemas', 'wide.asn'), wide_messages),
+]
+
+# ---------- backends ----------
+
+def build_backends (filename, name, path):
+    # returns [(backend, module), ...] for every backend we can build.
+    r = []
+    py_name = name + '_py'
+    py_nodes.PythonBackend (Args(), walk (filename, py_nodes), py_name, path).generate_code()
+    py_path = os.path.join (path, py_name + '_ber.py')
+    r.append (('python', load_pure (py_name, py_path)))
+    try:
+        import tinyber._codec
+    except ImportError:
+        sys.stderr.write ('no tinyber._codec: skipping _codec and cython\n')
+    else:
+        r.append (('_codec', load_source (name + '_codec', py_path)))
+        r.append (('cython', build_cython (filename, name + '_cy', path)))
+    try:
+        import Cython
+    except ImportError:
+        sys.stderr.write ('no Cython: skipping cbind\n')
+    else:
+        r.append (('cbind', build_cbind (filename, name + '_cb', path)))
+    return r
+
+# ---------- measurement ----------
+
+def measure (klass, msg, min_time, batch=100):
+    data = msg.encode()
+
+    def encode():
+        for i in range (batch):
+            msg.encode()
+
+    def decode():
+        for i in range (batch):
+            klass().decode (data)
+    r = {'size': len (data)}
+    for what, fun in (('encode', encode), ('decode', decode)):
+        rate = batch / timeit (fun, min_time)
+        r[what + '_msgs'] = rate
+        r[what + '_mbs'] = rate * len (data) / 1e6
+    return r
+
+def run_native (schema, filename, path, m, messages, min_time):
+    # [(key, result), ...] for the 'c' backend on <schema>, from the
+    #  messages as encoded by the python module <m>.
+    cases = []
+    for label, type_name, msg in messages (m):
+        cases.append (('%s/%s/c' % (schema, label), type_name, msg.encode()))
+    try:
+        exe = build_native (filename, 'bench_' + schema, path, cases, min_time)
+    except OSError:
+        sys.stderr.write ('no C compiler: skipping c\n')
+        return []
+    results = []
+    for line in subprocess.check_output ([exe]).decode ('ascii').splitlines():
+        key, size, encode_rate, decode_rate = line.split()
+        size = int (size)
+        r = {'size': size}
+        for what, rate in (('encode', float (encode_rate)), ('decode', float (decode_rate))):
+            r[what + '_msgs'] = rate
+            r[what + '_mbs'] = rate * size / 1e6
+        results.append ((key, r))
+    return results
+
+def run (min_time):
+    results = {}
+    path = tempfile.mkdtemp()
+    sys.path.insert (0, path)
+    try:
+        for schema, filename, messages in SCHEMAS:
+            backends = build_backends (filename, 'bench_' + schema, path)
+            for backend, m in backends:
+                for label, type_name, msg in messages (m):
+                    key = '%s/%s/%s' % (schema, label, backend)
+                    results[key] = measure (getattr (m, type_name), msg, min_time)
+                    show (key, results[key])
+            for key, r in run_native (schema, filename, path, backends[0][1], messages, min_time):
+                results[key] = r
+                show (key, r)
+    finally:
+        sys.path.remove (path)
+        shutil.rmtree (path)
+    return results
+
+def show (key, r):
+    print ('%-30s %6d %12.0f %9.2f %12.0f %9.2f' % (
+        key, r['size'], r['encode_msgs'], r['encode_mbs'], r['decode_msgs'], r['decode_mbs']
+    ))
+    sys.stdout.flush()
+
+def compare (results, baseline, threshold):
+    # return the list of regressions: rates below (1 - threshold) * baseline,
+    #  and (with None for the new rate) results missing from this run.
+    bad = []
+    for key in sorted (baseline):
+        if key not in results:
+            bad.append ((key, None, None, None))
+            continue
+        for what in ('encode_msgs', 'decode_msgs'):
+            old = baseline[key][what]
+            new = results[key][what]
+            if new < old * (1.0 - threshold):
+                bad.append ((key, what, old, new))
+    return bad
+
+def main():
+    p = argparse.ArgumentParser (description='tinyber cross-backend benchmarks.')
+    p.add_argument ('--json', help="write the results to this file.")
+    p.add_argument ('--baseline', help="compare against the results in this file.")
+    p.add_argument ('--threshold', type=float, default=0.2, help="allowed slowdown against the baseline, as a fraction (default 0.2).")
+    p.add_argument ('--min-time', type=float, default=0.2, help="seconds spent on each measurement (default 0.2).")
+    args = p.parse_args()
+
+    print ('%-30s %6s %12s %9s %12s %9s' % ('schema/type/backend', 'bytes', 'enc msg/s', 'enc MB/s', 'dec msg/s', 'dec MB/s'))
+    results = run (args.min_time)
+    if args.json:
+        with open (args.json, 'w') as f:
+            json.dump ({
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'results': results,
+            }, f, indent=1, sort_keys=True)
+    if args.baseline:
+        with open (args.baseline) as f:
+            baseline = json.load (f)['results']
+        bad = compare (results, baseline, args.threshold)
+        for key, what, old, new in bad:
+            if what is None:
+                print ('MISSING %s: in the baseline, but not measured' % (key,))
+            else:
+                print ('REGRESSION %s %s: %.0f -> %.0f (%+.1f%%)' % (key, what, old, new, (new / old - 1) * 100))
+        if bad:
+            sys.exit (1)
+        print ('no regressions beyond %d%%.' % (args.threshold * 100,))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# -*- Mode: Python -*-
+
+# helpers shared by the benchmark scripts.
+
+import importlib
+import os
+import subprocess
+import sys
+import time
+
+def pure_codec():
+    # load tinyber/codec.py without letting it pull in the cython codec,
+    #  so the pure-python classes can be measured even when _codec is built.
+    import tinyber
+    path = os.path.join (os.path.dirname (tinyber.__file__), 'codec.py')
+    return load_pure ('tinyber_pure_codec', path)
+
+def load_pure (name, path):
+    # load the module at <path> (codec.py or a standalone generated module)
+    #  with the cython codec hidden from it.
+    saved = sys.modules.get ('tinyber._codec')
+    sys.modules['tinyber._codec'] = None
+    try:
+        return load_source (name, path)
+    finally:
+        if saved is None:
+            del sys.modules['tinyber._codec']
+        else:
+            sys.modules['tinyber._codec'] = saved
+
+def load_source (name, path):
+    # import the python file at <path> as module <name> (imp.load_source,
+    #  which python 3.12 dropped).
+    try:
+        from importlib.util import spec_from_file_location, module_from_spec
+    except ImportError:
+        # python 2.
+        import imp
+        return imp.load_source (name, path)
+    spec = spec_from_file_location (name, path)
+    module = module_from_spec (spec)
+    # in sys.modules before it runs, as a --lazy module expects.
+    sys.modules[name] = module
+    spec.loader.exec_module (module)
+    return module
+
+def walk (filename, nodes):
+    from asn1ate import parser
+    from asn1ate.sema import build_semantic_model
+    from tinyber.walker import Walker
+    with open (filename) as f:
+        modules = build_semantic_model (parser.parse_asn1 (f.read()))
+    walker = Walker (modules[0], nodes)
+    walker.walk()
+    return walker
+
+def build_ext (path, name, sources, include_path=()):
+    # cythonize and build extension <name> in place under <path>.
+    from Cython.Build import cythonize
+    from setuptools import setup, Extension
+    cwd = os.getcwd()
+    os.chdir (path)
+    try:
+        setup (
+            name=name,
+            ext_modules=cythonize ([Extension (name, sources)], include_path=list (include_path), quiet=True),
+            script_args=['-q', 'build_ext', '--inplace'],
+        )
+    finally:
+        os.chdir (cwd)
+
+def build_cython (filename, module_name, path):
+    # <module_name>_ber, from the cython backend (-l cython), built under <path>.
+    import tinyber
+    from tinyber import cy_nodes
+    cy_nodes.CythonBackend (None, walk (filename, cy_nodes), module_name, path).generate_code()
+    top = os.path.dirname (os.path.dirname (os.path.abspath (tinyber.__file__)))
+    name = module_name + '_ber'
+    build_ext (path, name, [name + '.pyx'], [top])
+    return importlib.import_module (name)
+
+def build_cbind (filename, module_name, path):
+    # <module_name>_ber, from the cbind backend (-l cbind), built under <path>.
+    from tinyber import cbind_nodes
+
+    class Args:
+        octet_pointers = False
+        soa = False
+    cbind_nodes.CBindBackend (Args(), walk (filename, cbind_nodes), module_name, path).generate_code()
+    name = module_name + '_ber'
+    build_ext (path, name, [name + '.pyx', module_name + '.c', 'tinyber.c'])
+    return importlib.import_module (name)
+
+def build_native (filename, module_name, path, cases, min_time):
+    # bench/native.c over the C backend (-l c), built in its own directory
+    #  under <path>; returns the executable.  <cases> is [(key, type_name,
+    #  encoded message), ...].
+    from tinyber import c_nodes
+
+    class Args:
+        soa = False
+    path = os.path.join (path, module_name + '_native')
+    os.mkdir (path)
+    c_nodes.CBackend (Args(), walk (filename, c_nodes), module_name, path).generate_code()
+    with open (os.path.join (path, 'cases.h'), 'w') as f:
+        f.write ('#include "%s.h"\n\n' % (module_name,))
+        f.write ('#define BENCH_TYPES(T) \\\n')
+        for type_name in sorted (set (type_name for key, type_name, data in cases)):
+            f.write ('  T(%s) \\\n' % (type_name,))
+        f.write ('\n#define BENCH_CASES(C) \\\n')
+        for key, type_name, data in cases:
+            literal = ''.join ('\\x%02x' % (b,) for b in bytearray (data))
+            f.write ('  C("%s", %s, "%s") \\\n' % (key, type_name, literal))
+        f.write ('\n')
+    exe = os.path.join (path, 'native')
+    here = os.path.dirname (os.path.abspath (__file__))
+    subprocess.check_call ([
+        os.environ.get ('CC', 'cc'), '-O2', '-DMIN_TIME=%r' % (min_time,), '-I', path, '-o', exe,
+        os.path.join (here, 'native.c'), os.path.join (path, module_name + '.c'), os.path.join (path, 'tinyber.c'),
+    ])
+    return exe
+
+def timeit (fun, min_time=0.2):
+    # call <fun> repeatedly for at least <min_time> seconds,
+    #  return the best time for a single call.
+    best = None
+    total = 0.0
+    while total < min_time or best is None:
+        t0 = time.time()
+        fun()
+        t = time.time() - t0
+        total += t
+        if best is None or t < best:
+            best = t
+    return best
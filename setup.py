@@ -15,9 +15,9 @@ setup (
     url              = "https://github.com/cloudtools/tinyber",
     packages         = find_packages(),
     description      = 'ASN.1 code generator for Python and C',
-    scripts          = ['scripts/tinyber_gen', 'scripts/dax'],
+    scripts          = ['scripts/tinyber_gen', 'scripts/tinyber_index', 'scripts/dax'],
     package_data     = {
-        'tinyber': ['data/*.[ch]', 'tinyber/codec.py'],
+        'tinyber': ['data/*.[ch]', 'tinyber/codec.py', '_codec.pxd'],
         'tests': ['*.asn1'],
     },
     ext_modules      = exts,
@@ -0,0 +1,145 @@
+// -*- Mode: C -*-
+
+// check the field-projection decoder (decode_MsgA_fields) of the generated
+//  t0 codec against decode_MsgA.
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <stdint.h>
+
+#include "t0.h"
+
+#define EXPECT(x) do { if (!(x)) { fprintf (stderr, "*** line %d: %s ***\n", __LINE__, #x); exit (1); } } while (0)
+
+static uint8_t encoded[MsgA_MAX_SIZE];
+static int encoded_len;
+
+// offsets into <encoded> of the t8int value, the t16int tag and the tenum tag.
+static int t8int_value, t16int_tag, tenum_tag;
+
+static
+void
+make_msga (void)
+{
+  uint8_t buffer[MsgA_MAX_SIZE];
+  MsgA_t msga;
+  buf_t obuf;
+  int i;
+  memset (&msga, 0, sizeof(msga));
+  memcpy (msga.toctet.val, "abc", 3);
+  msga.toctet.len = 3;
+  msga.t8int = 50;
+  msga.t16int = 10001;
+  msga.t32int = 398234234;
+  msga.tarray.len = 4;
+  for (i=0; i < 4; i++) {
+    msga.tarray.val[i].a = i;
+    msga.tarray.val[i].b = 100 + i;
+  }
+  msga.tbool = 1;
+  msga.tenum = Color_blue;
+  init_obuf (&obuf, buffer, sizeof(buffer));
+  EXPECT (encode_MsgA (&obuf, &msga) == 0);
+  encoded_len = obuf.size - obuf.pos;
+  memcpy (encoded, buffer + obuf.pos, encoded_len);
+  // 30 LL | 04 03 'abc' | 02 01 32 | 02 02 27 11 | ... | 0a 01 01
+  t8int_value = 2 + 5 + 2;
+  t16int_tag = t8int_value + 1;
+  tenum_tag = encoded_len - 3;
+  EXPECT (encoded[t8int_value] == 50);
+  EXPECT (encoded[t16int_tag] == TAG_INTEGER);
+  EXPECT (encoded[tenum_tag] == TAG_ENUMERATED);
+}
+
+static
+int
+decode_all (MsgA_t * dst, uint8_t * data)
+{
+  buf_t ibuf;
+  memset (dst, 0xaa, sizeof(*dst));
+  init_ibuf (&ibuf, data, encoded_len);
+  return decode_MsgA (dst, &ibuf);
+}
+
+static
+int
+decode_fields (MsgA_t * dst, uint8_t * data, uint32_t mask)
+{
+  buf_t ibuf;
+  int r;
+  // anything not decoded stays 0xaa.
+  memset (dst, 0xaa, sizeof(*dst));
+  init_ibuf (&ibuf, data, encoded_len);
+  r = decode_MsgA_fields (dst, &ibuf, mask);
+  // the whole TLV is consumed, however much of it was decoded.
+  EXPECT (r == -1 || ibuf.pos == (unsigned int) encoded_len);
+  return r;
+}
+
+int
+main (int argc, char * argv[])
+{
+  uint8_t data[MsgA_MAX_SIZE];
+  MsgA_t full, part, untouched;
+  memset (&untouched, 0xaa, sizeof(untouched));
+  make_msga();
+
+  // every field: the same as decode_MsgA.
+  EXPECT (decode_all (&full, encoded) == 0);
+  EXPECT (decode_fields (&part, encoded, 0x7f) == 0);
+  EXPECT (memcmp (&full.toctet, &part.toctet, sizeof(full.toctet)) == 0);
+  EXPECT (full.t8int == part.t8int && full.t16int == part.t16int && full.t32int == part.t32int);
+  EXPECT (memcmp (&full.tarray, &part.tarray, sizeof(full.tarray)) == 0);
+  EXPECT (full.tbool == part.tbool && full.tenum == part.tenum);
+
+  // a partial mask: only the requested fields are written.
+  EXPECT (decode_fields (&part, encoded, MsgA_FIELD_t8int | MsgA_FIELD_t32int) == 0);
+  EXPECT (part.t8int == 50);
+  EXPECT (part.t32int == 398234234);
+  EXPECT (memcmp (&part.toctet, &untouched.toctet, sizeof(part.toctet)) == 0);
+  EXPECT (part.t16int == untouched.t16int);
+  EXPECT (memcmp (&part.tarray, &untouched.tarray, sizeof(part.tarray)) == 0);
+  EXPECT (part.tbool == untouched.tbool && part.tenum == untouched.tenum);
+  EXPECT (decode_fields (&part, encoded, MsgA_FIELD_tenum) == 0);
+  EXPECT (part.tenum == Color_blue);
+  EXPECT (part.t8int == untouched.t8int);
+
+  // early return: nothing after the last requested field is looked at.
+  memcpy (data, encoded, encoded_len);
+  data[tenum_tag] = TAG_OCTETSTRING;
+  EXPECT (decode_all (&full, data) == -1);
+  EXPECT (decode_fields (&part, data, MsgA_FIELD_t8int | MsgA_FIELD_tbool) == 0);
+  EXPECT (part.t8int == 50 && part.tbool == 1);
+  EXPECT (decode_fields (&part, data, MsgA_FIELD_t8int | MsgA_FIELD_tenum) == -1);
+
+  // a constraint violation in a requested field (t8int = -1)...
+  memcpy (data, encoded, encoded_len);
+  data[t8int_value] = 0xff;
+  EXPECT (decode_all (&full, data) == -1);
+  EXPECT (decode_fields (&part, data, MsgA_FIELD_t8int) == -1);
+  EXPECT (decode_fields (&part, data, MsgA_FIELD_toctet | MsgA_FIELD_t8int | MsgA_FIELD_tenum) == -1);
+  // ...is not seen when the field is skipped.
+  EXPECT (decode_fields (&part, data, MsgA_FIELD_toctet | MsgA_FIELD_t32int) == 0);
+  EXPECT (part.t8int == untouched.t8int);
+
+  // skipped fields are stepped over by length, without being read: a
+  //  wrong tag on t16int only matters when t16int is asked for.
+  memcpy (data, encoded, encoded_len);
+  data[t16int_tag] = TAG_OCTETSTRING;
+  EXPECT (decode_all (&full, data) == -1);
+  EXPECT (decode_fields (&part, data, MsgA_FIELD_t8int | MsgA_FIELD_tenum) == 0);
+  EXPECT (part.t8int == 50 && part.tenum == Color_blue);
+  EXPECT (part.t16int == untouched.t16int);
+  EXPECT (decode_fields (&part, data, MsgA_FIELD_t16int) == -1);
+
+  // a truncated message fails whatever the mask.
+  {
+    buf_t ibuf;
+    init_ibuf (&ibuf, encoded, encoded_len - 1);
+    EXPECT (decode_MsgA_fields (&part, &ibuf, MsgA_FIELD_toctet) == -1);
+  }
+
+  fprintf (stderr, "success.\n");
+  return 0;
+}
@@ -0,0 +1,202 @@
+// -*- Mode: C -*-
+
+// check the generated encoders that write constant TLV headers themselves
+//  (see emit_fixed() in c_nodes.py) against the same values encoded the
+//  generic way, with encode_TLV(), and round-trip them through the decoders.
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <stdint.h>
+
+#include "headers.h"
+
+#define EXPECT(x) do { if (!(x)) { fprintf (stderr, "*** line %d: %s ***\n", __LINE__, #x); exit (1); } } while (0)
+
+// a primitive TLV: the value bytes, then the header from encode_TLV().
+static
+void
+put (buf_t * o, uint32_t tag, const uint8_t * value, int length)
+{
+  unsigned int mark = o->pos;
+  EXPECT (o->pos >= (unsigned int) length);
+  o->pos -= length;
+  memcpy (o->buffer + o->pos, value, length);
+  EXPECT (encode_TLV (o, mark, tag, FLAG_UNIVERSAL) == 0);
+}
+
+static
+void
+put_fixed (buf_t * o, const Fixed_t * src)
+{
+  unsigned int mark = o->pos;
+  unsigned int mark0;
+  uint8_t flag = src->flag ? 0xff : 0x00;
+  int i;
+  mark0 = o->pos;
+  for (i=src->codes.len - 1; i >= 0; i--) {
+    put (o, TAG_UTF8STRING, src->codes.val[i].val, src->codes.val[i].len);
+  }
+  EXPECT (encode_TLV (o, mark0, TAG_SEQUENCE, FLAG_STRUCTURED) == 0);
+  put (o, TAG_BOOLEAN, &flag, 1);
+  put (o, TAG_UTF8STRING, src->utf8.val, src->utf8.len);
+  put (o, TAG_OCTETSTRING, src->octets.val, src->octets.len);
+  EXPECT (encode_TLV (o, mark, TAG_SEQUENCE, FLAG_STRUCTURED) == 0);
+}
+
+static
+void
+put_mixed (buf_t * o, const Mixed_t * src)
+{
+  unsigned int mark = o->pos;
+  unsigned int mark0;
+  int i;
+  put (o, TAG_UTF8STRING, src->big.val, src->big.len);
+  put (o, TAG_OCTETSTRING, src->blob.val, src->blob.len);
+  put (o, TAG_UTF8STRING, src->name.val, src->name.len);
+  mark0 = o->pos;
+  for (i=src->pairs.len - 1; i >= 0; i--) {
+    put_fixed (o, &src->pairs.val[i]);
+  }
+  EXPECT (encode_TLV (o, mark0, TAG_SEQUENCE, FLAG_STRUCTURED) == 0);
+  put_fixed (o, &src->fixed);
+  EXPECT (encode_TLV (o, mark, TAG_SEQUENCE, FLAG_STRUCTURED) == 0);
+}
+
+static
+void
+make_fixed (Fixed_t * dst, int n)
+{
+  memset (dst, 0, sizeof(*dst));
+  memcpy (dst->octets.val, "abcde", 5);
+  dst->octets.val[0] += n;
+  dst->octets.len = 5;
+  memcpy (dst->utf8.val, "\xc3\xa9z", 3);
+  dst->utf8.len = 3;
+  dst->flag = n & 1;
+  memcpy (dst->codes.val[0].val, "c0", 2);
+  dst->codes.val[0].len = 2;
+  memcpy (dst->codes.val[1].val, "c1", 2);
+  dst->codes.val[1].len = 2;
+  dst->codes.len = 2;
+}
+
+static
+void
+make_mixed (Mixed_t * dst)
+{
+  memset (dst, 0, sizeof(*dst));
+  make_fixed (&dst->fixed, 0);
+  make_fixed (&dst->pairs.val[0], 1);
+  make_fixed (&dst->pairs.val[1], 2);
+  dst->pairs.len = 2;
+  memcpy (dst->name.val, "name", 4);
+  dst->name.len = 4;
+  memset (dst->blob.val, 'b', sizeof(dst->blob.val));
+  dst->blob.len = sizeof(dst->blob.val);
+  memset (dst->big.val, 'u', sizeof(dst->big.val));
+  dst->big.len = sizeof(dst->big.val);
+}
+
+int
+main (int argc, char * argv[])
+{
+  uint8_t buffer0[Mixed_MAX_SIZE];
+  uint8_t buffer1[Mixed_MAX_SIZE];
+  buf_t generated, generic, ibuf;
+  Fixed_t fixed, fixed1;
+  Mixed_t mixed, mixed1;
+  int len;
+
+  // Fixed: every header is written directly.
+  make_fixed (&fixed, 0);
+  init_obuf (&generated, buffer0, sizeof(buffer0));
+  init_obuf (&generic, buffer1, sizeof(buffer1));
+  EXPECT (encode_Fixed (&generated, &fixed) == 0);
+  put_fixed (&generic, &fixed);
+  len = generated.size - generated.pos;
+  EXPECT (len == (int) (generic.size - generic.pos));
+  EXPECT (len == size_Fixed (&fixed));
+  EXPECT (memcmp (buffer0 + generated.pos, buffer1 + generic.pos, len) == 0);
+  EXPECT (buffer0[generated.pos + 9] == TAG_UTF8STRING);
+  memset (&fixed1, 0, sizeof(fixed1));
+  init_ibuf (&ibuf, buffer0 + generated.pos, len);
+  EXPECT (decode_Fixed (&fixed1, &ibuf) == 0);
+  EXPECT (memcmp (&fixed, &fixed1, sizeof(fixed)) == 0);
+
+  // Mixed: fixed and variable-size strings of both types, short and long.
+  make_mixed (&mixed);
+  init_obuf (&generated, buffer0, sizeof(buffer0));
+  init_obuf (&generic, buffer1, sizeof(buffer1));
+  EXPECT (encode_Mixed (&generated, &mixed) == 0);
+  put_mixed (&generic, &mixed);
+  len = generated.size - generated.pos;
+  EXPECT (len == (int) (generic.size - generic.pos));
+  EXPECT (len == size_Mixed (&mixed));
+  EXPECT (memcmp (buffer0 + generated.pos, buffer1 + generic.pos, len) == 0);
+  memset (&mixed1, 0, sizeof(mixed1));
+  init_ibuf (&ibuf, buffer0 + generated.pos, len);
+  EXPECT (decode_Mixed (&mixed1, &ibuf) == 0);
+  EXPECT (memcmp (&mixed, &mixed1, sizeof(mixed)) == 0);
+
+  // a fixed-size value of the wrong length is refused, not mis-encoded.
+  fixed.utf8.len = 2;
+  init_obuf (&generated, buffer0, sizeof(buffer0));
+  EXPECT (encode_Fixed (&generated, &fixed) == -1);
+  EXPECT (size_Fixed (&fixed) == -1);
+  make_fixed (&fixed, 0);
+  fixed.codes.val[1].len = 1;
+  EXPECT (encode_Fixed (&generated, &fixed) == -1);
+  EXPECT (size_Fixed (&fixed) == -1);
+  make_fixed (&fixed, 0);
+  fixed.codes.len = 1;
+  EXPECT (encode_Fixed (&generated, &fixed) == -1);
+  EXPECT (size_Fixed (&fixed) == -1);
+  // and a short one that did get encoded (by hand) is refused by the
+  //  decoder, so nothing it accepts fails to re-encode.
+  make_fixed (&fixed, 0);
+  fixed.octets.len = 2;
+  init_obuf (&generic, buffer1, sizeof(buffer1));
+  put_fixed (&generic, &fixed);
+  init_ibuf (&ibuf, buffer1 + generic.pos, generic.size - generic.pos);
+  EXPECT (decode_Fixed (&fixed1, &ibuf) == -1);
+  init_ibuf (&ibuf, buffer1 + generic.pos, generic.size - generic.pos);
+  EXPECT (decode_Fixed_fields (&fixed1, &ibuf, Fixed_FIELD_octets) == -1);
+  // as is one that doesn't fit.
+  make_fixed (&fixed, 0);
+  init_obuf (&generated, buffer0, size_Fixed (&fixed) - 1);
+  EXPECT (encode_Fixed (&generated, &fixed) == -1);
+
+#ifdef TYB_IOVEC
+  // the fixed-size path honours min_ref: the 5-byte octets is referenced,
+  //  and the gathered encoding is the same.
+  {
+    tyb_ref_t refs[4];
+    struct iovec iov[8];
+    uint8_t gathered[Fixed_MAX_SIZE];
+    int i, n, pos = 0;
+    make_fixed (&fixed, 0);
+    init_obuf (&generic, buffer1, sizeof(buffer1));
+    EXPECT (encode_Fixed (&generic, &fixed) == 0);
+    memset (buffer0, 0xee, sizeof(buffer0));
+    init_obuf_refs (&generated, buffer0, sizeof(buffer0), refs, 4, 5);
+    EXPECT (encode_Fixed (&generated, &fixed) == 0);
+    EXPECT (generated.nrefs == 1 && refs[0].base == fixed.octets.val);
+    n = obuf_iovec (&generated, iov, 8);
+    EXPECT (n == 3);
+    for (i=0; i < n; i++) {
+      memcpy (gathered + pos, iov[i].iov_base, iov[i].iov_len);
+      pos += iov[i].iov_len;
+    }
+    EXPECT (pos == (int) (generic.size - generic.pos));
+    EXPECT (memcmp (gathered, buffer1 + generic.pos, pos) == 0);
+    // and not below it.
+    init_obuf_refs (&generated, buffer0, sizeof(buffer0), refs, 4, 6);
+    EXPECT (encode_Fixed (&generated, &fixed) == 0);
+    EXPECT (generated.nrefs == 0);
+  }
+#endif
+
+  fprintf (stderr, "success.\n");
+  return 0;
+}
@@ -0,0 +1,87 @@
+// -*- Mode: C -*-
+
+// check scatter-gather encoding (TYB_IOVEC) against the plain encoder.
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <stdint.h>
+
+#include "tinyber.h"
+
+#define CHECK(x) do { if ((x) == -1) { fprintf (stderr, "*** line %d ***\n", __LINE__); exit (1); } } while (0)
+
+static uint8_t big0[300];
+static uint8_t big1[1000];
+
+// SEQUENCE { 'abc', big0, 31337, SEQUENCE { big1 } }
+static
+void
+encode_test (buf_t * obuf)
+{
+  asn1int_t n = 31337;
+  unsigned int mark = obuf->pos;
+  unsigned int mark0 = obuf->pos;
+  CHECK (encode_OCTET_STRING (obuf, big1, sizeof(big1)));
+  CHECK (encode_TLV (obuf, mark0, TAG_SEQUENCE, FLAG_STRUCTURED));
+  CHECK (encode_INTEGER (obuf, &n));
+  CHECK (encode_OCTET_STRING (obuf, big0, sizeof(big0)));
+  CHECK (encode_OCTET_STRING (obuf, (uint8_t *) "abc", 3));
+  CHECK (encode_TLV (obuf, mark, TAG_SEQUENCE, FLAG_STRUCTURED));
+}
+
+// encode with references, gather the iovec and compare with <expected>.
+static
+int
+check_refs (unsigned int max_refs, unsigned int min_ref, int n_iov, const uint8_t * expected, int length)
+{
+  uint8_t buffer[2048];
+  uint8_t gathered[2048];
+  tyb_ref_t refs[4];
+  struct iovec iov[8];
+  buf_t obuf;
+  int i, n, pos = 0;
+  memset (buffer, 0xee, sizeof(buffer));
+  init_obuf_refs (&obuf, buffer, sizeof(buffer), refs, max_refs, min_ref);
+  encode_test (&obuf);
+  n = obuf_iovec (&obuf, iov, n_iov);
+  if (n == -1) {
+    return -1;
+  }
+  for (i=0; i < n; i++) {
+    memcpy (gathered + pos, iov[i].iov_base, iov[i].iov_len);
+    pos += iov[i].iov_len;
+  }
+  if (pos != length || memcmp (gathered, expected, length) != 0) {
+    fprintf (stderr, "*** bad gather, max_refs=%d min_ref=%d ***\n", max_refs, min_ref);
+    exit (1);
+  }
+  return n;
+}
+
+int
+main (int argc, char * argv[])
+{
+  uint8_t buffer[2048];
+  buf_t obuf;
+  int length;
+  memset (big0, 'x', sizeof(big0));
+  memset (big1, 'y', sizeof(big1));
+
+  init_obuf (&obuf, buffer, sizeof(buffer));
+  encode_test (&obuf);
+  length = obuf.size - obuf.pos;
+
+  // both payloads referenced: hdr, big0, hdr, big1.
+  CHECK (4 == check_refs (4, 128, 8, obuf.buffer + obuf.pos, length) ? 0 : -1);
+  // room for one reference only: the first one encoded (big1).
+  CHECK (2 == check_refs (1, 128, 8, obuf.buffer + obuf.pos, length) ? 0 : -1);
+  // big0 is below the threshold.
+  CHECK (2 == check_refs (4, 301, 8, obuf.buffer + obuf.pos, length) ? 0 : -1);
+  // no references: one piece.
+  CHECK (1 == check_refs (0, 0, 8, obuf.buffer + obuf.pos, length) ? 0 : -1);
+  // not enough iovec entries.
+  CHECK (-1 == check_refs (4, 128, 3, obuf.buffer + obuf.pos, length) ? 0 : -1);
+  fprintf (stderr, "success.\n");
+  return 0;
+}
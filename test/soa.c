@@ -0,0 +1,107 @@
+// -*- Mode: C -*-
+
+// round-trip a t0 MsgA through the C codec, built either as usual or
+//  with --soa (-DSOA here), where tarray is one array per Pair field.
+//  both builds must agree: the encoding is printed in hex, for the caller
+//  to compare.
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <stdint.h>
+
+#include "t0.h"
+
+#define EXPECT(x) do { if (!(x)) { fprintf (stderr, "*** line %d: %s ***\n", __LINE__, #x); exit (1); } } while (0)
+
+#ifdef SOA
+#define PAIR_A(m, i) ((m)->tarray.a[i])
+#define PAIR_B(m, i) ((m)->tarray.b[i])
+#else
+#define PAIR_A(m, i) ((m)->tarray.val[i].a)
+#define PAIR_B(m, i) ((m)->tarray.val[i].b)
+#endif
+
+// the encoded b of tarray element <i>:
+//  30 LL | 04 03 'abc' | 02 01 32 | 02 02 27 11 | 02 04 xx xx xx xx |
+//  30 20 then four 30 06 02 01 <a> 02 01 <b>.
+static
+uint8_t *
+tarray_b (uint8_t * encoded, int i)
+{
+  return encoded + 2 + 5 + 3 + 4 + 6 + 2 + 8 * i + 7;
+}
+
+static
+void
+make_msga (MsgA_t * msga)
+{
+  int i;
+  memset (msga, 0, sizeof(*msga));
+  memcpy (msga->toctet.val, "abc", 3);
+  msga->toctet.len = 3;
+  msga->t8int = 50;
+  msga->t16int = 10001;
+  msga->t32int = 398234234;
+  msga->tarray.len = 4;
+  for (i=0; i < 4; i++) {
+    // small enough for one-byte INTEGERs: see tarray_b().
+    PAIR_A (msga, i) = i * 20;
+    PAIR_B (msga, i) = 100 + i * 5;
+  }
+  msga->tbool = 1;
+  msga->tenum = Color_green;
+}
+
+int
+main (int argc, char * argv[])
+{
+  uint8_t buffer[MsgA_MAX_SIZE];
+  buf_t obuf, ibuf;
+  MsgA_t msga, msga1;
+  int i, len;
+
+  make_msga (&msga);
+  init_obuf (&obuf, buffer, sizeof(buffer));
+  EXPECT (encode_MsgA (&obuf, &msga) == 0);
+  len = obuf.size - obuf.pos;
+  EXPECT (len == size_MsgA (&msga));
+
+  memset (&msga1, 0xaa, sizeof(msga1));
+  init_ibuf (&ibuf, buffer + obuf.pos, len);
+  EXPECT (decode_MsgA (&msga1, &ibuf) == 0);
+  EXPECT (ibuf.pos == (unsigned int) len);
+  EXPECT (msga1.tarray.len == 4);
+  for (i=0; i < 4; i++) {
+    EXPECT (PAIR_A (&msga1, i) == PAIR_A (&msga, i));
+    EXPECT (PAIR_B (&msga1, i) == PAIR_B (&msga, i));
+  }
+  EXPECT (msga1.t32int == msga.t32int && msga1.tenum == msga.tenum);
+
+  // only tarray, through the field-projection decoder.
+  memset (&msga1, 0xaa, sizeof(msga1));
+  init_ibuf (&ibuf, buffer + obuf.pos, len);
+  EXPECT (decode_MsgA_fields (&msga1, &ibuf, MsgA_FIELD_tarray) == 0);
+  EXPECT (PAIR_B (&msga1, 3) == 115);
+
+  // a constraint violation (b < 100) in one element.
+  EXPECT (*tarray_b (buffer + obuf.pos, 2) == 110);
+  *tarray_b (buffer + obuf.pos, 2) = 99;
+  init_ibuf (&ibuf, buffer + obuf.pos, len);
+  EXPECT (decode_MsgA (&msga1, &ibuf) == -1);
+
+  // too many elements.
+  msga.tarray.len = 5;
+  EXPECT (size_MsgA (&msga) == -1);
+  init_obuf (&obuf, buffer, sizeof(buffer));
+  EXPECT (encode_MsgA (&obuf, &msga) == -1);
+
+  make_msga (&msga);
+  init_obuf (&obuf, buffer, sizeof(buffer));
+  EXPECT (encode_MsgA (&obuf, &msga) == 0);
+  for (i=obuf.pos; i < (int) obuf.size; i++) {
+    printf ("%02x", buffer[i]);
+  }
+  printf ("\n");
+  return 0;
+}
@@ -0,0 +1,124 @@
+// -*- Mode: C -*-
+
+// check the TYB_STATS counters of the generated t0 codec.
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <stdint.h>
+
+#include "t0.h"
+
+#define EXPECT(x) do { if (!(x)) { fprintf (stderr, "*** line %d: %s ***\n", __LINE__, #x); exit (1); } } while (0)
+
+static
+int
+decode_pair (uint8_t * data, unsigned int length)
+{
+  Pair_t pair;
+  buf_t ibuf;
+  init_ibuf (&ibuf, data, length);
+  return decode_Pair (&pair, &ibuf);
+}
+
+int
+main (int argc, char * argv[])
+{
+  uint8_t buffer[1024];
+  Pair_t pair = {10, 101};
+  MsgA_t msga;
+  buf_t obuf, ibuf;
+  t0_stats_t stats;
+  tyb_runtime_stats_t rstats;
+  int i, length;
+
+  // Pair ::= SEQUENCE { a INTEGER (0..255), b INTEGER (100..200) }
+  uint8_t good[]       = {0x30, 0x06, 0x02, 0x01, 0x0a, 0x02, 0x01, 0x65};
+  uint8_t bad_value[]  = {0x30, 0x06, 0x02, 0x01, 0x0a, 0x02, 0x01, 0x10};
+  uint8_t bad_tag[]    = {0x31, 0x06, 0x02, 0x01, 0x0a, 0x02, 0x01, 0x65};
+  uint8_t truncated[]  = {0x30, 0x06, 0x02, 0x01, 0x0a};
+  uint8_t trailing[]   = {0x30, 0x08, 0x02, 0x01, 0x0a, 0x02, 0x01, 0x65, 0x05, 0x00};
+
+  t0_stats (NULL, 1);
+  tyb_runtime_stats (NULL, 1);
+
+  EXPECT (decode_pair (good, sizeof(good)) == 0);
+  EXPECT (decode_pair (bad_value, sizeof(bad_value)) == -1);
+  EXPECT (decode_pair (bad_tag, sizeof(bad_tag)) == -1);
+  EXPECT (decode_pair (truncated, sizeof(truncated)) == -1);
+  EXPECT (decode_pair (trailing, sizeof(trailing)) == -1);
+
+  t0_stats (&stats, 0);
+  EXPECT (stats.decode_Pair.calls == 5);
+  EXPECT (stats.decode_Pair.bytes == sizeof(good));
+  EXPECT (stats.decode_Pair.failures == 4);
+  EXPECT (stats.decode_Pair.fail[TYB_FAIL_CONSTRAINT] == 1);
+  EXPECT (stats.decode_Pair.fail[TYB_FAIL_TAG] == 1);
+  EXPECT (stats.decode_Pair.fail[TYB_FAIL_UNDERFLOW] == 1);
+  EXPECT (stats.decode_Pair.fail[TYB_FAIL_TRAILING] == 1);
+
+  // a MsgA with a bad Pair inside: counted against both.
+  memset (&msga, 0, sizeof(msga));
+  msga.tarray.len = 4;
+  for (i=0; i < 4; i++) {
+    msga.tarray.val[i] = pair;
+  }
+  init_obuf (&obuf, buffer, sizeof(buffer));
+  EXPECT (encode_MsgA (&obuf, &msga) == 0);
+  length = obuf.size - obuf.pos;
+  for (i=obuf.pos; i < obuf.size; i++) {
+    if (buffer[i] == 0x65) {
+      buffer[i] = 0x10;
+      break;
+    }
+  }
+  init_ibuf (&ibuf, buffer + obuf.pos, length);
+  EXPECT (decode_MsgA (&msga, &ibuf) == -1);
+
+  // no room to encode.
+  init_obuf (&obuf, buffer, 4);
+  EXPECT (encode_Pair (&obuf, &pair) == -1);
+
+  t0_stats (&stats, 1);
+  EXPECT (stats.decode_Pair.calls == 6);
+  EXPECT (stats.decode_Pair.fail[TYB_FAIL_CONSTRAINT] == 2);
+  EXPECT (stats.decode_MsgA.calls == 1);
+  EXPECT (stats.decode_MsgA.failures == 1);
+  EXPECT (stats.decode_MsgA.fail[TYB_FAIL_NESTED] == 1);
+  EXPECT (stats.encode_MsgA.calls == 1);
+  EXPECT (stats.encode_MsgA.bytes == (unsigned long) length);
+  EXPECT (stats.encode_Pair.calls == 5);
+  EXPECT (stats.encode_Pair.bytes == 4 * sizeof(good));
+  EXPECT (stats.encode_Pair.fail[TYB_FAIL_UNDERFLOW] == 1);
+
+  // the runtime's counters.
+  tyb_runtime_stats (&rstats, 1);
+  EXPECT (rstats.decode_TLV.calls > 0);
+  EXPECT (rstats.decode_TLV.fail[TYB_FAIL_UNDERFLOW] == 1);
+  EXPECT (rstats.encode_TLV.calls > 0);
+
+  // the field-projection decoder has counters of its own.
+  memset (&msga, 0, sizeof(msga));
+  msga.tarray.len = 4;
+  for (i=0; i < 4; i++) {
+    msga.tarray.val[i] = pair;
+  }
+  init_obuf (&obuf, buffer, sizeof(buffer));
+  EXPECT (encode_MsgA (&obuf, &msga) == 0);
+  init_ibuf (&ibuf, buffer + obuf.pos, obuf.size - obuf.pos);
+  EXPECT (decode_MsgA_fields (&msga, &ibuf, MsgA_FIELD_t8int) == 0);
+  init_ibuf (&ibuf, buffer + obuf.pos, 10);
+  EXPECT (decode_MsgA_fields (&msga, &ibuf, MsgA_FIELD_t8int) == -1);
+  t0_stats (&stats, 1);
+  EXPECT (stats.decode_MsgA.calls == 0);
+  EXPECT (stats.decode_MsgA_fields.calls == 2);
+  EXPECT (stats.decode_MsgA_fields.failures == 1);
+
+  // reset.
+  t0_stats (&stats, 0);
+  EXPECT (stats.decode_Pair.calls == 0);
+  EXPECT (stats.encode_MsgA.calls == 0);
+
+  fprintf (stderr, "success.\n");
+  return 0;
+}
@@ -8,6 +8,7 @@ cdef extern from "t0.h":
         pass
     cdef int decode_ThingMsg (ThingMsg_t * dst, buf_t * src)
     cdef int encode_ThingMsg (buf_t * dst, const ThingMsg_t * src)
+    cdef int size_ThingMsg (const ThingMsg_t * src)
 
     ctypedef struct buf_t:
         uint8_t * buffer
@@ -30,6 +31,9 @@ def try_decode (bytes pkt):
         o.pos = o.size
         r = encode_ThingMsg (&o, &msg)
         if r == 0:
+            if size_ThingMsg (&msg) != o.size - o.pos:
+                # the exact size disagrees with the encoder.
+                return -2
             return o.buffer[o.pos:o.size]
         else:
             return r
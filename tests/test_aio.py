@@ -0,0 +1,167 @@
+import importlib
+import unittest
+
+from tests.utils import generate
+
+try:
+    import asyncio
+    from tinyber import aio
+except (ImportError, SyntaxError):
+    aio = None
+
+
+class FakeTransport(object):
+
+    def __init__(self):
+        self.writes = []
+        self.closed = False
+
+    def write(self, data):
+        self.writes.append(data)
+
+    def close(self):
+        self.closed = True
+
+    def is_closing(self):
+        return self.closed
+
+
+@unittest.skipIf(aio is None, "asyncio helpers need python 3.5+")
+class TestAsyncio(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        generate("tests/test_choice.asn1", "gen_aio")
+        cls.mod = importlib.import_module('tests.gen_aio_ber')
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def messages(self):
+        mod = self.mod
+        return [
+            mod.Choice(mod.Choice1(test1=1, str1=b'abc')),
+            mod.Choice(mod.Choice1(test1=2, str1=b'x' * 129)),
+            mod.Choice(mod.Choice2(test2=3)),
+        ]
+
+    def test_read_message(self):
+        msgs = self.messages()
+        data = b''.join(bytes(m.encode()) for m in msgs)
+        reader = asyncio.StreamReader()
+        for i in range(0, len(data), 5):
+            reader.feed_data(data[i:i + 5])
+        reader.feed_eof()
+        got = []
+        while 1:
+            msg = self.loop.run_until_complete(aio.read_message(reader, self.mod.Choice))
+            if msg is None:
+                break
+            got.append(msg)
+        self.assertEqual([m.encode() for m in got], [m.encode() for m in msgs])
+
+    def test_read_truncated(self):
+        data = bytes(self.messages()[1].encode())
+        reader = asyncio.StreamReader()
+        reader.feed_data(data[:-1])
+        reader.feed_eof()
+        with self.assertRaises(asyncio.IncompleteReadError):
+            self.loop.run_until_complete(aio.read_message(reader, self.mod.Choice))
+
+    def in_loop(self, fun):
+        # call <fun> from a callback of the running loop, as a transport would.
+        done = self.loop.create_future()
+
+        def call():
+            try:
+                done.set_result(fun())
+            except Exception as e:
+                done.set_exception(e)
+        self.loop.call_soon(call)
+        return self.loop.run_until_complete(done)
+
+    def test_protocol(self):
+        msgs = self.messages()
+        data = b''.join(bytes(m.encode()) for m in msgs)
+        received = []
+
+        class Echo(aio.MessageProtocol):
+            def message_received(self, msg):
+                received.append(msg)
+                self.send(msg)
+
+        proto = Echo(self.mod.Choice)
+        transport = FakeTransport()
+        proto.connection_made(transport)
+
+        def receive():
+            proto.data_received(data[:7])
+            proto.data_received(data[7:])
+            # the replies go out together, on the next loop pass.
+            self.assertEqual(transport.writes, [])
+        self.in_loop(receive)
+        self.assertEqual(len(received), 3)
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(transport.writes, [data])
+
+    def test_protocol_bad_message(self):
+        proto = aio.MessageProtocol(self.mod.Choice)
+        transport = FakeTransport()
+        proto.connection_made(transport)
+        self.in_loop(lambda: proto.data_received(b'\x65\x03\x02\x01\x07'))
+        self.assertTrue(transport.closed)
+
+    def test_protocol_after_bad_message(self):
+        # messages already buffered behind a bad one are still delivered.
+        good = [bytes(m.encode()) for m in self.messages()]
+        received = []
+        errors = []
+
+        class Tolerant(aio.MessageProtocol):
+            def message_received(self, msg):
+                received.append(msg)
+
+            def decode_error(self, exc):
+                errors.append(exc)
+
+        proto = Tolerant(self.mod.Choice)
+        proto.connection_made(FakeTransport())
+        self.in_loop(lambda: proto.data_received(good[0] + b'\x65\x03\x02\x01\x07' + good[1] + good[2]))
+        self.assertEqual(len(errors), 1)
+        self.assertEqual([bytes(m.encode()) for m in received], good)
+
+    def test_send_after_connection_lost(self):
+        proto = aio.MessageProtocol(self.mod.Choice)
+        transport = FakeTransport()
+        proto.connection_made(transport)
+        proto.connection_lost(None)
+        self.in_loop(lambda: proto.send(self.messages()[0]))
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(proto.outgoing, [])
+        self.assertEqual(transport.writes, [])
+
+    def test_flow_control(self):
+        msgs = self.messages()
+        proto = aio.MessageProtocol(self.mod.Choice, max_queued=100)
+        transport = FakeTransport()
+        proto.connection_made(transport)
+        proto.pause_writing()
+        self.in_loop(lambda: proto.send(msgs[0]))
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertEqual(transport.writes, [])
+        # the 141-byte message would go over max_queued.
+        self.assertRaises(BufferError, self.in_loop, lambda: proto.send(msgs[1]))
+        drained = self.loop.create_task(proto.drain())
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.assertFalse(drained.done())
+        proto.resume_writing()
+        self.loop.run_until_complete(drained)
+        self.assertEqual(transport.writes, [bytes(msgs[0].encode())])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,263 @@
+import importlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from asn1ate import parser
+from asn1ate.sema import build_semantic_model
+
+from tests.utils import generate
+from tinyber import nodes
+from tinyber.walker import Walker
+
+try:
+    import Cython
+except ImportError:
+    Cython = None
+
+
+def walk(asn1def, nodes):
+    walker = Walker(build_semantic_model(parser.parse_asn1(asn1def))[0], nodes)
+    walker.walk()
+    return walker
+
+
+def build_cbind(infilename, module_name, path, octet_pointers=False, defines=()):
+    # generate <module_name>.[ch] and <module_name>_ber.pyx with the cbind
+    #  backend and build the extension in place under <path>.
+    from Cython.Build import cythonize
+    from setuptools import setup, Extension
+    from tinyber import cbind_nodes
+
+    class FakeArgs(object):
+        pass
+    args = FakeArgs()
+    args.octet_pointers = octet_pointers
+
+    with open(infilename) as f:
+        walker = walk(f.read(), cbind_nodes)
+    cbind_nodes.CBindBackend(args, walker, module_name, path).generate_code()
+
+    name = module_name + '_ber'
+    sources = [name + '.pyx', module_name + '.c', 'tinyber.c']
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        setup(
+            name=name,
+            ext_modules=cythonize([Extension(name, sources, define_macros=[(d, None) for d in defines])], quiet=True),
+            script_args=['-q', 'build_ext', '--inplace'],
+        )
+    finally:
+        os.chdir(cwd)
+
+
+class TestMaxSize(unittest.TestCase):
+
+    def test_multibyte_choice_tag(self):
+        walker = walk("""
+        T DEFINITIONS ::= BEGIN
+          S ::= OCTET STRING SIZE (3)
+          C ::= CHOICE { a [1] S, b [50] S }
+        END
+        """, nodes)
+        sizes = dict((name, node.max_size()) for name, node, decl in walker.defined_types)
+        # [APPLICATION 50] takes two bytes: 7f 32 03 <04 01 xx xx xx>
+        self.assertEqual(sizes['C'], 8)
+
+
+class TestStructOfArrays(unittest.TestCase):
+
+    asn1def = """
+    T DEFINITIONS ::= BEGIN
+      Pair ::= SEQUENCE { a INTEGER (0..255), b OCTET STRING SIZE (0..3) }
+      Msg ::= SEQUENCE { pairs SEQUENCE SIZE (0..4) OF Pair, flags SEQUENCE SIZE (2) OF BOOLEAN }
+    END
+    """
+
+    def header(self, soa):
+        from tinyber import c_nodes
+
+        class FakeArgs(object):
+            pass
+        args = FakeArgs()
+        args.soa = soa
+
+        path = tempfile.mkdtemp()
+        try:
+            c_nodes.CBackend(args, walk(self.asn1def, c_nodes), 'soa', path).generate_code()
+            with open(os.path.join(path, 'soa.h')) as f:
+                return f.read()
+        finally:
+            shutil.rmtree(path)
+
+    def test_layout(self):
+        self.assertIn('Pair_t val[4];', self.header(False))
+        h = self.header(True)
+        self.assertNotIn('Pair_t val[4];', h)
+        self.assertIn('uint8_t a[4];', h)
+        self.assertIn('} b[4];', h)
+        # not a SEQUENCE of records.
+        self.assertIn('asn1bool_t val[2];', h)
+
+    def test_round_trip(self):
+        # test/soa.c round-trips a MsgA (whose tarray is a SEQUENCE OF Pair)
+        #  with either layout; both must give the same encoding.
+        soa = run_c_test(self, 't0.asn', 't0', 'soa.c', soa=True, defines=['SOA'])
+        self.assertEqual(soa, run_c_test(self, 't0.asn', 't0', 'soa.c'))
+        self.assertTrue(soa.startswith(b'303a'))
+
+
+def run_c_test(test, schema, module_name, source, soa=False, defines=()):
+    # generate <module_name>.[ch] from test/<schema> with the C backend, then
+    #  build and run test/<source> against it; it exits with 1 (and says
+    #  which check failed) on any mismatch.  returns what it printed.
+    from tinyber import c_nodes
+
+    class FakeArgs(object):
+        pass
+    args = FakeArgs()
+    args.soa = soa
+
+    path = tempfile.mkdtemp()
+    try:
+        with open(os.path.join('test', schema)) as f:
+            c_nodes.CBackend(args, walk(f.read(), c_nodes), module_name, path).generate_code()
+        # compiled from <path>, so "<module_name>.h" is the one just
+        #  generated, whatever make left in test/.
+        shutil.copy(os.path.join('test', source), path)
+        exe = os.path.join(path, 'test')
+        data = os.path.join('tinyber', 'data')
+        cmd = [os.environ.get('CC', 'cc'), '-I', data, '-I', path, '-o', exe]
+        cmd.extend('-D' + define for define in defines)
+        cmd.extend([os.path.join(path, source), os.path.join(path, module_name + '.c'), os.path.join(data, 'tinyber.c')])
+        try:
+            subprocess.check_call(cmd)
+        except OSError:
+            test.skipTest("needs a C compiler")
+        return subprocess.check_output([exe])
+    finally:
+        shutil.rmtree(path)
+
+
+class TestFieldDecoder(unittest.TestCase):
+
+    # test/fields.c checks decode_MsgA_fields() (the C backend's
+    #  field-projection decoder) against decode_MsgA().
+
+    def test_fields(self):
+        run_c_test(self, 't0.asn', 't0', 'fields.c')
+
+
+class TestConstantHeaders(unittest.TestCase):
+
+    # test/fixed.c checks the encoders that write constant TLV headers
+    #  directly against encode_TLV(), for both string types.
+
+    def test_headers(self):
+        run_c_test(self, 'headers.asn', 'headers', 'fixed.c')
+
+    def test_headers_iovec(self):
+        # the same, plus short fixed-size payloads referenced by min_ref.
+        run_c_test(self, 'headers.asn', 'headers', 'fixed.c', defines=['TYB_IOVEC'])
+
+@unittest.skipIf(Cython is None, "needs Cython")
+class TestCBindBackend(unittest.TestCase):
+
+    module_name = 'gen_cbind'
+    octet_pointers = False
+    defines = ()
+
+    @classmethod
+    def setUpClass(cls):
+        cls.path = tempfile.mkdtemp()
+        build_cbind("tests/test_choice.asn1", cls.module_name, cls.path, cls.octet_pointers, cls.defines)
+        sys.path.insert(0, cls.path)
+        cls.cb = importlib.import_module(cls.module_name + '_ber')
+        generate("tests/test_choice.asn1", cls.module_name)
+        cls.py = importlib.import_module('tests.%s_ber' % cls.module_name)
+
+    @classmethod
+    def tearDownClass(cls):
+        sys.path.remove(cls.path)
+        shutil.rmtree(cls.path)
+
+    def messages(self, mod):
+        return [
+            mod.Choice(mod.Choice1(test1=7, str1=b'x' * 129)),
+            mod.Choice(mod.Choice1(test1=255, str1=b'')),
+            mod.Choice(mod.Choice2(test2=0)),
+        ]
+
+    def test_same_encoding(self):
+        for a, b in zip(self.messages(self.py), self.messages(self.cb)):
+            self.assertEqual(a.encode(), b.encode())
+
+    def test_encode_into(self):
+        buffer = bytearray(300)
+        offset = 0
+        for m in self.messages(self.cb):
+            data = m.encode()
+            self.assertEqual(m.encode_into(buffer, offset), len(data))
+            self.assertEqual(bytes(buffer[offset:offset + len(data)]), data)
+            offset += len(data)
+        with self.assertRaises(ValueError):
+            self.messages(self.cb)[0].encode_into(buffer, 200)
+        for offset in (len(buffer), len(buffer) + 1, -1):
+            with self.assertRaises(ValueError):
+                self.messages(self.cb)[2].encode_into(buffer, offset)
+        data = self.messages(self.cb)[2].encode()
+        self.assertEqual(self.messages(self.cb)[2].encode_into(buffer, len(buffer) - len(data)), len(data))
+        self.assertEqual(bytes(buffer[-len(data):]), data)
+
+    def test_bytes_like(self):
+        # OCTET STRING values can be any bytes-like object.
+        cb = self.cb
+        for value in (bytearray(b'abc'), memoryview(b'xabc')[1:], bytearray()):
+            m = cb.Choice1(test1=7, str1=value)
+            self.assertEqual(m.encode(), cb.Choice1(test1=7, str1=bytes(bytearray(value))).encode())
+
+    def test_round_trip(self):
+        for m in self.messages(self.cb):
+            v = self.cb.Choice().decode(m.encode())
+            self.assertEqual(repr(v), repr(m))
+            self.assertEqual(v.encode(), m.encode())
+
+    def test_decode_errors(self):
+        cb = self.cb
+        data = cb.Choice(cb.Choice2(test2=200)).encode()
+        for bad in (data[:-1], data.replace(b'\x02\x02', b'\x04\x02'), data.replace(b'\x61', b'\x62', 1)):
+            with self.assertRaises(cb.DecodingError):
+                cb.Choice().decode(bad)
+        with self.assertRaises(cb.ExtraData):
+            cb.Choice().decode(data + b'\x00')
+
+    def test_encode_errors(self):
+        cb = self.cb
+        with self.assertRaises(ValueError):
+            cb.Choice1(test1=1, str1=b'x' * 130).encode()
+        with self.assertRaises(TypeError):
+            cb.Choice1(test1=1, str1=None).encode()
+        with self.assertRaises(cb.BadChoice):
+            cb.Choice(cb.Choice2).encode()
+
+
+class TestCBindPointers(TestCBindBackend):
+
+    # OCTET STRINGs as pointers into the input/the python bytes.
+    module_name = 'gen_cbindp'
+    octet_pointers = True
+
+
+class TestCBindIOVec(TestCBindBackend):
+
+    # buf_t has extra fields with TYB_IOVEC, which the module must set.
+    module_name = 'gen_cbindv'
+    defines = ['TYB_IOVEC']
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import binascii
+import unittest
+
+from tinyber import codec
+
+
+def HD(s):
+    return binascii.unhexlify(s)
+
+
+class TestEncoder(unittest.TestCase):
+
+    def encode_integer(self, n):
+        e = codec.Encoder()
+        e.emit_INTEGER(n)
+        return bytes(e.done())
+
+    def test_integer(self):
+        self.assertEqual(self.encode_integer(0), HD('020100'))
+        self.assertEqual(self.encode_integer(127), HD('02017f'))
+        self.assertEqual(self.encode_integer(128), HD('02020080'))
+        self.assertEqual(self.encode_integer(256), HD('02020100'))
+        self.assertEqual(self.encode_integer(-1), HD('0201ff'))
+        self.assertEqual(self.encode_integer(-128), HD('020180'))
+        self.assertEqual(self.encode_integer(-129), HD('0202ff7f'))
+        self.assertEqual(self.encode_integer(1 << 32), HD('02050100000000'))
+
+    def test_long_length(self):
+        e = codec.Encoder()
+        e.emit_OCTET_STRING(b'x' * 0x100)
+        data = bytes(e.done())
+        self.assertEqual(data[:4], HD('04820100'))
+        self.assertEqual(len(data), 0x104)
+
+    def test_grow(self):
+        # start tiny so the buffer has to grow several times.
+        e = codec.Encoder(4)
+        with e.TLV(codec.TAG.SEQUENCE, codec.FLAG.STRUCTURED):
+            for i in range(100):
+                e.emit_BOOLEAN(i & 1)
+        data = bytes(e.done())
+        self.assertEqual(data[:4], HD('3082012c'))
+        self.assertEqual(data[4:10], HD('0101ff010100'))
+        self.assertEqual(len(data), 4 + 300)
+
+
+class Blob(codec.ASN1):
+    __slots__ = ('value',)
+    max_size = 40
+
+    def _encode(self, dst):
+        dst.emit_OCTET_STRING(self.value)
+
+
+class TestEncodeInto(unittest.TestCase):
+
+    def test_encode_into(self):
+        buffer = bytearray(b'-' * 20)
+        n = Blob(b'abc').encode_into(buffer, 3)
+        self.assertEqual(n, 5)
+        self.assertEqual(bytes(buffer), b'---' + HD('0403') + b'abc' + b'-' * 12)
+        # any writable buffer.
+        view = memoryview(buffer)
+        self.assertEqual(Blob(b'xy').encode_into(view[10:]), 4)
+        self.assertEqual(bytes(buffer[10:14]), HD('0402') + b'xy')
+        with self.assertRaises(ValueError):
+            Blob(b'abc').encode_into(buffer, 16)
+
+    def test_pooled(self):
+        # the same encoder each time, but every result is a copy.
+        e = codec.get_encoder(100)
+        codec.put_encoder(e)
+        a = Blob(b'a' * 30).encode()
+        b = Blob(b'b').encode()
+        self.assertEqual(bytes(a), HD('041e') + b'a' * 30)
+        self.assertEqual(bytes(b), HD('0401') + b'b')
+        self.assertTrue(codec.get_encoder(100) is e)
+        # (bigger than the pool keeps: a new one each time)
+        self.assertFalse(codec.get_encoder(codec.MAX_POOLED_SIZE) is e)
+
+    def test_pooled_large_max_size(self):
+        # a max_size past MAX_POOLED_SIZE still starts from the pooled encoder.
+        class BigBlob(Blob):
+            max_size = codec.MAX_POOLED_SIZE * 16
+        e = codec.get_encoder(codec.MAX_POOLED_SIZE)
+        codec.put_encoder(e)
+        self.assertTrue(codec.get_encoder(BigBlob.max_size) is e)
+        codec.put_encoder(e)
+        self.assertEqual(bytes(BigBlob(b'big').encode()), HD('0403') + b'big')
+        self.assertTrue(codec.get_encoder(100) is e)
+
+    def test_threads(self):
+        import threading
+        e = codec.get_encoder(100)
+        codec.put_encoder(e)
+        other = []
+        t = threading.Thread(target=lambda: other.append(codec.get_encoder(100)))
+        t.start()
+        t.join()
+        self.assertFalse(other[0] is e)
+        self.assertTrue(codec.get_encoder(100) is e)
+
+
+class TestDecoder(unittest.TestCase):
+
+    def test_views(self):
+        data = HD('300a0403616263040378797a')
+        src = codec.Decoder(data, views=True)
+        seq = src.next(codec.TAG.SEQUENCE, codec.FLAG.STRUCTURED)
+        a = seq.next_OCTET_STRING(0, 10)
+        b = seq.next_OCTET_STRING(3, 3)
+        self.assertTrue(isinstance(a, memoryview))
+        self.assertEqual(a.tobytes(), b'abc')
+        self.assertEqual(b.tobytes(), b'xyz')
+        self.assertTrue(seq.done())
+
+    def test_views_constraints(self):
+        data = HD('0403616263')
+        with self.assertRaises(codec.ConstraintViolation):
+            codec.Decoder(data, views=True).next_OCTET_STRING(4, 10)
+        with self.assertRaises(codec.ConstraintViolation):
+            codec.Decoder(data, views=True).next_OCTET_STRING(0, 2)
+
+    def test_negative_integer(self):
+        for h, n in (('0201ff', -1), ('020180', -128), ('0202ff7f', -129),
+                     ('0203ff0000', -65536), ('02020080', 128)):
+            self.assertEqual(codec.Decoder(HD(h)).next_INTEGER(None, None), n)
+            self.assertEqual(codec.int_from_bytes(HD(h)[2:]), n)
+
+    def test_copy_by_default(self):
+        v = codec.Decoder(HD('0403616263')).next_OCTET_STRING(0, 10)
+        self.assertFalse(isinstance(v, memoryview))
+        self.assertEqual(v, b'abc')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import array
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from asn1ate import parser
+from asn1ate.sema import build_semantic_model
+
+from tinyber import py_nodes
+from tinyber.walker import Walker
+
+
+class Args(object):
+    no_standalone = True
+
+    def __init__(self, compact):
+        self.compact = compact
+
+
+def generate(path, name, compact):
+    with open(os.path.join('test', 't0.asn')) as f:
+        modules = build_semantic_model(parser.parse_asn1(f.read()))
+    walker = Walker(modules[0], py_nodes)
+    walker.walk()
+    py_nodes.PythonBackend(Args(compact), walker, name, path).generate_code()
+
+
+def make_msgs(m):
+    a = m.MsgA()
+    a.toctet = b'abc'
+    a.t8int = 1
+    a.t16int = 2
+    a.t32int = 3
+    a.tarray = [m.Pair(a=i, b=100 + i) for i in range(4)]
+    a.tbool = True
+    a.tenum = m.Color('green')
+    b = m.MsgB(a=-5, b=True, x=[True], y=[7, 8])
+    return [m.ThingMsg(a), m.ThingMsg(b)]
+
+
+class TestCompact(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.path = tempfile.mkdtemp()
+        sys.path.insert(0, cls.path)
+        generate(cls.path, 'default', False)
+        generate(cls.path, 'compact', True)
+
+    @classmethod
+    def tearDownClass(cls):
+        sys.path.remove(cls.path)
+        shutil.rmtree(cls.path)
+
+    def decode(self, m, data):
+        msg = m.ThingMsg()
+        msg.decode(data)
+        return msg
+
+    def test_default_attributes(self):
+        # without --compact, objects take attributes of their own and weak references.
+        import weakref
+        import default_ber as m
+        msg = self.decode(m, make_msgs(m)[0].encode())
+        for ob in (msg, msg.value, msg.value.tenum, msg.value.tarray[0]):
+            ob.note = 'x'
+            self.assertEqual(ob.note, 'x')
+            self.assertTrue(weakref.ref(ob)() is ob)
+        self.assertEqual(m.Pair().value, None)
+        self.assertEqual(repr(msg.value.tarray[0]), '<Pair a=0 b=100>')
+
+    def test_slots(self):
+        import compact_ber as m
+        for msg in make_msgs(m):
+            msg = self.decode(m, msg.encode())
+            for ob in (msg, msg.value):
+                self.assertFalse(hasattr(ob, '__dict__'))
+        msg = self.decode(m, make_msgs(m)[0].encode())
+        self.assertFalse(hasattr(msg.value.tenum, '__dict__'))
+        self.assertFalse(hasattr(msg.value.tarray[0], '__dict__'))
+        self.assertEqual(m.Pair().value, None)
+        self.assertRaises(AttributeError, setattr, msg.value, 'nonesuch', 1)
+        self.assertRaises(AttributeError, setattr, m.Color('red'), 'nonesuch', 1)
+
+    def test_compact(self):
+        import default_ber
+        import compact_ber as m
+        for msg, default_msg in zip(make_msgs(m), make_msgs(default_ber)):
+            self.assertEqual(msg.encode(), default_msg.encode())
+        data_a, data_b = [msg.encode() for msg in make_msgs(m)]
+        a0 = self.decode(m, data_a).value
+        a1 = self.decode(m, data_a).value
+        self.assertTrue(isinstance(a0.tarray, tuple))
+        self.assertEqual(a0.tarray[3].b, 103)
+        # one Color('green') for every message.
+        self.assertEqual(a0.tenum.value, 'green')
+        self.assertTrue(a0.tenum is a1.tenum)
+        # which can't be changed, by mistake or by decoding into it.
+        self.assertRaises(AttributeError, setattr, a0.tenum, 'value', 'red')
+        self.assertRaises(AttributeError, delattr, a0.tenum, 'value')
+        self.assertRaises(AttributeError, a0.tenum.decode, m.Color('red').encode())
+        self.assertEqual(a1.tenum.value, 'green')
+        self.assertTrue(isinstance(a0.tenum, m.Color))
+        self.assertEqual(repr(a0.tenum), repr(m.Color('green')))
+        self.assertEqual(a0.tenum.encode(), m.Color('green').encode())
+        # instances of their own are not affected.
+        color = m.Color('green')
+        color.value = 'red'
+        self.assertEqual(color.value, 'red')
+        b = self.decode(m, data_b).value
+        self.assertEqual(b.y, array.array('B', [7, 8]))
+        self.assertEqual(b.x, (True,))
+        self.assertEqual(m.ThingMsg(b).encode(), data_b)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from tests.utils import generate
+
+try:
+    import Cython
+    from tinyber import _codec
+except ImportError:
+    _codec = None
+
+
+def build_cython(infilename, module_name, path):
+    # generate <module_name>_ber.pyx with the cython backend and build it
+    #  in place under <path>.
+    from asn1ate import parser
+    from asn1ate.sema import build_semantic_model
+    from Cython.Build import cythonize
+    from setuptools import setup, Extension
+    from tinyber import cy_nodes
+    from tinyber.walker import Walker
+
+    with open(infilename) as f:
+        modules = build_semantic_model(parser.parse_asn1(f.read()))
+    walker = Walker(modules[0], cy_nodes)
+    walker.walk()
+    cy_nodes.CythonBackend(None, walker, module_name, path).generate_code()
+
+    top = os.path.dirname(os.path.dirname(os.path.abspath(_codec.__file__)))
+    name = module_name + '_ber'
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        setup(
+            name=name,
+            ext_modules=cythonize([Extension(name, [name + '.pyx'])], include_path=[top], quiet=True),
+            script_args=['-q', 'build_ext', '--inplace'],
+        )
+    finally:
+        os.chdir(cwd)
+
+
+@unittest.skipIf(_codec is None, "needs Cython and the tinyber._codec extension")
+class TestCythonBackend(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.path = tempfile.mkdtemp()
+        build_cython("tests/test_choice.asn1", "gen_cy", cls.path)
+        sys.path.insert(0, cls.path)
+        cls.cy = importlib.import_module('gen_cy_ber')
+        generate("tests/test_choice.asn1", "gen_cy")
+        cls.py = importlib.import_module('tests.gen_cy_ber')
+
+    @classmethod
+    def tearDownClass(cls):
+        sys.path.remove(cls.path)
+        shutil.rmtree(cls.path)
+
+    def messages(self, mod):
+        return [
+            mod.Choice(mod.Choice1(test1=7, str1=b'x' * 129)),
+            mod.Choice(mod.Choice1(test1=255, str1=b'')),
+            mod.Choice(mod.Choice2(test2=0)),
+        ]
+
+    def test_same_encoding(self):
+        for a, b in zip(self.messages(self.py), self.messages(self.cy)):
+            self.assertEqual(a.encode(), b.encode())
+
+    def test_encode_into(self):
+        buffer = bytearray(300)
+        offset = 0
+        for m in self.messages(self.cy):
+            data = m.encode()
+            self.assertEqual(m.encode_into(buffer, offset), len(data))
+            self.assertEqual(bytes(buffer[offset:offset + len(data)]), data)
+            offset += len(data)
+        with self.assertRaises(ValueError):
+            self.messages(self.cy)[0].encode_into(buffer, 200)
+
+    def test_round_trip(self):
+        for m in self.messages(self.cy):
+            v = self.cy.Choice()
+            v.decode(m.encode())
+            self.assertEqual(repr(v), repr(m))
+            self.assertEqual(v.encode(), m.encode())
+
+    def test_typed_fields(self):
+        v = self.cy.Choice2(test2=200)
+        with self.assertRaises(TypeError):
+            v.test2 = 'x'
+        with self.assertRaises(OverflowError):
+            v.test2 = 256
+
+    def test_errors(self):
+        cy = self.cy
+        data = cy.Choice(cy.Choice2(test2=200)).encode()
+        for bad in (data[:-1], data.replace(b'\x02\x02', b'\x04\x02'), data.replace(b'\x61', b'\x62', 1)):
+            with self.assertRaises(cy.DecodingError):
+                cy.Choice().decode(bad)
+        with self.assertRaises(cy.BadChoice):
+            cy.Choice(cy.Choice2).encode()
+
+    def test_batch(self):
+        msgs = self.messages(self.cy)
+        data = b''.join(m.encode() for m in msgs)
+        got = _codec.decode_many(self.cy.Choice, data)
+        self.assertEqual([repr(m) for m in got], [repr(m) for m in msgs])
+
+
+if __name__ == '__main__':
+    unittest.main()
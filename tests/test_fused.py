@@ -0,0 +1,73 @@
+import binascii
+import importlib
+import unittest
+
+from tests.utils import generate
+
+
+def HD(s):
+    return binascii.unhexlify(s)
+
+
+class TestFusedDecode(unittest.TestCase):
+
+    # Choice1 ::= SEQUENCE { test1 INTEGER (0..255), str1 OCTET STRING SIZE (0..129) }
+    # test1 has a fused fast path, str1 (too long for a one-byte length) does not.
+
+    @classmethod
+    def setUpClass(cls):
+        generate("tests/test_choice.asn1", "gen_fused")
+        cls.mod = importlib.import_module('tests.gen_fused_ber')
+
+    def decode(self, h):
+        v = self.mod.Choice1()
+        v.decode(HD(h))
+        return v
+
+    def test_edges(self):
+        for h, n in (('02010004026162', 0), ('0202007f0400', 127),
+                     ('020200ff0400', 255), ('0201050400', 5)):
+            v = self.decode('30%02x' % (len(h) // 2) + h)
+            self.assertEqual(v.test1, n)
+
+    def test_constraints(self):
+        for h in ('0202010004 00', '0201ff0400', '0201800400', '02040000010004 00'):
+            h = h.replace(' ', '')
+            with self.assertRaises(self.mod.DecodingError):
+                self.decode('30%02x' % (len(h) // 2) + h)
+
+    def test_fallback(self):
+        # long-form length: legal BER, but not one of the fused prefixes.
+        v = self.decode('300702810105048100')
+        self.assertEqual(v.test1, 5)
+        self.assertEqual(v.str1, b'')
+        # wrong tag, and a value running past the end of the SEQUENCE.
+        with self.assertRaises(self.mod.UnexpectedType):
+            self.decode('30050401050400')
+        with self.assertRaises(self.mod.Underflow):
+            self.decode('30030202000400')
+
+    def test_memoryview(self):
+        # the cython Decoder only takes bytes.
+        if not self.mod.FUSED_DECODE:
+            self.skipTest('no fused decoders over tinyber._codec')
+        for h in ('300702010504026162', '3008020200ff04026162', '300702810105048100'):
+            data = HD(h)
+            v = self.mod.Choice1()
+            v.decode(memoryview(data))
+            expected = self.decode(h)
+            self.assertEqual(v.test1, expected.test1)
+            self.assertEqual(bytes(bytearray(v.str1)), bytes(expected.str1))
+
+    def test_round_trip(self):
+        mod = self.mod
+        for n in (0, 1, 127, 128, 255):
+            for s in (b'', b'x', b'y' * 129):
+                data = mod.Choice1(test1=n, str1=s).encode()
+                v = mod.Choice1()
+                v.decode(data)
+                self.assertEqual((v.test1, v.str1), (n, s))
+
+
+if __name__ == '__main__':
+    unittest.main()
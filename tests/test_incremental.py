@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from tinyber import gen
+
+PAIR = """
+Thing DEFINITIONS ::= BEGIN
+  Pair ::= SEQUENCE { a INTEGER (0..255), b INTEGER (%d..200) }
+END
+"""
+
+
+class Args(object):
+    no_standalone = False
+    octet_pointers = False
+    soa = False
+    jobs = 1
+
+    def __init__(self, lang, files, outdir, cache_dir=None):
+        self.lang = lang
+        self.file = files
+        self.outdir = outdir
+        self.cache_dir = cache_dir
+
+
+class TestIncremental(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.path, 'cache')
+        self.spec = os.path.join(self.path, 'thing.asn')
+        self.write_spec(100)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write_spec(self, low):
+        with open(self.spec, 'w') as f:
+            f.write(PAIR % (low,))
+
+    def test_cache(self):
+        gen.go(Args('python', [self.spec], self.path, self.cache_dir))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+        # the second run doesn't parse at all.
+        parse_asn1 = gen.parser.parse_asn1
+
+        def fail(text):
+            raise AssertionError('parsed again')
+        gen.parser.parse_asn1 = fail
+        try:
+            gen.go(Args('python', [self.spec], self.path, self.cache_dir))
+            # ...until the spec changes.
+            self.write_spec(101)
+            self.assertRaises(AssertionError, gen.go, Args('python', [self.spec], self.path, self.cache_dir))
+        finally:
+            gen.parser.parse_asn1 = parse_asn1
+
+    def test_bad_entry(self):
+        gen.go(Args('python', [self.spec], self.path, self.cache_dir))
+        # e.g. from a crashed run: rebuilt.
+        [name] = os.listdir(self.cache_dir)
+        path = os.path.join(self.cache_dir, name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:len(data) // 2])
+        gen.go(Args('python', [self.spec], self.path, self.cache_dir))
+        self.assertEqual(os.listdir(self.cache_dir), [name])
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), data)
+
+    @unittest.skipIf(not hasattr(os, 'getuid'), "needs posix permissions")
+    def test_cache_permissions(self):
+        gen.go(Args('python', [self.spec], self.path, self.cache_dir))
+        self.assertEqual(os.stat(self.cache_dir).st_mode & 0o077, 0)
+        # a directory others can write to is neither read nor written.
+        os.chmod(self.cache_dir, 0o777)
+        self.assertFalse(gen.cache_dir_ok(self.cache_dir))
+        [name] = os.listdir(self.cache_dir)
+        os.unlink(os.path.join(self.cache_dir, name))
+        gen.go(Args('python', [self.spec], self.path, self.cache_dir))
+        self.assertEqual(os.listdir(self.cache_dir), [])
+        os.chmod(self.cache_dir, 0o755)
+        self.assertTrue(gen.cache_dir_ok(self.cache_dir))
+        self.assertFalse(gen.cache_dir_ok(self.spec))
+
+    def test_unchanged_outputs(self):
+        gen.go(Args('c', [self.spec], self.path))
+        outputs = [os.path.join(self.path, name) for name in ('thing.c', 'thing.h', 'tinyber.c', 'tinyber.h')]
+        for path in outputs:
+            os.utime(path, (1000000000, 1000000000))
+        gen.go(Args('c', [self.spec], self.path))
+        for path in outputs:
+            self.assertEqual(os.stat(path).st_mtime, 1000000000)
+        self.write_spec(101)
+        gen.go(Args('c', [self.spec], self.path))
+        self.assertNotEqual(os.stat(outputs[0]).st_mtime, 1000000000)
+        self.assertEqual(os.stat(outputs[2]).st_mtime, 1000000000)
+        with open(outputs[0]) as f:
+            self.assertTrue('intval < 101' in f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import importlib
+import os
+import shutil
+import tempfile
+import unittest
+
+from tinyber import index
+from tests.utils import generate
+
+
+class TestIndex(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        generate("tests/test_choice.asn1", "gen_index")
+        cls.mod = importlib.import_module('tests.gen_index_ber')
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.data = os.path.join(self.path, 'records.ber')
+        self.msgs = self.messages(range(30))
+        self.write(self.msgs)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def messages(self, numbers):
+        mod = self.mod
+        r = []
+        for i in numbers:
+            if i % 3:
+                r.append(mod.Choice(mod.Choice2(test2=i)))
+            else:
+                r.append(mod.Choice(mod.Choice1(test1=i, str1=b'x' * i)))
+        return r
+
+    def number(self, msg):
+        if isinstance(msg.value, self.mod.Choice1):
+            return msg.value.test1
+        return msg.value.test2
+
+    def write(self, msgs, mode='wb'):
+        with open(self.data, mode) as f:
+            for msg in msgs:
+                f.write(bytes(msg.encode()))
+
+    def test_build(self):
+        idx = index.get_index(self.data)
+        self.assertTrue(os.path.exists(self.data + '.tyx'))
+        self.assertEqual(len(idx), 30)
+        self.assertEqual(idx.counts(), {0: 10, 1: 20})
+        self.assertEqual(idx.where(0), list(range(0, 30, 3)))
+        offset, size, tag, flags = idx[3]
+        self.assertEqual(tag, 0)
+        self.assertEqual(flags, 0x60)
+        with self.mod.RecordFile(self.data) as f:
+            for i in (0, 3, 29):
+                msg = f.decode_at(self.mod.Choice, idx.offsets[i])
+                self.assertEqual(bytes(msg.encode()), bytes(self.msgs[i].encode()))
+            self.assertEqual(idx.bisect(f, self.mod.Choice, self.number, 17), 17)
+
+    def test_load(self):
+        built = index.get_index(self.data)
+        loaded = index.load_index(self.data)
+        for name, itemsize in index.COLUMNS:
+            self.assertEqual(getattr(loaded, name), getattr(built, name))
+
+    def test_stale(self):
+        index.get_index(self.data)
+        self.write(self.messages([30, 31]), 'ab')
+        self.assertRaises(index.StaleIndex, index.load_index, self.data)
+        self.assertEqual(len(index.get_index(self.data)), 32)
+        self.assertEqual(len(index.load_index(self.data)), 32)
+        # same size, different mtime.
+        st = os.stat(self.data)
+        os.utime(self.data, (st.st_atime, st.st_mtime - 10))
+        self.assertRaises(index.StaleIndex, index.load_index, self.data)
+
+    def test_save_failure(self):
+        # an index can't replace a directory: the temp file is removed.
+        idx = index.build_index(self.data)
+        target = os.path.join(self.path, 'dir.tyx')
+        os.mkdir(target)
+        self.assertRaises(OSError, idx.save, target)
+        self.assertEqual(sorted(os.listdir(self.path)), ['dir.tyx', 'records.ber'])
+        # and replaces an existing one.
+        index.get_index(self.data)
+        idx.save(self.data + '.tyx')
+        self.assertEqual(len(index.load_index(self.data)), 30)
+
+    def test_bad_index(self):
+        with open(self.data + '.tyx', 'wb') as f:
+            f.write(b'junk')
+        self.assertRaises(index.StaleIndex, index.load_index, self.data)
+        self.assertEqual(len(index.get_index(self.data)), 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from asn1ate import parser
+from asn1ate.sema import build_semantic_model
+
+from tinyber import py_nodes
+from tinyber.walker import Walker
+
+
+class Args(object):
+    def __init__(self, no_standalone, lazy):
+        self.no_standalone = no_standalone
+        self.lazy = lazy
+
+
+def generate(path, name, no_standalone, lazy):
+    with open(os.path.join('test', 't0.asn')) as f:
+        modules = build_semantic_model(parser.parse_asn1(f.read()))
+    walker = Walker(modules[0], py_nodes)
+    walker.walk()
+    py_nodes.PythonBackend(Args(no_standalone, lazy), walker, name, path).generate_code()
+
+
+def make_msg(m):
+    msg = m.MsgA()
+    msg.toctet = b'abc'
+    msg.t8int = 1
+    msg.t16int = 2
+    msg.t32int = 3
+    msg.tarray = [m.Pair(a=i, b=100 + i) for i in range(4)]
+    msg.tbool = True
+    msg.tenum = m.Color('green')
+    return m.ThingMsg(msg)
+
+
+class TestLazy(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.path = tempfile.mkdtemp()
+        sys.path.insert(0, cls.path)
+        generate(cls.path, 'eager', True, False)
+        generate(cls.path, 'lazy', True, True)
+        generate(cls.path, 'lazy_standalone', False, True)
+
+    @classmethod
+    def tearDownClass(cls):
+        sys.path.remove(cls.path)
+        shutil.rmtree(cls.path)
+
+    def test_lazy(self):
+        import eager_ber
+        import lazy_ber
+        self.assertEqual(type(lazy_ber).__name__, 'LazyModule')
+        # nothing is built at import...
+        self.assertFalse('ThingMsg' in lazy_ber._module.__dict__)
+        # ...and using ThingMsg builds it, and the classes it uses, but no more.
+        data = make_msg(lazy_ber).encode()
+        for name in ('ThingMsg', 'MsgA', 'MsgB', 'Pair', 'Color'):
+            self.assertTrue(name in lazy_ber._module.__dict__)
+        self.assertFalse('StringThing' in lazy_ber._module.__dict__)
+        self.assertEqual(data, make_msg(eager_ber).encode())
+        msg = lazy_ber.ThingMsg()
+        msg.decode(data)
+        self.assertTrue(isinstance(msg.value, lazy_ber.MsgA))
+        self.assertEqual(msg.value.tarray[3].b, 103)
+        self.assertEqual(lazy_ber.MsgA.__name__, 'MsgA')
+        self.assertRaises(AttributeError, getattr, lazy_ber, 'NoSuchType')
+
+    def test_standalone(self):
+        import lazy_standalone_ber as m
+        m.build_all()
+        msg = m.ThingMsg()
+        msg.decode(make_msg(m).encode())
+        self.assertEqual(msg.value.tenum.value, 'green')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from tinyber import gen
+from tinyber.gen import go
+
+COMMON = """
+Common DEFINITIONS ::= BEGIN
+  Pair ::= SEQUENCE { a INTEGER (0..255), b OCTET STRING SIZE (0..8) }
+END
+"""
+
+APP = """
+App DEFINITIONS ::= BEGIN
+  IMPORTS Pair FROM Common;
+  Msg ::= SEQUENCE { id INTEGER (0..65535), pair Pair, pairs SEQUENCE SIZE (0..4) OF Pair }
+END
+"""
+
+# two modules in one file, one of them referring to the other by name.
+BOTH = """
+Base-Types DEFINITIONS ::= BEGIN
+  Point ::= SEQUENCE { x INTEGER (0..255), y INTEGER (0..255) }
+END
+Shapes DEFINITIONS ::= BEGIN
+  Line ::= SEQUENCE { a Base-Types.Point, b Base-Types.Point }
+END
+"""
+
+
+class Args(object):
+    no_standalone = False
+    octet_pointers = False
+    soa = False
+
+    def __init__(self, lang, files, outdir, jobs=2):
+        self.lang = lang
+        self.file = files
+        self.outdir = outdir
+        self.jobs = jobs
+
+
+class TestMultiModule(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        sys.path.insert(0, self.path)
+
+    def tearDown(self):
+        sys.path.remove(self.path)
+        shutil.rmtree(self.path)
+        for name in ('app_ber', 'common_ber', 'Base_Types_ber', 'Shapes_ber'):
+            sys.modules.pop(name, None)
+
+    def write(self, name, text):
+        filename = os.path.join(self.path, name)
+        with open(filename, 'w') as f:
+            f.write(text)
+        return filename
+
+    def test_python(self):
+        # the importing module comes first: the order of the files doesn't matter.
+        files = [self.write('app.asn', APP), self.write('common.asn', COMMON)]
+        go(Args('python', files, self.path))
+        import app_ber
+        import common_ber
+        self.assertTrue(app_ber.Pair is common_ber.Pair)
+        msg = app_ber.Msg(id=5, pair=common_ber.Pair(a=1, b=b'x'), pairs=[common_ber.Pair(a=2, b=b'yz')])
+        msg2 = app_ber.Msg()
+        msg2.decode(msg.encode())
+        self.assertEqual(msg2.pairs[0].b, b'yz')
+        self.assertEqual(msg2.encode(), msg.encode())
+
+    def test_c(self):
+        files = [self.write('app.asn', APP), self.write('common.asn', COMMON)]
+        go(Args('c', files, self.path))
+        with open(os.path.join(self.path, 'app.h')) as f:
+            header = f.read()
+        self.assertTrue('#include "common.h"' in header)
+        # Pair_MAX_SIZE is 16: 2 + 2 + 4 * 16 + header.
+        self.assertTrue('#define Msg_MAX_SIZE 89' in header)
+
+    @unittest.skipIf(not hasattr(gen.multiprocessing, 'get_context'), "python 2 always forks")
+    def test_no_fork(self):
+        # where the 'fork' start method doesn't exist, jobs > 1 runs serially.
+        def get_context(method):
+            raise ValueError('cannot find context for %r' % (method,))
+        saved = gen.multiprocessing.get_context
+        gen.multiprocessing.get_context = get_context
+        try:
+            self.assertEqual(gen.get_pool(2), None)
+            files = [self.write('app.asn', APP), self.write('common.asn', COMMON)]
+            go(Args('python', files, self.path))
+        finally:
+            gen.multiprocessing.get_context = saved
+        import app_ber
+        self.assertTrue(app_ber.Pair is sys.modules['common_ber'].Pair)
+
+    def test_one_file(self):
+        go(Args('python', [self.write('both.asn', BOTH)], self.path, jobs=1))
+        import Shapes_ber
+        line = Shapes_ber.Line(a=Shapes_ber.Point(x=1, y=2), b=Shapes_ber.Point(x=3, y=4))
+        line2 = Shapes_ber.Line()
+        line2.decode(line.encode())
+        self.assertEqual(line2.b.y, 4)
+
+    def test_unknown_module(self):
+        files = [self.write('app.asn', APP)]
+        self.assertRaises(ValueError, go, Args('python', files, self.path))
+
+    def test_cython(self):
+        files = [self.write('app.asn', APP), self.write('common.asn', COMMON)]
+        self.assertRaises(NotImplementedError, go, Args('cython', files, self.path, jobs=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
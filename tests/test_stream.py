@@ -0,0 +1,188 @@
+import importlib
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from tests.utils import generate
+
+
+class TestStreamDecoder(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        generate("tests/test_choice.asn1", "gen_stream")
+        cls.mod = importlib.import_module('tests.gen_stream_ber')
+
+    def messages(self):
+        mod = self.mod
+        r = []
+        for i in range(20):
+            # every third message has a multi-byte length.
+            s = bytearray(b'x' * (i * 7 % 130))
+            r.append(mod.Choice(mod.Choice1(test1=i, str1=s)))
+            r.append(mod.Choice(mod.Choice2(test2=255 - i)))
+        return r
+
+    def feed(self, stream, data, sizes):
+        out = []
+        pos = 0
+        while pos < len(data):
+            n = sizes()
+            stream.feed(data[pos:pos + n])
+            pos += n
+            out.extend(stream)
+        return out
+
+    def check(self, got, expected):
+        self.assertEqual(len(got), len(expected))
+        for a, b in zip(got, expected):
+            self.assertEqual(a.encode(), b.encode())
+
+    def test_whole(self):
+        msgs = self.messages()
+        data = b''.join(bytes(m.encode()) for m in msgs)
+        stream = self.mod.StreamDecoder(self.mod.Choice)
+        self.check(self.feed(stream, data, lambda: len(data)), msgs)
+        self.assertEqual(stream.pending(), 0)
+
+    def test_fragmented(self):
+        msgs = self.messages()
+        data = b''.join(bytes(m.encode()) for m in msgs)
+        stream = self.mod.StreamDecoder(self.mod.Choice)
+        self.check(self.feed(stream, data, lambda: 1), msgs)
+        rnd = random.Random(0)
+        stream = self.mod.StreamDecoder(self.mod.Choice, views=True)
+        self.check(self.feed(stream, data, lambda: rnd.randint(1, 50)), msgs)
+
+    def test_partial(self):
+        msg = self.messages()[2]
+        data = bytes(msg.encode())
+        stream = self.mod.StreamDecoder(self.mod.Choice)
+        stream.feed(data[:-1])
+        self.assertEqual(list(stream), [])
+        self.assertEqual(stream.pending(), len(data) - 1)
+        stream.feed(data[-1:])
+        self.check(list(stream), [msg])
+
+    def test_bad_message_is_skipped(self):
+        mod = self.mod
+        good = bytes(mod.Choice(mod.Choice2(test2=7)).encode())
+        # an unknown CHOICE tag, with a well-formed outer header.
+        bad = b'\x65\x03\x02\x01\x07'
+        stream = mod.StreamDecoder(mod.Choice)
+        stream.feed(bad + good)
+        with self.assertRaises(mod.BadChoice):
+            list(stream)
+        self.check(list(stream), [mod.Choice(mod.Choice2(test2=7))])
+
+
+class TestBatch(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        generate("tests/test_choice.asn1", "gen_batch")
+        cls.mod = importlib.import_module('tests.gen_batch_ber')
+
+    def test_decode_many(self):
+        mod = self.mod
+        good1 = bytes(mod.Choice(mod.Choice1(test1=1, str1=b'abc')).encode())
+        good2 = bytes(mod.Choice(mod.Choice2(test2=2)).encode())
+        # an unknown CHOICE tag, with a well-formed outer header.
+        bad = b'\x65\x03\x02\x01\x07'
+        r = mod.decode_many(mod.Choice, good1 + bad + good2 + good1)
+        self.assertEqual(len(r), 4)
+        self.assertTrue(isinstance(r[1], mod.BadChoice))
+        self.assertEqual([bytes(x.encode()) for x in (r[0], r[2], r[3])], [good1, good2, good1])
+
+    def test_decode_many_truncated(self):
+        mod = self.mod
+        good = bytes(mod.Choice(mod.Choice2(test2=2)).encode())
+        r = mod.decode_many(mod.Choice, good + good[:-1])
+        self.assertEqual(len(r), 2)
+        self.assertEqual(bytes(r[0].encode()), good)
+        self.assertTrue(isinstance(r[1], mod.Underflow))
+
+    def test_encode_many(self):
+        mod = self.mod
+        msgs = [
+            mod.Choice(mod.Choice1(test1=1, str1=b'abc')),
+            mod.Choice(u'not a choice'),
+            mod.Choice(mod.Choice2(test2=2)),
+        ]
+        data, errors = mod.encode_many(msgs)
+        self.assertEqual(bytes(data), bytes(msgs[0].encode()) + bytes(msgs[2].encode()))
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0][0], 1)
+        self.assertTrue(isinstance(errors[0][1], mod.BadChoice))
+
+
+class TestRecordFile(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        generate("tests/test_choice.asn1", "gen_records")
+        cls.mod = importlib.import_module('tests.gen_records_ber')
+        cls.path = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+
+    def write(self, name, data):
+        path = os.path.join(self.path, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def messages(self):
+        mod = self.mod
+        r = []
+        for i in range(20):
+            s = bytearray(b'x' * (i * 7 % 130))
+            r.append(mod.Choice(mod.Choice1(test1=i, str1=s)))
+            r.append(mod.Choice(mod.Choice2(test2=255 - i)))
+        return r
+
+    def test_records(self):
+        msgs = self.messages()
+        encoded = [bytes(m.encode()) for m in msgs]
+        f = self.mod.RecordFile(self.write('records', b''.join(encoded)))
+        offset = 0
+        for (pos, view), data in zip(f.records(), encoded):
+            self.assertEqual(pos, offset)
+            self.assertEqual(bytes(view), data)
+            offset += len(data)
+        del view
+        self.assertEqual(offset, f.size)
+        tags = [tag for pos, tag, flags, header_size, length in f.headers()]
+        self.assertEqual(tags, [0, 1] * 20)
+        f.close()
+
+    def test_decode(self):
+        msgs = self.messages()
+        data = b''.join(bytes(m.encode()) for m in msgs)
+        with self.mod.RecordFile(self.write('decode', data)) as f:
+            for views in (False, True):
+                got = list(f.decode(self.mod.Choice, views))
+                self.assertEqual([bytes(m.encode()) for m in got], [bytes(m.encode()) for m in msgs])
+                del got
+            # start part way through the file.
+            pos = len(bytes(msgs[0].encode()))
+            self.assertEqual(len(list(f.decode(self.mod.Choice, pos=pos))), len(msgs) - 1)
+
+    def test_truncated(self):
+        good = bytes(self.mod.Choice(self.mod.Choice2(test2=2)).encode())
+        with self.mod.RecordFile(self.write('truncated', good + good[:-1])) as f:
+            records = f.decode(self.mod.Choice)
+            self.assertEqual(bytes(next(records).encode()), good)
+            self.assertRaises(self.mod.Underflow, next, records)
+
+    def test_empty(self):
+        with self.mod.RecordFile(self.write('empty', b'')) as f:
+            self.assertEqual(list(f.records()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
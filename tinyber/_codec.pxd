@@ -0,0 +1,77 @@
+# -*- Mode: Python -*-
+
+# declarations for the cython codec, so that generated cython modules
+#  (tinyber_gen -l cython) can cimport it and call into it directly.
+
+from libc.stdint cimport int64_t, uint64_t, uint32_t, uint8_t
+
+# flags for BER tags
+cdef enum FLAGS:
+    FLAGS_UNIVERSAL       = 0x00
+    FLAGS_STRUCTURED      = 0x20
+    FLAGS_APPLICATION     = 0x40
+    FLAGS_CONTEXT         = 0x80
+
+# universal BER tags
+cdef enum TAGS:
+    TAGS_BOOLEAN          = 0x01
+    TAGS_INTEGER          = 0x02
+    TAGS_BITSTRING        = 0x03
+    TAGS_OCTET_STRING     = 0x04
+    TAGS_NULL             = 0x05
+    TAGS_OBJID            = 0x06
+    TAGS_OBJDESCRIPTOR    = 0x07
+    TAGS_EXTERNAL         = 0x08
+    TAGS_REAL             = 0x09
+    TAGS_ENUMERATED       = 0x0a
+    TAGS_EMBEDDED_PDV     = 0x0b
+    TAGS_UTF8STRING       = 0x0c
+    TAGS_SEQUENCE         = 0x10
+    TAGS_SET              = 0x11
+
+cdef class Decoder:
+    cdef readonly bytes data
+    cdef readonly object view
+    cdef uint8_t * pdata
+    cdef readonly uint32_t pos
+    cdef readonly uint32_t end
+
+    cdef uint8_t pop_byte (self) except? 255
+    cdef Decoder pop (self, uint32_t nbytes)
+    cdef object pop_bytes (self, uint32_t nbytes)
+    cpdef done (self)
+    cpdef assert_done (self)
+    cpdef uint32_t get_length (self) except? 4294967295
+    cdef uint32_t get_multibyte_tag (self) except? 4294967295
+    cpdef get_tag (self)
+    cdef check (self, uint8_t expected_tag, uint8_t expected_flags=*)
+    cpdef next (self, uint8_t expected, uint8_t expected_flags=*)
+    cdef get_integer (self, uint32_t length)
+    cpdef next_INTEGER (self, min_val, max_val)
+    cdef int64_t next_int (self, int64_t min_val, int64_t max_val) except? -1
+    cpdef next_OCTET_STRING (self, min_size, max_size)
+    cpdef bint next_BOOLEAN (self) except -1
+    cpdef next_ENUMERATED (self)
+    cpdef next_APPLICATION (self)
+
+cdef class Encoder:
+    cdef bytes buffer
+    cdef unsigned int size
+    cdef unsigned int pos
+
+    cdef grow (self)
+    cdef ensure (self, unsigned int n)
+    cdef emit (self, const unsigned char[:] s)
+    cdef emit_byte (self, uint8_t b)
+    cpdef emit_tag (self, uint32_t tag, uint8_t flags)
+    cdef emit_length (self, unsigned int n)
+    cdef emit_TLV (self, unsigned int mark, uint32_t tag, uint8_t flags)
+    cdef emit_integer (self, n)
+    cdef emit_int (self, int64_t n, uint8_t tag)
+    cpdef emit_INTEGER (self, n)
+    cpdef emit_OCTET_STRING (self, s)
+    cpdef emit_BOOLEAN (self, bint v)
+
+# the per-thread encoder pool (ASN1.encode(), encode_into()).
+cdef Encoder pooled_encoder (uint64_t size)
+cdef release_encoder (Encoder e)
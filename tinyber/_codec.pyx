@@ -5,10 +5,13 @@
 # NOTE: the encoder writes into its buffer in *reverse*, with predecrement.
 #  this makes things much simpler.
 
-from libc.stdint cimport uint32_t, uint8_t
+from libc.stdint cimport int64_t, int8_t, uint64_t, uint32_t, uint8_t
 from cpython cimport PyBytes_FromStringAndSize
+from cpython.buffer cimport PyObject_GetBuffer, PyBuffer_Release, PyBUF_WRITABLE
 from libc.string cimport memcpy
 
+import threading
+
 class DecodingError (Exception):
     pass
 
@@ -36,43 +39,28 @@ class BadChoice (DecodingError):
 class ExtraData (DecodingError):
     pass
 
-# flags for BER tags
-cdef enum FLAGS:
-    FLAGS_UNIVERSAL       = 0x00
-    FLAGS_STRUCTURED      = 0x20
-    FLAGS_APPLICATION     = 0x40
-    FLAGS_CONTEXT         = 0x80
-
-# universal BER tags
-cdef enum TAGS:
-    TAGS_BOOLEAN          = 0x01
-    TAGS_INTEGER          = 0x02
-    TAGS_BITSTRING        = 0x03
-    TAGS_OCTET_STRING     = 0x04
-    TAGS_NULL             = 0x05
-    TAGS_OBJID            = 0x06
-    TAGS_OBJDESCRIPTOR    = 0x07
-    TAGS_EXTERNAL         = 0x08
-    TAGS_REAL             = 0x09
-    TAGS_ENUMERATED       = 0x0a
-    TAGS_EMBEDDED_PDV     = 0x0b
-    TAGS_UTF8STRING       = 0x0c
-    TAGS_SEQUENCE         = 0x10
-    TAGS_SET              = 0x11
+# the FLAGS/TAGS enums and the Decoder/Encoder attributes are declared
+#  in _codec.pxd.
+
+# generated decoders keep to the next_XXX() methods below rather than
+#  checking tag/length bytes inline, which only pays off in pure python.
+FUSED_DECODE = False
+
+# with views=True, OCTET STRINGs are returned as memoryview slices of
+#  <data> instead of copies.  since <data> is an immutable bytes object,
+#  a view stays valid for as long as it is referenced.
 
 cdef class Decoder:
-    cdef readonly bytes data
-    cdef uint8_t * pdata
-    cdef uint32_t pos
-    cdef uint32_t end
 
-    def __init__ (self, bytes data, uint32_t pos=0, uint32_t end=0):
+    def __init__ (self, bytes data, uint32_t pos=0, uint32_t end=0, bint views=False):
         self.data = data
         self.pdata = data
         self.pos = pos
         if end == 0:
             end = len(data)
         self.end = end
+        if views:
+            self.view = memoryview (data)
 
     cdef uint8_t pop_byte (self) except? 255:
         cdef uint8_t val
@@ -89,25 +77,29 @@ cdef class Decoder:
             raise Underflow (self)
         else:
             r = Decoder (self.data, self.pos, self.pos + nbytes)
+            r.view = self.view
             self.pos += nbytes
             return r
 
-    cdef bytes pop_bytes (self, uint32_t nbytes):
+    cdef object pop_bytes (self, uint32_t nbytes):
         if self.pos + nbytes > self.end:
             raise Underflow (self)
         else:
-            result = self.data[self.pos:self.pos+nbytes]
+            if self.view is None:
+                result = self.data[self.pos:self.pos+nbytes]
+            else:
+                result = self.view[self.pos:self.pos+nbytes]
             self.pos += nbytes
             return result
 
     cpdef done (self):
         return self.pos == self.end
 
-    def assert_done (self):
+    cpdef assert_done (self):
         if self.pos != self.end:
             raise ExtraData (self)
 
-    cdef uint32_t get_length (self) except? 4294967295:
+    cpdef uint32_t get_length (self) except? 4294967295:
         cdef uint8_t val, lol
         cdef uint32_t n
         val = self.pop_byte()
@@ -171,13 +163,12 @@ cdef class Decoder:
             if n & 0x80:
                 # negative
                 n -= 0x100
-            else:
-                while length:
-                    n = n << 8 | self.pop_byte()
-                    length -= 1
-                return n
+            while length:
+                n = n << 8 | self.pop_byte()
+                length -= 1
+            return n
 
-    def next_INTEGER (self, min_val, max_val):
+    cpdef next_INTEGER (self, min_val, max_val):
         self.check (TAGS_INTEGER)
         r = self.get_integer (self.get_length())
         if min_val is not None and r < min_val:
@@ -186,7 +177,33 @@ cdef class Decoder:
             raise ConstraintViolation (r, max_val)
         return r
 
-    def next_OCTET_STRING (self, min_size, max_size):
+    # a constrained INTEGER that fits in a C integer, for the typed fields
+    #  of generated cython code.
+    cdef int64_t next_int (self, int64_t min_val, int64_t max_val) except? -1:
+        cdef uint32_t length
+        cdef uint64_t n
+        self.check (TAGS_INTEGER)
+        length = self.get_length()
+        if length > 8:
+            # out of range for any C integer, let get_integer() make a bignum.
+            r = self.get_integer (length)
+            raise ConstraintViolation (r, max_val if r > max_val else min_val)
+        elif length == 0:
+            n = 0
+        else:
+            # sign-extend the first byte.
+            n = <uint64_t> <int64_t> <int8_t> self.pop_byte()
+            length -= 1
+            while length:
+                n = (n << 8) | self.pop_byte()
+                length -= 1
+        if <int64_t> n < min_val:
+            raise ConstraintViolation (<int64_t> n, min_val)
+        if <int64_t> n > max_val:
+            raise ConstraintViolation (<int64_t> n, max_val)
+        return <int64_t> n
+
+    cpdef next_OCTET_STRING (self, min_size, max_size):
         self.check (TAGS_OCTET_STRING)
         r = self.pop_bytes (self.get_length())
         if min_size is not None and len(r) < min_size:
@@ -195,16 +212,16 @@ cdef class Decoder:
             raise ConstraintViolation (r, max_size)
         return r
 
-    def next_BOOLEAN (self):
+    cpdef bint next_BOOLEAN (self) except -1:
         self.check (TAGS_BOOLEAN)
         assert (self.pop_byte() == 1)
         return self.pop_byte() != 0
 
-    def next_ENUMERATED (self):
+    cpdef next_ENUMERATED (self):
         self.check (TAGS_ENUMERATED)
         return self.get_integer (self.get_length())
 
-    def next_APPLICATION (self):
+    cpdef next_APPLICATION (self):
         cdef uint32_t tag
         cdef uint8_t flags
         tag, flags = self.get_tag()
@@ -229,15 +246,10 @@ cdef class EncoderContext:
         pass
 
     def __exit__ (self, t, v, tb):
-        self.enc.emit_length (self.enc.pos - self.pos)
-        self.enc.emit_tag (self.tag, self.flags)
+        self.enc.emit_TLV (self.pos, self.tag, self.flags)
 
 cdef class Encoder:
 
-    cdef bytes buffer
-    cdef unsigned int size
-    cdef unsigned int pos
-
     def __init__ (self, unsigned int size=1024):
         self.buffer = PyBytes_FromStringAndSize (NULL, size)
         self.size = size
@@ -258,21 +270,24 @@ cdef class Encoder:
         while (self.pos + n) > self.size:
             self.grow()
 
-    cdef emit (self, bytearray s):
-        cdef unsigned int slen = len(s)
-        cdef unsigned char * pbuf = self.buffer
-        cdef unsigned char * ps = s
+    # accepts bytes, bytearray or a memoryview (e.g. from a views=True decode).
+    cdef emit (self, const unsigned char[:] s):
+        cdef unsigned int slen = s.shape[0]
+        cdef unsigned char * pbuf
         self.ensure (slen)
         self.pos += slen
-        memcpy (&(pbuf[self.size - self.pos]), ps, slen)
+        if slen:
+            pbuf = self.buffer
+            memcpy (&(pbuf[self.size - self.pos]), &s[0], slen)
 
     cdef emit_byte (self, uint8_t b):
-        cdef unsigned char * pbuf = self.buffer
+        cdef unsigned char * pbuf
         self.ensure (1)
+        pbuf = self.buffer
         self.pos += 1
         pbuf[self.size - self.pos] = b
 
-    def emit_tag (self, uint32_t tag, uint8_t flags):
+    cpdef emit_tag (self, uint32_t tag, uint8_t flags):
         if tag < 0b11111:
             self.emit_byte (tag | flags)
         else:
@@ -295,11 +310,42 @@ cdef class Encoder:
                 c += 1
             self.emit_byte (0x80 | c)
 
+    # emit the length and tag of everything emitted since <mark>.
+    cdef emit_TLV (self, unsigned int mark, uint32_t tag, uint8_t flags):
+        self.emit_length (self.pos - mark)
+        self.emit_tag (tag, flags)
+
     def TLV (self, tag, flags=0):
         return EncoderContext (self, tag, flags)
 
     def done (self):
-        return self.buffer[self.size - self.pos : self.size]
+        # always a copy: a pooled encoder will write into self.buffer again.
+        cdef unsigned char * pbuf = self.buffer
+        return PyBytes_FromStringAndSize (<char *> &pbuf[self.size - self.pos], self.pos)
+
+    def done_into (self, buffer, Py_ssize_t offset=0):
+        # see codec.py
+        cdef unsigned int n = self.pos
+        cdef unsigned char * pbuf = self.buffer
+        cdef Py_buffer view
+        try:
+            PyObject_GetBuffer (buffer, &view, PyBUF_WRITABLE)
+        except (TypeError, BufferError):
+            # no writable (new-style) buffer, e.g. python 2's mmap.
+            if offset < 0 or offset + n > len (buffer):
+                raise ValueError ('%d bytes at offset %d: buffer too small' % (n, offset))
+            buffer[offset:offset + n] = self.done()
+            return n
+        try:
+            if offset < 0 or offset + n > view.len:
+                raise ValueError ('%d bytes at offset %d: buffer too small' % (n, offset))
+            memcpy (<char *> view.buf + offset, &pbuf[self.size - n], n)
+        finally:
+            PyBuffer_Release (&view)
+        return n
+
+    def reset (self):
+        self.pos = 0
 
     # base types
 
@@ -326,31 +372,80 @@ cdef class Encoder:
                 n0 = n1
             first = 0
 
+    # a C integer, as an INTEGER (or ENUMERATED, by <tag>).  for the typed
+    #  fields of generated cython code.
+    cdef emit_int (self, int64_t n, uint8_t tag):
+        cdef unsigned int mark = self.pos
+        while 1:
+            self.emit_byte (n & 0xff)
+            if -0x80 <= n < 0x80:
+                break
+            n >>= 8
+        self.emit_TLV (mark, tag, FLAGS_UNIVERSAL)
+
     cpdef emit_INTEGER (self, n):
-        with self.TLV (TAGS_INTEGER):
-            self.emit_integer (n)
+        cdef unsigned int mark = self.pos
+        self.emit_integer (n)
+        self.emit_TLV (mark, TAGS_INTEGER, FLAGS_UNIVERSAL)
 
     cpdef emit_OCTET_STRING (self, s):
-        with self.TLV (TAGS_OCTET_STRING):
-            self.emit (s)
-
-    cpdef emit_BOOLEAN (self, v):
-        with self.TLV (TAGS_BOOLEAN):
-            if v:
-                self.emit_byte (b'\xff')
-            else:
-                self.emit_byte (b'\x00')
-
-class ASN1:
+        cdef unsigned int mark = self.pos
+        self.emit (s)
+        self.emit_TLV (mark, TAGS_OCTET_STRING, FLAGS_UNIVERSAL)
+
+    cpdef emit_BOOLEAN (self, bint v):
+        cdef unsigned int mark = self.pos
+        self.emit_byte (0xff if v else 0x00)
+        self.emit_TLV (mark, TAGS_BOOLEAN, FLAGS_UNIVERSAL)
+
+# the per-thread encoder pool: see codec.py
+
+cdef unsigned int max_pooled_size = 1 << 16
+MAX_POOLED_SIZE = max_pooled_size
+_encoders = threading.local()
+
+cdef Encoder pooled_encoder (uint64_t size):
+    cdef Encoder e = getattr (_encoders, 'encoder', None)
+    if size > max_pooled_size:
+        size = max_pooled_size
+    if e is not None and e.size >= size:
+        _encoders.encoder = None
+        e.pos = 0
+        return e
+    return Encoder (max (16, size))
+
+cdef release_encoder (Encoder e):
+    if e.size <= max_pooled_size:
+        _encoders.encoder = e
+
+def get_encoder (size):
+    return pooled_encoder (size)
+
+def put_encoder (Encoder e):
+    release_encoder (e)
+
+class ASN1 (object):
+    __slots__ = ()
     value = None
+    max_size = 1024
     def __init__ (self, value=None):
         self.value = value
     def encode (self):
-        cdef Encoder e = Encoder()
-        self._encode (e)
-        return e.done()
-    def decode (self, data):
-        b = Decoder (data)
+        cdef Encoder e = pooled_encoder (self.max_size)
+        try:
+            self._encode (e)
+            return e.done()
+        finally:
+            release_encoder (e)
+    def encode_into (self, buffer, offset=0):
+        cdef Encoder e = pooled_encoder (self.max_size)
+        try:
+            self._encode (e)
+            return e.done_into (buffer, offset)
+        finally:
+            release_encoder (e)
+    def decode (self, data, views=False):
+        b = Decoder (data, views=views)
         self._decode (b)
     def __repr__ (self):
         return '<%s %r>' % (self.__class__.__name__, self.value)
@@ -358,40 +453,125 @@ class ASN1:
 class SEQUENCE (ASN1):
     __slots__ = ()
     def __init__ (self, **args):
-        for k, v in args.iteritems():
+        for k, v in args.items():
             setattr (self, k, v)
     def __repr__ (self):
         r = []
         for name in self.__slots__:
-            r.append ('%s=%r' % (name, getattr (self, name)))
+            if not name.startswith ('__'):
+                r.append ('%s=%r' % (name, getattr (self, name)))
         return '<%s %s>' % (self.__class__.__name__, ' '.join (r))
 
 class CHOICE (ASN1):
+    __slots__ = ('value',)
     tags_f = {}
     tags_r = {}
     def _decode (self, Decoder src):
         cdef uint8_t tag
         cdef Decoder src0
         tag, src0 = src.next_APPLICATION()
-        self.value = self.tags_r[tag]()
+        klass = self.tags_r.get (tag)
+        if klass is None:
+            raise BadChoice (tag)
+        self.value = klass()
         self.value._decode (src0)
     def _encode (self, Encoder dst):
-        for klass, tag in self.tags_f.iteritems():
+        for klass, tag in self.tags_f.items():
             if isinstance (self.value, klass):
                 with dst.TLV (tag, FLAGS_APPLICATION | FLAGS_STRUCTURED):
                     self.value._encode (dst)
                     return
         raise BadChoice (self.value)
 
+def _read_only (self, *args):
+    raise AttributeError ('shared %s instances are read-only' % (self.__class__.__name__,))
+
 class ENUMERATED (ASN1):
+    __slots__ = ('value',)
     tags_f = {}
     tags_r = {}
-    value = 'NoValueDefined'
     def _decode (self, Decoder src):
         v = src.next_ENUMERATED()
         self.value = self.tags_r[v]
+    @classmethod
+    def shared (cls, v):
+        # see codec.py
+        instances = cls.__dict__.get ('_instances')
+        if instances is None:
+            frozen = type (cls.__name__, (cls,), {
+                '__slots__': (),
+                '__module__': cls.__module__,
+                '__setattr__': _read_only,
+                '__delattr__': _read_only,
+            })
+            instances = {}
+            for n, name in cls.tags_r.items():
+                ob = object.__new__ (frozen)
+                object.__setattr__ (ob, 'value', name)
+                instances[n] = ob
+            cls._instances = instances
+        return instances[v]
     def _encode (self, Encoder dst):
         with dst.TLV (TAGS_ENUMERATED):
             dst.emit_integer (self.tags_f[self.value])
     def __repr__ (self):
         return '<%s %s>' % (self.__class__.__name__, self.value)
+
+# batch interfaces: one Decoder/Encoder for many back-to-back messages.
+
+def decode_many (klass, bytes data, bint views=False):
+    # decode every <klass> message in <data>.  returns a list holding, for
+    #  each message in order, either the decoded object or the exception
+    #  that stopped it.  a bad outer header ends the list, since the rest
+    #  of the buffer can no longer be framed.
+    cdef Decoder src = Decoder (data, views=views)
+    cdef uint32_t total = src.end
+    cdef uint32_t start, length
+    cdef uint64_t end
+    cdef list result = []
+    while src.pos < total:
+        start = src.pos
+        try:
+            src.get_tag()
+            length = src.get_length()
+        except DecodingError as e:
+            result.append (e)
+            break
+        end = <uint64_t> src.pos + length
+        if end > total:
+            result.append (Underflow (src))
+            break
+        # let the message decode itself from the shared decoder,
+        #  fenced to its own TLV.
+        src.pos = start
+        src.end = <uint32_t> end
+        try:
+            msg = klass()
+            msg._decode (src)
+        except Exception as e:
+            result.append (e)
+        else:
+            result.append (msg)
+        src.pos = <uint32_t> end
+        src.end = total
+    return result
+
+def encode_many (objs):
+    # encode <objs> back-to-back into a single buffer.  returns (data, errors),
+    #  where <errors> lists (index, exception) for each object that could not
+    #  be encoded; those are left out of <data>.
+    cdef Encoder dst = Encoder()
+    cdef unsigned int mark
+    cdef Py_ssize_t i
+    cdef list items = list (objs)
+    cdef list errors = []
+    # the encoder works backward, so start with the last object.
+    for i in range (len (items) - 1, -1, -1):
+        mark = dst.pos
+        try:
+            items[i]._encode (dst)
+        except Exception as e:
+            dst.pos = mark
+            errors.append ((i, e))
+    errors.reverse()
+    return dst.done(), errors
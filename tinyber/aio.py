@@ -0,0 +1,152 @@
+# -*- Mode: Python -*-
+
+# asyncio helpers for generated python codecs.  requires python 3.5+.
+
+import asyncio
+
+from tinyber.codec import StreamDecoder, Underflow, get_header
+
+try:
+    get_running_loop = asyncio.get_running_loop
+except AttributeError:
+    # python < 3.7, where get_event_loop() is the running loop in a callback.
+    get_running_loop = asyncio.get_event_loop
+
+
+async def read_message(reader, klass, views=False):
+    # read one <klass> message from StreamReader <reader>.  returns None on
+    #  a clean EOF between messages; raises asyncio.IncompleteReadError if
+    #  the stream ends part way through one.
+    try:
+        data = await reader.readexactly(2)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise
+    while 1:
+        try:
+            tag, flags, header_size, length = get_header(data)
+            break
+        except Underflow:
+            # multi-byte tag or length: fetch the rest of the header.
+            data += await reader.readexactly(1)
+    data += await reader.readexactly(length)
+    msg = klass()
+    msg.decode(data, views)
+    return msg
+
+
+def write_message(writer, msg):
+    # encode <msg> onto StreamWriter <writer>.  as with writer.write(),
+    #  await writer.drain() to apply flow control.
+    writer.write(msg.encode())
+
+
+def write_messages(writer, msgs):
+    # encode several messages onto <writer> with a single write.
+    writer.write(b''.join([msg.encode() for msg in msgs]))
+
+
+class MessageProtocol(asyncio.Protocol):
+
+    # a protocol that speaks a stream of <klass> messages.  override
+    #  message_received() to handle each incoming message.
+    #
+    # send() queues an encoded message; every message queued during one
+    #  pass of the event loop goes out in a single transport.write().
+    #  while the transport has paused writing, messages stay queued (up to
+    #  <max_queued> bytes, beyond which send() raises BufferError), and
+    #  'await drain()' waits for it to resume.  messages sent after the
+    #  connection is lost are dropped, as transport.write() would.
+
+    def __init__(self, klass, views=False, max_queued=1 << 22):
+        self.stream = StreamDecoder(klass, views)
+        self.transport = None
+        self.outgoing = []
+        self.queued = 0
+        self.max_queued = max_queued
+        self.paused = False
+        self.drain_waiter = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.transport = None
+        del self.outgoing[:]
+        self.queued = 0
+        self.wake()
+
+    def data_received(self, data):
+        self.stream.feed(data)
+        msgs = iter(self.stream)
+        while 1:
+            pending = self.stream.pending()
+            try:
+                msg = next(msgs)
+            except StopIteration:
+                break
+            except Exception as e:
+                # generated decoders can also fail with KeyError (unknown
+                #  CHOICE/ENUMERATED tag) or AssertionError, not just DecodingError.
+                self.decode_error(e)
+                if self.closing() or self.stream.pending() == pending:
+                    # closed by decode_error(), or a header that can't be
+                    #  parsed: the stream can't be framed past it.
+                    break
+                # the bad message has been skipped: go on with the rest.
+                msgs = iter(self.stream)
+                continue
+            self.message_received(msg)
+            if self.closing():
+                break
+
+    def message_received(self, msg):
+        pass
+
+    def decode_error(self, exc):
+        # by default a bad message drops the connection.
+        self.transport.close()
+
+    def closing(self):
+        return self.transport is None or self.transport.is_closing()
+
+    def send(self, msg):
+        if self.transport is None:
+            return
+        data = msg.encode()
+        if self.paused and self.queued + len(data) > self.max_queued:
+            raise BufferError('%d bytes queued for a paused transport' % (self.queued,))
+        self.outgoing.append(data)
+        self.queued += len(data)
+        if len(self.outgoing) == 1 and not self.paused:
+            get_running_loop().call_soon(self.flush)
+
+    def flush(self):
+        if self.outgoing and self.transport is not None and not self.paused:
+            data = b''.join(self.outgoing)
+            del self.outgoing[:]
+            self.queued = 0
+            self.transport.write(data)
+
+    def pause_writing(self):
+        self.paused = True
+
+    def resume_writing(self):
+        self.paused = False
+        self.wake()
+        self.flush()
+
+    def wake(self):
+        waiter, self.drain_waiter = self.drain_waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def drain(self):
+        # wait while the transport has paused writing.
+        if self.paused and self.transport is not None:
+            if self.drain_waiter is None:
+                self.drain_waiter = get_running_loop().create_future()
+            await self.drain_waiter
+        if self.transport is None:
+            raise ConnectionResetError('connection lost')
@@ -1,5 +1,17 @@
 # -*- Mode: Python -*-
 
+# how many bytes to represent tag number <n> (the 'T' in TLV).
+
+def length_of_tag (n):
+    if n < 0x1f:
+        return 1
+    else:
+        r = 1
+        while n:
+            n >>= 7
+            r += 1
+        return r
+
 # how many bytes to represent length <n> (the 'L' in TLV).
 
 def length_of_length (n):
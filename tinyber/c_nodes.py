@@ -1,13 +1,62 @@
 # -*- Mode: Python -*-
 
 from tinyber import nodes
-from tinyber.writer import Writer
+from tinyber.ber import length_of_length
+from tinyber.writer import Writer, OutputFile, update_file
 import os
 import sys
 
 def csafe (s):
     return s.replace ('-', '_')
 
+def header_bytes (tag_byte, length):
+    # the encoded tag and length of a TLV, for a one-byte tag.
+    if length < 0x80:
+        return [tag_byte, length]
+    else:
+        r = []
+        while length:
+            r.insert (0, length & 0xff)
+            length >>= 8
+        return [tag_byte, 0x80 | len (r)] + r
+
+def emit_fixed (out, dst, header, size, fill=()):
+    # reserve <size> bytes of output in one step, store the (constant)
+    #  <header> bytes and let the <fill> lines write the rest through <p>.
+    out.writelines ('{')
+    with out.indent():
+        out.writelines (
+            'uint8_t * p;',
+            'TYB_FAILIF_AS (%s->pos < %d, TYB_FAIL_UNDERFLOW);' % (dst, size),
+            '%s->pos -= %d;' % (dst, size),
+            'p = %s->buffer + %s->pos;' % (dst, dst),
+        )
+        out.writelines (*['p[%d] = 0x%02x;' % (i, b) for i, b in enumerate (header)])
+        out.writelines (*fill)
+    out.writelines ('}')
+
+def use_pointers (node):
+    # make every OCTET STRING/UTF8String under <node> a pointer into the
+    #  decoder's input, rather than an array holding a copy.
+    if node.kind == 'base_type' and node.attrs[0] in ('OCTET STRING', 'UTF8String'):
+        node.pointer = True
+    for sub in node.subs:
+        use_pointers (sub)
+
+def use_soa (node, types):
+    # lay out every SEQUENCE OF <record> under <node> as one array per slot
+    #  of <record> (struct-of-arrays), where <record> is a defined SEQUENCE
+    #  of base types.  <types> maps type names to their nodes.
+    if node.kind == 'sequence_of':
+        [seq_type] = node.subs
+        if seq_type.kind == 'defined':
+            # (None for a type from another module)
+            record = types.get (seq_type.name())
+            if record is not None and record.kind == 'sequence' and all (sub.kind == 'base_type' for sub in record.subs):
+                node.record = record
+    for sub in node.subs:
+        use_soa (sub, types)
+
 def int_max_size_type (min_size, max_size):
     if max_size is None:
         # unconstrained int type.
@@ -40,15 +89,19 @@ def int_max_size_type (min_size, max_size):
 
 class c_base_type (nodes.c_base_type):
 
+    # see use_pointers()
+    pointer = False
+
     def emit (self, out):
         type_name, min_size, max_size = self.attrs
         if type_name == 'OCTET STRING' or type_name == 'UTF8String':
             out.writelines ('struct {')
             with out.indent():
-                out.writelines (
-                    'uint8_t val[%s];' % (max_size,),
-                    'int len;'
-                )
+                if self.pointer:
+                    out.writelines ('const uint8_t * ptr;')
+                else:
+                    out.writelines ('uint8_t val[%s];' % (max_size,))
+                out.writelines ('int len;')
             out.write ('}', True)
         elif type_name == 'BOOLEAN':
             out.write ('asn1bool_t', True)
@@ -60,25 +113,58 @@ class c_base_type (nodes.c_base_type):
             import pdb
             pdb.set_trace()
 
+    tag_byte = {
+        'OCTET STRING': 0x04,
+        'UTF8String': 0x0c,
+        'BOOLEAN': 0x01,
+        'NULL': 0x05,
+    }
+
+    # the runtime encoder of each string type: the tag must agree with
+    #  tag_byte above, which the fixed-size path writes itself.
+    encoder = {
+        'OCTET STRING': 'encode_OCTET_STRING',
+        'UTF8String': 'encode_UTF8String',
+    }
+
+    def fixed_size (self):
+        # the encoded size, if it is the same for every value.
+        type_name, min_size, max_size = self.attrs
+        if type_name == 'OCTET STRING' or type_name == 'UTF8String':
+            if min_size is not None and min_size == max_size:
+                return 1 + length_of_length (max_size) + max_size
+            else:
+                return None
+        elif type_name == 'BOOLEAN':
+            return 3
+        elif type_name == 'NULL':
+            return 2
+        else:
+            return None
+
     def emit_decode (self, out, lval, src):
         type_name, min_size, max_size = self.attrs
         out.writelines (
-            'TYB_CHECK (decode_TLV (&tlv, %s));' % (src,),
-            'TYB_FAILIF (tlv.type != %s);' % (self.tag_map[type_name],),
+            'TYB_CHECK_AS (decode_TLV (&tlv, %s), TYB_FAIL_UNDERFLOW);' % (src,),
+            'TYB_FAILIF_AS (tlv.type != %s, TYB_FAIL_TAG);' % (self.tag_map[type_name],),
         )
         if type_name == 'OCTET STRING' or type_name == 'UTF8String':
-            out.writelines (
-                'TYB_FAILIF(tlv.length > %d);' % (max_size,),
-                'memcpy ((*%s).val, tlv.value, tlv.length);' % (lval,),
-                '(*%s).len = tlv.length;' % (lval,),
-            )
+            out.writelines ('TYB_FAILIF_AS (tlv.length > %d, TYB_FAIL_CONSTRAINT);' % (max_size,))
+            if min_size:
+                # as the encoder (and the python decoder) require.
+                out.writelines ('TYB_FAILIF_AS (tlv.length < %d, TYB_FAIL_CONSTRAINT);' % (min_size,))
+            if self.pointer:
+                out.writelines ('(*%s).ptr = tlv.value;' % (lval,))
+            else:
+                out.writelines ('memcpy ((*%s).val, tlv.value, tlv.length);' % (lval,))
+            out.writelines ('(*%s).len = tlv.length;' % (lval,))
         elif type_name == 'INTEGER':
             with out.scope():
                 out.writelines ('asn1int_t intval = decode_INTEGER (&tlv);',)
                 if max_size is not None:
-                    out.writelines ('TYB_FAILIF(intval > %s);' % (max_size,),)
+                    out.writelines ('TYB_FAILIF_AS (intval > %s, TYB_FAIL_CONSTRAINT);' % (max_size,),)
                 if min_size is not None:
-                    out.writelines ('TYB_FAILIF(intval < %s);' % (min_size,),)
+                    out.writelines ('TYB_FAILIF_AS (intval < %s, TYB_FAIL_CONSTRAINT);' % (min_size,),)
                 out.writelines ('*(%s) = intval;' % (lval,))
         elif type_name == 'BOOLEAN':
             out.writelines ('*(%s) = decode_BOOLEAN (&tlv);' % (lval,),)
@@ -90,22 +176,73 @@ class c_base_type (nodes.c_base_type):
 
     def emit_encode (self, out, dst, src):
         type_name, min_size, max_size = self.attrs
-        if type_name == 'OCTET STRING' or type_name == 'UTF8String':
-            out.writelines ('TYB_CHECK (encode_OCTET_STRING (%s, (%s)->val, (%s)->len));' % (dst, src, src))
+        size = self.fixed_size()
+        data = 'ptr' if self.pointer else 'val'
+        if size is not None and type_name == 'OCTET STRING' and max_size >= 0x80:
+            # a long payload is left to encode_OCTET_STRING(), which can
+            #  reference it rather than copy it (TYB_IOVEC).
+            out.writelines (
+                'TYB_FAILIF_AS ((%s)->len != %d, TYB_FAIL_CONSTRAINT);' % (src, max_size),
+                'TYB_CHECK_AS (encode_OCTET_STRING (%s, (%s)->%s, (%s)->len), TYB_FAIL_UNDERFLOW);' % (dst, src, data, src),
+            )
+        elif size is not None:
+            # the whole header is known here, no need for encode_TLV().
+            if type_name == 'BOOLEAN':
+                emit_fixed (out, dst, [0x01, 0x01], 3, ['p[2] = *(%s) ? 0xff : 0x00;' % (src,)])
+            elif type_name == 'NULL':
+                emit_fixed (out, dst, [0x05, 0x00], 2)
+            else:
+                header = header_bytes (self.tag_byte[type_name], max_size)
+                out.writelines ('TYB_FAILIF_AS ((%s)->len != %d, TYB_FAIL_CONSTRAINT);' % (src, max_size))
+                if type_name == 'OCTET STRING':
+                    # with TYB_IOVEC, even a short payload may be referenced
+                    #  (the buffer's <min_ref> decides), so it can't be copied here.
+                    out.writelines (
+                        '#ifdef TYB_IOVEC',
+                        'TYB_CHECK_AS (encode_OCTET_STRING (%s, (%s)->%s, %d), TYB_FAIL_UNDERFLOW);' % (dst, src, data, max_size),
+                        '#else',
+                    )
+                emit_fixed (out, dst, header, size, ['memcpy (p + %d, (%s)->%s, %d);' % (len (header), src, data, max_size)])
+                if type_name == 'OCTET STRING':
+                    out.writelines ('#endif')
+        elif type_name == 'OCTET STRING' or type_name == 'UTF8String':
+            if self.pointer:
+                # no array to bound the length.
+                out.writelines ('TYB_FAILIF_AS ((%s)->len > %d, TYB_FAIL_CONSTRAINT);' % (src, max_size))
+            out.writelines ('TYB_CHECK_AS (%s (%s, (%s)->%s, (%s)->len), TYB_FAIL_UNDERFLOW);' % (self.encoder[type_name], dst, src, data, src))
         elif type_name == 'INTEGER':
             with out.scope():
                 out.writelines (
                     'asn1int_t intval = *%s;' % (src,),
-                    'TYB_CHECK (encode_INTEGER (%s, &intval));' % (dst,),
-                )
-        elif type_name == 'BOOLEAN':
-            with out.scope():
-                out.writelines (
-                    'asn1bool_t boolval = *%s;' % (src,),
-                    'TYB_CHECK (encode_BOOLEAN (%s, &boolval));' % (dst,),
+                    'TYB_CHECK_AS (encode_INTEGER (%s, &intval), TYB_FAIL_UNDERFLOW);' % (dst,),
                 )
-        elif type_name == 'NULL':
-            out.writelines ('encode_NULL (%s)' % (dst,))
+        else:
+            import pdb
+            pdb.set_trace()
+
+    def size_checks (self):
+        # whether a value of fixed_size() still has a length to check.
+        type_name, min_size, max_size = self.attrs
+        return type_name == 'OCTET STRING' or type_name == 'UTF8String'
+
+    def emit_check (self, out, src):
+        # for fixed_size() types: fail unless <src> has exactly that size.
+        type_name, min_size, max_size = self.attrs
+        if self.size_checks():
+            out.writelines ('TYB_FAILIF ((%s)->len != %d);' % (src, max_size))
+
+    def emit_size (self, out, acc, src):
+        type_name, min_size, max_size = self.attrs
+        size = self.fixed_size()
+        if size is not None:
+            self.emit_check (out, src)
+            out.writelines ('%s += %d;' % (acc, size))
+        elif type_name == 'OCTET STRING' or type_name == 'UTF8String':
+            if self.pointer:
+                out.writelines ('TYB_FAILIF ((%s)->len > %d);' % (src, max_size))
+            out.writelines ('%s += size_TLV (%s, (%s)->len);' % (acc, self.tag_map[type_name], src))
+        elif type_name == 'INTEGER':
+            out.writelines ('%s += size_INTEGER (*(%s));' % (acc, src))
         else:
             import pdb
             pdb.set_trace()
@@ -125,12 +262,37 @@ class c_sequence (nodes.c_sequence):
                 out.newline()
         out.write ('}')
 
+    def content_size (self):
+        r = 0
+        for slot_type in self.subs:
+            size = slot_type.fixed_size()
+            if size is None:
+                return None
+            r += size
+        return r
+
+    def fixed_size (self):
+        r = self.content_size()
+        if r is None:
+            return None
+        else:
+            return 1 + length_of_length (r) + r
+
+    def slot_refs (self, ref):
+        # <ref> is a C pointer to a struct, or a function giving the
+        #  pointer to each slot (see use_soa()).
+        if callable (ref):
+            return ref
+        else:
+            return lambda slot: '&(%s->%s)' % (ref, slot)
+
     def emit_decode (self, out, lval, src):
         name, slots = self.attrs
         types = self.subs
+        slot_ref = self.slot_refs (lval)
         out.writelines (
-            'TYB_CHECK (decode_TLV (&tlv, %s));' % (src,),
-            'TYB_FAILIF (tlv.type != TAG_SEQUENCE);',
+            'TYB_CHECK_AS (decode_TLV (&tlv, %s), TYB_FAIL_UNDERFLOW);' % (src,),
+            'TYB_FAILIF_AS (tlv.type != TAG_SEQUENCE, TYB_FAIL_TAG);',
             '{'
         )
         with out.indent():
@@ -141,35 +303,154 @@ class c_sequence (nodes.c_sequence):
             for i in range (len (slots)):
                 out.writelines ('// slot %s' % (slots[i],))
                 slot_type = types[i]
-                slot_type.emit_decode (out, '&(%s->%s)' % (lval, csafe (slots[i])), '&src0')
-            out.writelines ('TYB_FAILIF (src0.pos != src0.size);')
+                slot_type.emit_decode (out, slot_ref (csafe (slots[i])), '&src0')
+            out.writelines ('TYB_FAILIF_AS (src0.pos != src0.size, TYB_FAIL_TRAILING);')
         out.writelines ('}')
 
+    def emit_decode_fields (self, out, lval, src, mask):
+        # like emit_decode, but only the slots in <mask> are decoded (and
+        #  checked), the others are skipped by their length.  nothing
+        #  after the last wanted slot is looked at.
+        name, slots = self.attrs
+        types = self.subs
+        out.writelines (
+            'TYB_CHECK_AS (decode_TLV (&tlv, %s), TYB_FAIL_UNDERFLOW);' % (src,),
+            'TYB_FAILIF_AS (tlv.type != TAG_SEQUENCE, TYB_FAIL_TAG);',
+            '{'
+        )
+        with out.indent():
+            out.writelines (
+                'buf_t src0;',
+                'init_ibuf (&src0, tlv.value, tlv.length);'
+            )
+            for i in range (len (slots)):
+                out.writelines (
+                    '// slot %s' % (slots[i],),
+                    'if (%s & %s) {' % (mask, self.field_mask (i)),
+                )
+                with out.indent():
+                    types[i].emit_decode (out, '&(%s->%s)' % (lval, csafe (slots[i])), '&src0')
+                out.writelines ('} else {')
+                with out.indent():
+                    out.writelines ('TYB_CHECK_AS (decode_TLV (&tlv, &src0), TYB_FAIL_UNDERFLOW);')
+                out.writelines ('}')
+                if i < len (slots) - 1:
+                    out.writelines (
+                        'if (!(%s >> %d)) {' % (mask, i + 1),
+                        '  TYB_STATS_LEAVE (%s);' % (src,),
+                        '  return 0;',
+                        '}',
+                    )
+            out.writelines ('TYB_FAILIF_AS (src0.pos != src0.size, TYB_FAIL_TRAILING);')
+        out.writelines ('}')
+
+    def field_mask (self, i):
+        name, slots = self.attrs
+        return '%s_FIELD_%s' % (name, csafe (slots[i]))
+
+    def emit_field_masks (self, out):
+        name, slots = self.attrs
+        for i in range (len (slots)):
+            out.writelines ('#define %s (1U << %d)' % (self.field_mask (i), i))
+
     def emit_encode (self, out, dst, src):
         name, slots = self.attrs
         types = self.subs
+        content = self.content_size()
+        slot_ref = self.slot_refs (src)
         out.writelines ('{')
         with out.indent():
-            out.writelines ('unsigned int mark = %s->pos;' % (dst,))
+            if content is None:
+                out.writelines ('unsigned int mark = %s->pos;' % (dst,))
             for i in reversed (range (len (slots))):
                 out.writelines ('// slot %s' % (slots[i],))
                 slot_type = types[i]
-                slot_type.emit_encode (out, dst, '&(%s->%s)' % (src, csafe (slots[i])))
-            out.writelines ('TYB_CHECK (encode_TLV (%s, mark, TAG_SEQUENCE, FLAG_STRUCTURED));' % (dst,))
+                slot_type.emit_encode (out, dst, slot_ref (csafe (slots[i])))
+            if content is None:
+                out.writelines ('TYB_CHECK_AS (encode_TLV (%s, mark, TAG_SEQUENCE, FLAG_STRUCTURED), TYB_FAIL_UNDERFLOW);' % (dst,))
+            else:
+                header = header_bytes (0x30, content)
+                emit_fixed (out, dst, header, len (header))
+        out.writelines ('}')
+
+    def size_checks (self):
+        return any (slot_type.size_checks() for slot_type in self.subs)
+
+    def emit_check (self, out, src):
+        name, slots = self.attrs
+        slot_ref = self.slot_refs (src)
+        for i in range (len (slots)):
+            self.subs[i].emit_check (out, slot_ref (csafe (slots[i])))
+
+    def emit_size (self, out, acc, src):
+        name, slots = self.attrs
+        types = self.subs
+        size = self.fixed_size()
+        if size is not None:
+            # the encoder refuses the same values.
+            self.emit_check (out, src)
+            out.writelines ('%s += %d;' % (acc, size))
+            return
+        slot_ref = self.slot_refs (src)
+        acc0 = acc + '0'
+        out.writelines ('{')
+        with out.indent():
+            out.writelines ('int %s = 0;' % (acc0,))
+            for i in range (len (slots)):
+                out.writelines ('// slot %s' % (slots[i],))
+                types[i].emit_size (out, acc0, slot_ref (csafe (slots[i])))
+            out.writelines ('%s += size_TLV (TAG_SEQUENCE, %s);' % (acc, acc0))
         out.writelines ('}')
 
 class c_sequence_of (nodes.c_sequence_of):
 
     TAG_NAME = 'TAG_SEQUENCE'
+    TAG_BYTE = 0x30
+
+    # the SEQUENCE node of the elements, when laid out as struct-of-arrays.
+    #  see use_soa()
+    record = None
+
+    def element (self, ref, index):
+        # the node to encode/decode the element at <index> of <ref> with, and
+        #  what to pass it as its lval/src.
+        [seq_type] = self.subs
+        if self.record is None:
+            return seq_type, '&((%s)->val[%s])' % (ref, index)
+        else:
+            return self.record, lambda slot: '&((%s)->%s[%s])' % (ref, slot, index)
+
+    def content_size (self):
+        min_size, max_size, = self.attrs
+        [seq_type] = self.subs
+        size = seq_type.fixed_size()
+        if size is None or min_size != max_size:
+            return None
+        else:
+            return max_size * size
+
+    def fixed_size (self):
+        r = self.content_size()
+        if r is None:
+            return None
+        else:
+            return 1 + length_of_length (r) + r
 
     def emit (self, out):
         min_size, max_size, = self.attrs
         [seq_type] = self.subs
         out.writelines ('struct {')
         with out.indent():
-            seq_type.emit (out)
-            out.write (' val[%s];' % (max_size,))
-            out.newline()
+            if self.record is None:
+                seq_type.emit (out)
+                out.write (' val[%s];' % (max_size,))
+                out.newline()
+            else:
+                record_name, slots = self.record.attrs
+                for i in range (len (slots)):
+                    self.record.subs[i].emit (out)
+                    out.write (' %s[%s];' % (csafe (slots[i]), max_size))
+                    out.newline()
             out.writelines ('int len;')
         out.write ('}', True)
 
@@ -181,47 +462,101 @@ class c_sequence_of (nodes.c_sequence_of):
             out.writelines (
                 'buf_t src1;',
                 'int i;',
-                'TYB_CHECK (decode_TLV (&tlv, %s));' % (src,),
-                'TYB_FAILIF (tlv.type != %s);' % (self.TAG_NAME,),
+                'TYB_CHECK_AS (decode_TLV (&tlv, %s), TYB_FAIL_UNDERFLOW);' % (src,),
+                'TYB_FAILIF_AS (tlv.type != %s, TYB_FAIL_TAG);' % (self.TAG_NAME,),
                 'init_ibuf (&src1, tlv.value, tlv.length);',
                 '(%s)->len = 0;' % (lval,),
                 'for (i=0; (src1.pos < src1.size); i++) {',
             )
             with out.indent():
-                out.writelines ('TYB_FAILIF (i >= %s);' % (max_size,),)
-                seq_type.emit_decode (out, '%s.val[i]' % (lval,), '&src1')
+                out.writelines ('TYB_FAILIF_AS (i >= %s, TYB_FAIL_CONSTRAINT);' % (max_size,),)
+                elem_type, elem = self.element (lval, 'i')
+                elem_type.emit_decode (out, elem, '&src1')
                 out.writelines ('(%s)->len = i + 1;' % (lval,))
             out.writelines ('}')
             if min_size:
-                out.writelines ('TYB_FAILIF ((%s)->len < %d);' % (lval, min_size))
+                out.writelines ('TYB_FAILIF_AS ((%s)->len < %d, TYB_FAIL_CONSTRAINT);' % (lval, min_size))
         out.writelines ('}')
 
     def emit_encode (self, out, dst, src):
         min_size, max_size, = self.attrs
         [seq_type] = self.subs
+        content = self.content_size()
         out.writelines ('{')
         with out.indent():
             out.writelines (
                 'int i;',
-                'unsigned int mark = %s->pos;' % (dst,),
                 'int alen = (%s)->len;' % (src,),
-                'for (i=0; i < alen; i++) {',
             )
+            if content is None:
+                out.writelines ('unsigned int mark = %s->pos;' % (dst,))
+            else:
+                # the header below is only right for exactly <max_size> elements.
+                out.writelines ('TYB_FAILIF_AS (alen != %d, TYB_FAIL_CONSTRAINT);' % (max_size,))
+            out.writelines ('for (i=0; i < alen; i++) {')
             with out.indent():
-                out.writelines ('TYB_FAILIF (i >= %s);' % (max_size,),)
-                seq_type.emit_encode (out, dst, '&((%s)->val[alen-(i+1)])' % (src,))
+                out.writelines ('TYB_FAILIF_AS (i >= %s, TYB_FAIL_CONSTRAINT);' % (max_size,),)
+                elem_type, elem = self.element (src, 'alen-(i+1)')
+                elem_type.emit_encode (out, dst, elem)
+            out.writelines ('}')
+            if content is None:
+                out.writelines ('TYB_CHECK_AS (encode_TLV (%s, mark, %s, FLAG_STRUCTURED), TYB_FAIL_UNDERFLOW);' % (dst, self.TAG_NAME))
+            else:
+                header = header_bytes (self.TAG_BYTE, content)
+                emit_fixed (out, dst, header, len (header))
+        out.writelines ('}')
+
+    def size_checks (self):
+        return True
+
+    def emit_check (self, out, src):
+        min_size, max_size, = self.attrs
+        [seq_type] = self.subs
+        out.writelines ('TYB_FAILIF ((%s)->len != %d);' % (src, max_size))
+        if seq_type.size_checks():
+            with out.scope():
+                out.writelines ('int i;', 'for (i=0; i < %d; i++) {' % (max_size,))
+                with out.indent():
+                    elem_type, elem = self.element (src, 'i')
+                    elem_type.emit_check (out, elem)
+                out.writelines ('}')
+
+    def emit_size (self, out, acc, src):
+        min_size, max_size, = self.attrs
+        [seq_type] = self.subs
+        size = self.fixed_size()
+        if size is not None:
+            self.emit_check (out, src)
+            out.writelines ('%s += %d;' % (acc, size))
+            return
+        acc0 = acc + '0'
+        out.writelines ('{')
+        with out.indent():
+            out.writelines (
+                'int i;',
+                'int %s = 0;' % (acc0,),
+                'TYB_FAILIF ((%s)->len > %d);' % (src, max_size),
+                'for (i=0; i < (%s)->len; i++) {' % (src,),
+            )
+            with out.indent():
+                elem_type, elem = self.element (src, 'i')
+                elem_type.emit_size (out, acc0, elem)
             out.writelines (
                 '}',
-                'TYB_CHECK (encode_TLV (%s, mark, %s, FLAG_STRUCTURED));' % (dst, self.TAG_NAME)
+                '%s += size_TLV (%s, %s);' % (acc, self.TAG_NAME, acc0),
             )
         out.writelines ('}')
 
 # NOTE parent class
 class c_set_of (c_sequence_of):
     TAG_NAME = 'TAG_SET'
+    TAG_BYTE = 0x31
 
 class c_choice (nodes.c_choice):
 
+    def fixed_size (self):
+        return None
+
     def emit (self, out):
         name, slots, tags = self.attrs
         out.writelines ('struct %s {' % (name,))
@@ -252,7 +587,7 @@ class c_choice (nodes.c_choice):
         with out.indent():
             out.writelines (
                 'buf_t src0;',
-                'TYB_CHECK (decode_TLV (&tlv, %s));' % (src,),
+                'TYB_CHECK_AS (decode_TLV (&tlv, %s), TYB_FAIL_UNDERFLOW);' % (src,),
                 'init_ibuf (&src0, tlv.value, tlv.length);',
                 'switch (tlv.type) {',
             )
@@ -263,11 +598,11 @@ class c_choice (nodes.c_choice):
                     out.writelines (
                         'case (%s):' % (tags[i],),
                         '  %s->present = %s_PR_%s;' % (lval, name, tag_name),
-                        '  TYB_CHECK (decode_%s (&(%s->choice.%s), &src0));' % (type_name, lval, tag_name),
+                        '  TYB_CHECK_AS (decode_%s (&(%s->choice.%s), &src0), TYB_FAIL_NESTED);' % (type_name, lval, tag_name),
                         '  break;',
                     )
                 out.writelines (
-                    'default:', '  return -1;', '  break;'
+                    'default:', '  TYB_FAIL (TYB_FAIL_TAG);', '  break;'
                 )
             out.writelines ('}')
         out.writelines ('}')
@@ -287,7 +622,34 @@ class c_choice (nodes.c_choice):
                     tag_name = csafe (slots[i])
                     out.writelines (
                         'case %s:' % (tags[i],),
-                        '  TYB_CHECK (encode_%s (%s, &(%s->choice.%s)));' % (type_name, dst, src, tag_name),
+                        '  TYB_CHECK_AS (encode_%s (%s, &(%s->choice.%s)), TYB_FAIL_NESTED);' % (type_name, dst, src, tag_name),
+                        '  break;',
+                    )
+                out.writelines (
+                    'default:', '  TYB_FAIL (TYB_FAIL_CONSTRAINT);', '  break;'
+                )
+            out.writelines (
+                '}',
+                'TYB_CHECK_AS (encode_TLV (%s, mark, %s->present, FLAG_APPLICATION | FLAG_STRUCTURED), TYB_FAIL_UNDERFLOW);' % (dst, src),
+            )
+        out.writelines ('}')
+
+    def emit_size (self, out, acc, src):
+        name, slots, tags = self.attrs
+        types = self.subs
+        out.writelines ('{')
+        with out.indent():
+            out.writelines (
+                'int n;',
+                'switch (%s->present) {' % (src,),
+            )
+            with out.indent():
+                for i in range (len (slots)):
+                    type_name = types[i].name()
+                    tag_name = csafe (slots[i])
+                    out.writelines (
+                        'case %s:' % (tags[i],),
+                        '  n = size_%s (&(%s->choice.%s));' % (type_name, src, tag_name),
                         '  break;',
                     )
                 out.writelines (
@@ -295,12 +657,16 @@ class c_choice (nodes.c_choice):
                 )
             out.writelines (
                 '}',
-                'TYB_CHECK (encode_TLV (%s, mark, %s->present, FLAG_APPLICATION | FLAG_STRUCTURED));' % (dst, src),
+                'TYB_CHECK (n);',
+                '%s += size_TLV (%s->present, n);' % (acc, src),
             )
         out.writelines ('}')
 
 class c_enumerated (nodes.c_enumerated):
 
+    def fixed_size (self):
+        return None
+
     def emit (self, out):
         defname, alts, = self.attrs
         if defname is not None:
@@ -321,8 +687,8 @@ class c_enumerated (nodes.c_enumerated):
         out.writelines ('{')
         with out.indent():
             out.writelines (
-                'TYB_CHECK (decode_TLV (&tlv, %s));' % (src,),
-                'TYB_FAILIF (tlv.type != TAG_ENUMERATED);',
+                'TYB_CHECK_AS (decode_TLV (&tlv, %s), TYB_FAIL_UNDERFLOW);' % (src,),
+                'TYB_FAILIF_AS (tlv.type != TAG_ENUMERATED, TYB_FAIL_TAG);',
             )
             with out.scope():
                 out.writelines (
@@ -332,7 +698,7 @@ class c_enumerated (nodes.c_enumerated):
                 with out.indent():
                     for name, val in alts:
                         out.writelines ('case %s: break;' % (val,))
-                    out.writelines ('default: return -1;')
+                    out.writelines ('default: TYB_FAIL (TYB_FAIL_CONSTRAINT);')
                 out.writelines ('}')
                 out.writelines ('*%s = intval;' % (lval,))
         out.writelines ('}')
@@ -342,23 +708,43 @@ class c_enumerated (nodes.c_enumerated):
         with out.scope():
             out.writelines (
                 'asn1int_t intval = *%s;' % (src,),
-                'TYB_CHECK (encode_ENUMERATED (%s, &intval));' % (dst,),
+                'TYB_CHECK_AS (encode_ENUMERATED (%s, &intval), TYB_FAIL_UNDERFLOW);' % (dst,),
             )
 
+    def emit_size (self, out, acc, src):
+        # the same size as an INTEGER.
+        out.writelines ('%s += size_INTEGER (*(%s));' % (acc, src))
+
 class c_defined (nodes.c_defined):
 
+    def fixed_size (self):
+        return None
+
     def emit (self, out):
         name, max_size = self.attrs
         out.write ('%s_t' % (name,), True)
 
     def emit_decode (self, out, lval, src):
         type_name, max_size = self.attrs
-        out.writelines ('TYB_CHECK (decode_%s (%s, %s));' % (type_name, lval, src),)
+        out.writelines ('TYB_CHECK_AS (decode_%s (%s, %s), TYB_FAIL_NESTED);' % (type_name, lval, src),)
 
     def emit_encode (self, out, dst, src):
         type_name, max_size = self.attrs
-        out.writelines ('TYB_CHECK (encode_%s (%s, %s));' % (type_name, dst, src),)
+        out.writelines ('TYB_CHECK_AS (encode_%s (%s, %s), TYB_FAIL_NESTED);' % (type_name, dst, src),)
 
+    def emit_size (self, out, acc, src):
+        type_name, max_size = self.attrs
+        with out.scope():
+            out.writelines (
+                'int n = size_%s (%s);' % (type_name, src),
+                'TYB_CHECK (n);',
+                '%s += n;' % (acc,),
+            )
+
+
+def has_fields_decoder (node):
+    # a decode_X_fields() for a SEQUENCE whose slots fit in the uint32_t mask.
+    return isinstance (node, c_sequence) and len (node.attrs[1]) <= 32
 
 class CBackend:
 
@@ -377,9 +763,24 @@ class CBackend:
         with self.cout.indent():
             self.cout.writelines (
                 'asn1raw_t tlv;',
+                'TYB_STATS_ENTER (&stats.decode_%s, src);' % (type_name,),
             )
             node.emit_decode (self.cout, 'dst', 'src')
-            self.cout.writelines ('return 0;')
+            self.cout.writelines ('TYB_STATS_LEAVE (src);', 'return 0;')
+        self.cout.writelines ('}', '')
+
+    def gen_decoder_fields (self, type_name, type_decl, node):
+        # generate a decoder for some of the slots of a SEQUENCE.
+        sig = 'int decode_%s_fields (%s_t * dst, buf_t * src, uint32_t mask)' % (type_name, type_name)
+        self.hout.writelines (sig + ';')
+        self.cout.writelines (sig, '{')
+        with self.cout.indent():
+            self.cout.writelines (
+                'asn1raw_t tlv;',
+                'TYB_STATS_ENTER (&stats.decode_%s_fields, src);' % (type_name,),
+            )
+            node.emit_decode_fields (self.cout, 'dst', 'src', 'mask')
+            self.cout.writelines ('TYB_STATS_LEAVE (src);', 'return 0;')
         self.cout.writelines ('}', '')
 
     def gen_encoder (self, type_name, type_decl, node):
@@ -388,26 +789,75 @@ class CBackend:
         self.cout.writelines (sig, '{')
         self.hout.writelines (sig + ';')
         with self.cout.indent():
+            self.cout.writelines ('TYB_STATS_ENTER (&stats.encode_%s, dst);' % (type_name,))
             node.emit_encode (self.cout, 'dst', 'src')
-            self.cout.writelines ('return 0;')
+            self.cout.writelines ('TYB_STATS_LEAVE (dst);', 'return 0;')
+        self.cout.writelines ('}', '')
+
+    def gen_size (self, type_name, type_decl, node):
+        # generate the exact encoded size of a type assignment
+        sig = 'int size_%s (const %s_t * src)' % (type_name, type_name)
+        self.cout.writelines (sig, '{')
+        self.hout.writelines (sig + ';')
+        with self.cout.indent():
+            self.cout.writelines ('int r = 0;')
+            node.emit_size (self.cout, 'r', 'src')
+            self.cout.writelines ('return r;')
         self.cout.writelines ('}', '')
 
+    def gen_stats (self):
+        # the per-type counters (see TYB_STATS in tinyber.h) and a function
+        #  to snapshot/reset them.
+        name = csafe (self.module_name)
+        self.hout.writelines ('#ifdef TYB_STATS', 'typedef struct {')
+        with self.hout.indent():
+            for (type_name, node, type_decl) in self.walker.defined_types:
+                self.hout.writelines ('tyb_counters_t decode_%s;' % (type_name,))
+                if has_fields_decoder (node):
+                    self.hout.writelines ('tyb_counters_t decode_%s_fields;' % (type_name,))
+                self.hout.writelines ('tyb_counters_t encode_%s;' % (type_name,))
+        self.hout.writelines (
+            '} %s_stats_t;' % (name,),
+            '',
+            '// copy the counters into <dst> (if not NULL), then zero them if <reset>.',
+            'void %s_stats (%s_stats_t * dst, int reset);' % (name, name),
+            '#endif // TYB_STATS',
+            '',
+        )
+        self.cout.writelines (
+            '#ifdef TYB_STATS',
+            'static %s_stats_t stats;' % (name,),
+            '',
+            'void %s_stats (%s_stats_t * dst, int reset)' % (name, name),
+            '{',
+            '  if (dst) {',
+            '    *dst = stats;',
+            '  }',
+            '  if (reset) {',
+            '    memset (&stats, 0, sizeof(stats));',
+            '  }',
+            '}',
+            '#endif // TYB_STATS',
+            '',
+        )
+
     def gen_codec_funs (self, type_name, type_decl, node):
         self.gen_decoder (type_name, type_decl, node)
+        if has_fields_decoder (node):
+            self.gen_decoder_fields (type_name, type_decl, node)
         self.gen_encoder (type_name, type_decl, node)
+        self.gen_size (type_name, type_decl, node)
 
     def copyfiles(self):
-        import shutil
         pkg_dir, _ = os.path.split(__file__)
-        tinyberc = os.path.join(pkg_dir, "data", "tinyber.c")
-        tinyberh = os.path.join(pkg_dir, "data", "tinyber.h")
-        shutil.copy(tinyberc, self.path)
-        shutil.copy(tinyberh, self.path)
+        for name in ('tinyber.c', 'tinyber.h'):
+            with open (os.path.join (pkg_dir, 'data', name)) as f:
+                update_file (os.path.join (self.path, name), f.read())
 
     def generate_code (self):
         self.copyfiles()
-        self.hout = Writer (open (self.base_path + '.h', 'w'))
-        self.cout = Writer (open (self.base_path + '.c', 'w'))
+        self.hout = Writer (OutputFile (self.base_path + '.h'))
+        self.cout = Writer (OutputFile (self.base_path + '.c'))
         self.hout.writelines (
             '',
             '// generated by %r' % sys.argv,
@@ -419,8 +869,12 @@ class CBackend:
             '#include <stdint.h>',
             '#include <string.h>',
             '#include "tinyber.h"',
-            '',
         )
+        # the headers of the modules we refer to.
+        names = getattr (self.args, 'module_names', None) or {}
+        for module_name in sorted (self.walker.imports):
+            self.hout.writelines ('#include "%s.h"' % (names.get (module_name, module_name),))
+        self.hout.writelines ('')
         self.cout.writelines (
             '',
             '// generated by %r' % sys.argv,
@@ -428,13 +882,15 @@ class CBackend:
             '',
             '#include "%s.h"' % (self.module_name,),
             '',
-            # needed for the inline defs when compiled with inlining disabled.
-            'extern void init_obuf (buf_t * self, uint8_t * buffer, unsigned int size);',
-            'extern void init_ibuf (buf_t * self, uint8_t * buffer, unsigned int size);',
-            '',
         )
 
         self.tag_assignments = self.walker.tag_assignments
+        if getattr (self.args, 'octet_pointers', False):
+            for (type_name, node, type_decl) in self.walker.defined_types:
+                use_pointers (node)
+        if getattr (self.args, 'soa', False):
+            for (type_name, node, type_decl) in self.walker.defined_types:
+                use_soa (node, self.walker.type_nodes)
 
         # generate typedefs and prototypes.
         out = self.hout
@@ -446,8 +902,12 @@ class CBackend:
             out.writelines (
                 ' %s_t;' % (type_name,),
                 '#define %s_MAX_SIZE %d' % (type_name, node.max_size()),
-                ''
             )
+            if isinstance (node, c_sequence) and len (node.attrs[1]) <= 32:
+                node.emit_field_masks (out)
+            out.writelines ('')
+
+        self.gen_stats()
 
         for (type_name, node, type_decl) in self.walker.defined_types:
             self.gen_codec_funs (type_name, type_decl, node)
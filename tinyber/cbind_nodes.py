@@ -0,0 +1,417 @@
+# -*- Mode: Python -*-
+
+# generate python bindings for the C backend: the C codec (<module>.[ch]) plus
+#  a cython module with the same classes as the cython backend, whose
+#  decode()/encode() run the generated C decode_X()/encode_X() functions and
+#  convert between the C structs and the python objects.
+
+from tinyber import c_nodes, cy_nodes
+from tinyber.c_nodes import CBackend, int_max_size_type, use_pointers, use_soa
+from tinyber.cy_nodes import CythonBackend, psafe
+from tinyber.walker import Walker
+import os
+import sys
+
+# ctype (decls, name) returns the cython name of the C type of a node, for the
+#  'cdef extern' block.  the C backend nests anonymous structs for OCTET
+#  STRING and SEQUENCE OF, these get declared (in <decls>) under a made-up
+#  <name>: cython only needs it to know the fields, it never reaches the C code.
+
+def declare_struct (decls, name, fields):
+    decls.append ('ctypedef struct %s:' % (name,))
+    decls.extend ('    ' + field for field in fields)
+    decls.append ('')
+
+class c_base_type (cy_nodes.c_base_type):
+
+    # see c_nodes.use_pointers()
+    pointer = False
+
+    def ctype (self, decls, name):
+        type_name, min_size, max_size = self.attrs
+        if type_name == 'OCTET STRING':
+            if self.pointer:
+                declare_struct (decls, name, ['const uint8_t * ptr', 'int len'])
+            else:
+                declare_struct (decls, name, ['uint8_t val[%d]' % (max_size,), 'int len'])
+            return name
+        elif type_name == 'BOOLEAN':
+            return 'asn1bool_t'
+        elif type_name == 'INTEGER':
+            return int_max_size_type (min_size, max_size)
+        else:
+            raise NotImplementedError (type_name)
+
+    def emit_from_c (self, out, lval, src):
+        type_name, min_size, max_size = self.attrs
+        if type_name == 'OCTET STRING' and self.pointer:
+            out.writelines ('%s = (<char *> %s.ptr)[:%s.len]' % (lval, src, src))
+        elif type_name == 'OCTET STRING':
+            out.writelines ('%s = (<char *> %s.val)[:%s.len]' % (lval, src, src))
+        else:
+            out.writelines ('%s = %s' % (lval, src))
+
+    def emit_to_c (self, out, dst, val):
+        type_name, min_size, max_size = self.attrs
+        if type_name == 'OCTET STRING':
+            # any bytes-like value (bytes, bytearray, memoryview...).
+            s = out.local ('const unsigned char[:]', 's')
+            n = out.local ('Py_ssize_t', 'n')
+            out.writelines (
+                # a memoryview takes None without complaint.
+                'if %s is None:' % (val,),
+                "    raise TypeError ('%s is None')" % (val,),
+                '%s = %s' % (s, val),
+                '%s = %s.shape[0]' % (n, s),
+                'if %s < %d or %s > %d:' % (n, min_size or 0, n, max_size),
+                '    raise ValueError (%s, %d, %d)' % (n, min_size or 0, max_size),
+            )
+            # &s[0] only exists for a non-empty value.
+            if self.pointer:
+                # <val> keeps the buffer alive until encode_X() is done.
+                out.writelines (
+                    'if %s:' % (n,),
+                    '    %s.ptr = &%s[0]' % (dst, s),
+                    'else:',
+                    '    %s.ptr = <const uint8_t *> <char *> b""' % (dst,),
+                )
+            else:
+                out.writelines (
+                    'if %s:' % (n,),
+                    '    memcpy (%s.val, &%s[0], %s)' % (dst, s, n),
+                )
+            out.writelines ('%s.len = %s' % (dst, n))
+        else:
+            out.writelines ('%s = %s' % (dst, val))
+
+class c_sequence (cy_nodes.c_sequence):
+
+    def ctype (self, decls, name):
+        type_name, slots = self.attrs
+        fields = []
+        for i in range (len (slots)):
+            slot_name = psafe (slots[i])
+            slot_type = self.subs[i].ctype (decls, '_%s_%s' % (type_name, slot_name))
+            fields.append ('%s %s' % (slot_type, slot_name))
+        declare_struct (decls, name, fields)
+        return name
+
+    def emit_from_c (self, out, lval, src):
+        name, slots = self.attrs
+        for i in range (len (slots)):
+            slot_name = psafe (slots[i])
+            self.subs[i].emit_from_c (out, '%s.%s' % (lval, slot_name), '%s.%s' % (src, slot_name))
+
+    def emit_to_c (self, out, dst, val):
+        name, slots = self.attrs
+        for i in range (len (slots)):
+            slot_name = psafe (slots[i])
+            self.subs[i].emit_to_c (out, '%s.%s' % (dst, slot_name), '%s.%s' % (val, slot_name))
+
+class c_sequence_of (cy_nodes.c_sequence_of):
+
+    # see c_nodes.use_soa()
+    record = None
+
+    def ctype (self, decls, name):
+        min_size, max_size, = self.attrs
+        [seq_type] = self.subs
+        if self.record is None:
+            val_type = seq_type.ctype (decls, '%s_val' % (name,))
+            declare_struct (decls, name, ['%s val[%d]' % (val_type, max_size), 'int len'])
+        else:
+            record_name, slots = self.record.attrs
+            fields = []
+            for i in range (len (slots)):
+                slot_name = psafe (slots[i])
+                slot_type = self.record.subs[i].ctype (decls, '%s_%s' % (name, slot_name))
+                fields.append ('%s %s[%d]' % (slot_type, slot_name, max_size))
+            declare_struct (decls, name, fields + ['int len'])
+        return name
+
+    def emit_from_c (self, out, lval, src):
+        [seq_type] = self.subs
+        a = out.local (self.container, 'a')
+        v = out.local (seq_type.field_type(), 'v')
+        i = out.local ('int', 'i')
+        out.writelines (
+            '%s = %s()' % (a, self.container),
+            'for %s in range (%s.len):' % (i, src),
+        )
+        with out.indent():
+            if self.record is None:
+                seq_type.emit_from_c (out, v, '%s.val[%s]' % (src, i))
+            else:
+                # gather the element from the columns.
+                type_name = seq_type.name()
+                record_name, slots = self.record.attrs
+                out.writelines ('%s = %s.__new__ (%s)' % (v, type_name, type_name))
+                for j in range (len (slots)):
+                    slot_name = psafe (slots[j])
+                    self.record.subs[j].emit_from_c (out, '%s.%s' % (v, slot_name), '%s.%s[%s]' % (src, slot_name, i))
+            out.writelines ('%s.%s (%s)' % (a, self.add, v))
+        out.writelines ('%s = %s' % (lval, a))
+
+    def emit_to_c (self, out, dst, val):
+        min_size, max_size, = self.attrs
+        [seq_type] = self.subs
+        v = out.local (seq_type.field_type(), 'v')
+        i = out.local ('int', 'i')
+        # the C struct has room for <max_size> elements.
+        out.writelines (
+            'if len (%s) < %d or len (%s) > %d:' % (val, min_size or 0, val, max_size),
+            '    raise ValueError (len (%s), %d, %d)' % (val, min_size or 0, max_size),
+            '%s = 0' % (i,),
+            'for %s in %s:' % (v, val),
+        )
+        with out.indent():
+            if self.record is None:
+                seq_type.emit_to_c (out, '%s.val[%s]' % (dst, i), v)
+            else:
+                # scatter the element into the columns.
+                type_name = seq_type.name()
+                record_name, slots = self.record.attrs
+                out.writelines (
+                    'if %s is None:' % (v,),
+                    "    raise TypeError ('%s: %s is None')" % (type_name, v),
+                )
+                for j in range (len (slots)):
+                    slot_name = psafe (slots[j])
+                    self.record.subs[j].emit_to_c (out, '%s.%s[%s]' % (dst, slot_name, i), '%s.%s' % (v, slot_name))
+            out.writelines ('%s += 1' % (i,))
+        out.writelines ('%s.len = %s' % (dst, i))
+
+# NOTE parent class
+class c_set_of (c_sequence_of):
+    container = 'set'
+    add = 'add'
+
+class c_choice (cy_nodes.c_choice):
+
+    def ctype (self, decls, name):
+        type_name, slots, tags = self.attrs
+        decls.append ('cdef union %s_u:' % (type_name,))
+        for i in range (len (slots)):
+            decls.append ('    %s_t %s' % (self.subs[i].name(), psafe (slots[i])))
+        decls.append ('')
+        declare_struct (decls, name, ['int present', '%s_u choice' % (type_name,)])
+        return name
+
+    def emit_from_c (self, out, lval, src):
+        name, slots, tags = self.attrs
+        types = self.subs
+        for i in range (len (slots)):
+            out.writelines ('%s %s.present == %s:' % ('if' if i == 0 else 'elif', src, tags[i]))
+            with out.indent():
+                v = out.local (types[i].field_type(), 'v')
+                types[i].emit_from_c (out, v, '%s.choice.%s' % (src, psafe (slots[i])))
+                out.writelines ('%s = %s' % (lval, v))
+        out.writelines (
+            'else:',
+            '    raise BadChoice (%s.present)' % (src,),
+        )
+
+    def emit_to_c (self, out, dst, val):
+        name, slots, tags = self.attrs
+        types = self.subs
+        for i in range (len (slots)):
+            type_name = types[i].name()
+            out.writelines ('%s isinstance (%s, %s):' % ('if' if i == 0 else 'elif', val, type_name))
+            with out.indent():
+                out.writelines (
+                    '%s.present = %s' % (dst, tags[i]),
+                    '(<%s> %s)._to_c (&%s.choice.%s)' % (type_name, val, dst, psafe (slots[i])),
+                )
+        out.writelines (
+            'else:',
+            '    raise BadChoice (%s)' % (val,),
+        )
+
+class c_enumerated (cy_nodes.c_enumerated):
+
+    def ctype (self, decls, name):
+        # a C enum.
+        return 'int'
+
+    def emit_from_c (self, out, lval, src):
+        for i, (name, val) in enumerate (self.values()):
+            out.writelines (
+                '%s %s == %d:' % ('if' if i == 0 else 'elif', src, val),
+                "    %s = '%s'" % (lval, name),
+            )
+        out.writelines (
+            'else:',
+            '    raise ConstraintViolation (%s)' % (src,),
+        )
+
+    def emit_to_c (self, out, dst, val):
+        for i, (name, v) in enumerate (self.values()):
+            out.writelines (
+                "%s %s == '%s':" % ('if' if i == 0 else 'elif', val, name),
+                '    %s = %d' % (dst, v),
+            )
+        out.writelines (
+            'else:',
+            '    raise ValueError (%s)' % (val,),
+        )
+
+class c_defined (cy_nodes.c_defined):
+
+    def ctype (self, decls, name):
+        return '%s_t' % (self.name(),)
+
+    def emit_from_c (self, out, lval, src):
+        type_name, max_size = self.attrs
+        out.writelines (
+            '%s = %s.__new__ (%s)' % (lval, type_name, type_name),
+            '%s._from_c (&%s)' % (lval, src),
+        )
+
+    def emit_to_c (self, out, dst, val):
+        type_name, max_size = self.attrs
+        out.writelines (
+            'if %s is None:' % (val,),
+            "    raise TypeError ('%s: %s is None')" % (type_name, val),
+            '%s._to_c (&%s)' % (val, dst),
+        )
+
+class CBindBackend (CythonBackend):
+
+    def gen_decoder (self, type_name, type_decl, node, lval):
+        self.emit_function (
+            'cdef _from_c (self, const %s_t * src):' % (type_name,),
+            lambda out: node.emit_from_c (out, lval, 'src[0]')
+        )
+        self.out.newline()
+        self.out.writelines ('def decode (self, bytes data):')
+        with self.out.indent():
+            self.out.writelines (
+                'cdef %s_t val' % (type_name,),
+                'cdef buf_t src',
+                'init_ibuf (&src, <uint8_t *> <char *> data, len (data))',
+                'if decode_%s (&val, &src) != 0:' % (type_name,),
+                '    raise DecodingError (data)',
+                'elif src.pos != src.size:',
+                '    raise ExtraData (src.size - src.pos)',
+                'self._from_c (&val)',
+                'return self',
+            )
+
+    def gen_encoder (self, type_name, type_decl, node, lval):
+        self.emit_function (
+            'cdef _to_c (self, %s_t * dst):' % (type_name,),
+            lambda out: node.emit_to_c (out, 'dst[0]', lval)
+        )
+        self.out.newline()
+        self.out.writelines ('def encode (self):')
+        with self.out.indent():
+            # size_X() gives the exact length, so encode_X() can fill a
+            #  new bytes object in place.
+            self.out.writelines (
+                'cdef %s_t val' % (type_name,),
+                'cdef buf_t dst',
+                'cdef int n',
+                'self._to_c (&val)',
+                'n = size_%s (&val)' % (type_name,),
+                'if n < 0:',
+                "    raise ValueError ('size_%s failed')" % (type_name,),
+                'r = PyBytes_FromStringAndSize (NULL, n)',
+                'init_obuf (&dst, <uint8_t *> <char *> r, n)',
+                'if encode_%s (&dst, &val) != 0 or dst.pos != 0:' % (type_name,),
+                "    raise ValueError ('encode_%s failed')" % (type_name,),
+                'return r',
+            )
+        self.out.newline()
+        self.out.writelines ('def encode_into (self, buffer, Py_ssize_t offset=0):')
+        with self.out.indent():
+            # straight into the caller's buffer, no copy.
+            self.out.writelines (
+                'cdef %s_t val' % (type_name,),
+                'cdef buf_t dst',
+                'cdef int n',
+                'cdef unsigned char[:] view = buffer',
+                'self._to_c (&val)',
+                'n = size_%s (&val)' % (type_name,),
+                'if n < 0:',
+                "    raise ValueError ('size_%s failed')" % (type_name,),
+                'if offset < 0 or offset > view.shape[0] - n:',
+                "    raise ValueError ('%d bytes at offset %d: buffer too small' % (n, offset))",
+                # &view[offset] is out of bounds for offset == len (view).
+                'if n == 0:',
+                '    return 0',
+                'init_obuf (&dst, <uint8_t *> &view[offset], n)',
+                'if encode_%s (&dst, &val) != 0 or dst.pos != 0:' % (type_name,),
+                "    raise ValueError ('encode_%s failed')" % (type_name,),
+                'return n',
+            )
+
+    def gen_header (self):
+        command = os.path.basename(sys.argv[0])
+        out = self.out
+        out.writelines (
+            '# -*- Mode: Cython -*-',
+            '# generated by: %s %s' % (command, " ".join(sys.argv[1:])),
+            '# *** do not edit ***',
+            '',
+            'from libc.stdint cimport int8_t, int16_t, int32_t, int64_t, uint8_t, uint16_t, uint32_t, uint64_t',
+            'from libc.string cimport memcpy',
+            'from cpython.bytes cimport PyBytes_FromStringAndSize',
+            'from tinyber.codec import DecodingError, ConstraintViolation, BadChoice, ExtraData',
+            '',
+            'cdef extern from "%s.h":' % (self.module_name,),
+        )
+        with out.indent():
+            out.newline()
+            out.writelines (
+                'ctypedef int64_t asn1int_t',
+                'ctypedef uint8_t asn1bool_t',
+            )
+            out.newline()
+            out.writelines (
+                'ctypedef struct buf_t:',
+                '    uint8_t * buffer',
+                '    unsigned int pos',
+                '    unsigned int size',
+            )
+            # buf_t has more fields with TYB_IOVEC: let tinyber set them all.
+            out.writelines (
+                'void init_obuf (buf_t * self, uint8_t * buffer, unsigned int size)',
+                'void init_ibuf (buf_t * self, uint8_t * buffer, unsigned int size)',
+            )
+            for (type_name, node, type_decl) in self.walker.defined_types:
+                out.newline()
+                decls = []
+                ctype = node.ctype (decls, '%s_t' % (type_name,))
+                for line in decls:
+                    if line:
+                        out.writelines (line)
+                    else:
+                        out.newline()
+                if ctype != '%s_t' % (type_name,):
+                    out.writelines ('ctypedef %s %s_t' % (ctype, type_name))
+                    out.newline()
+                out.writelines (
+                    'int decode_%s (%s_t * dst, buf_t * src)' % (type_name, type_name),
+                    'int encode_%s (buf_t * dst, const %s_t * src)' % (type_name, type_name),
+                    'int size_%s (const %s_t * src)' % (type_name, type_name),
+                )
+        out.newline()
+        out.writelines (
+            'cdef class ASN1:',
+            '    pass',
+        )
+
+    def generate_code (self):
+        if self.walker.imports:
+            raise NotImplementedError ('cbind output: references to other modules (%s)' % (', '.join (sorted (self.walker.imports)),))
+        # the C codec itself, from its own walk of the module.
+        walker = Walker (self.walker.sema_module, c_nodes)
+        walker.walk()
+        CBackend (self.args, walker, self.module_name, self.path).generate_code()
+        if getattr (self.args, 'octet_pointers', False):
+            for (type_name, node, type_decl) in self.walker.defined_types:
+                use_pointers (node)
+        if getattr (self.args, 'soa', False):
+            for (type_name, node, type_decl) in self.walker.defined_types:
+                use_soa (node, self.walker.type_nodes)
+        CythonBackend.generate_code (self)
@@ -4,6 +4,12 @@
 
 # NOTE: the encoder accumulates in *reverse*.
 
+import mmap
+import os
+import sys
+import threading
+import types
+
 
 class DecodingError(Exception):
     pass
@@ -63,12 +69,21 @@ class TAG:
 
 class Decoder:
 
-    def __init__(self, data, pos=0, end=None):
+    # with views=True, OCTET STRINGs are returned as memoryview slices of
+    #  <data> instead of copies.  a view keeps <data> alive and is valid for
+    #  as long as <data> is not modified (a bytearray cannot be resized while
+    #  views of it exist); call bytes() on a view to keep a private copy.
+
+    def __init__(self, data, pos=0, end=None, views=False):
         self.data = data
         self.pos = pos
         if end is None:
             end = len(data)
         self.end = end
+        if views:
+            self.view = memoryview(data)
+        else:
+            self.view = None
 
     def pop_byte(self):
         if self.pos + 1 > self.end:
@@ -86,6 +101,7 @@ class Decoder:
             raise Underflow(self)
         else:
             r = Decoder(self.data, self.pos, self.pos + nbytes)
+            r.view = self.view
             self.pos += nbytes
             return r
 
@@ -93,7 +109,10 @@ class Decoder:
         if self.pos + nbytes > self.end:
             raise Underflow(self)
         else:
-            result = self.data[self.pos:self.pos+nbytes]
+            if self.view is None:
+                result = self.data[self.pos:self.pos+nbytes]
+            else:
+                result = self.view[self.pos:self.pos+nbytes]
             self.pos += nbytes
             return result
 
@@ -136,7 +155,7 @@ class Decoder:
     def get_tag(self):
         b = self.pop_byte()
         tag = b & 0b11111
-        flags = b & 0b1100000
+        flags = b & 0b11100000
         if tag == 0b11111:
             tag = self.get_multibyte_tag()
         return tag, flags
@@ -162,11 +181,10 @@ class Decoder:
             if n & 0x80:
                 # negative
                 n -= 0x100
-            else:
-                while length:
-                    n = n << 8 | self.pop_byte()
-                    length -= 1
-                return n
+            while length:
+                n = n << 8 | self.pop_byte()
+                length -= 1
+            return n
 
     def next_INTEGER(self, min_val, max_val):
         self.check(TAG.INTEGER)
@@ -219,75 +237,122 @@ class EncoderContext:
         self.enc.emit_tag(self.tag, self.flags)
 
 
+# big-endian rendering of <n> in exactly <nbytes> bytes (two's complement if <signed>).
+if hasattr(int, 'to_bytes'):
+    def _int_to_bytes(n, nbytes, signed=True):
+        return n.to_bytes(nbytes, 'big', signed=signed)
+else:
+    from binascii import unhexlify as _unhexlify
+
+    def _int_to_bytes(n, nbytes, signed=True):
+        if n < 0:
+            n += 1 << (nbytes * 8)
+        return _unhexlify('%0*x' % (nbytes * 2, n))
+
+
+# big-endian two's complement bytes to an integer: the inverse of _int_to_bytes.
+#  public, since generated decoders call it.
+if hasattr(int, 'from_bytes'):
+    from functools import partial as _partial
+    int_from_bytes = _partial(int.from_bytes, byteorder='big', signed=True)
+else:
+    from binascii import hexlify as _hexlify
+
+    def int_from_bytes(s):
+        if not s:
+            return 0
+        n = int(_hexlify(s), 16)
+        if ord(s[0:1]) & 0x80:
+            n -= 1 << (len(s) * 8)
+        return n
+
+
 class Encoder:
 
-    def __init__(self):
-        self.r = []
+    # the buffer is filled from the end toward the front, so each
+    #  emit() is a slice assignment rather than an insert.
+
+    def __init__(self, size=1024):
+        self.buffer = bytearray(size)
+        self.size = size
         self.length = 0
 
-    def _chr(self, x):
-        return bytearray((x,))
+    def grow(self, n):
+        new_size = self.size * 2
+        while new_size < self.length + n:
+            new_size *= 2
+        new_buffer = bytearray(new_size)
+        new_buffer[new_size - self.length:] = self.buffer[self.size - self.length:]
+        self.buffer = new_buffer
+        self.size = new_size
 
     def emit(self, data):
-        self.r.insert(0, data)
-        self.length += len(data)
+        n = len(data)
+        if self.length + n > self.size:
+            self.grow(n)
+        self.length += n
+        pos = self.size - self.length
+        self.buffer[pos:pos+n] = data
+
+    def emit_byte(self, b):
+        if self.length == self.size:
+            self.grow(1)
+        self.length += 1
+        self.buffer[self.size - self.length] = b
 
     def emit_length(self, n):
         if n < 0x80:
-            self.emit(self._chr(n))
+            self.emit_byte(n)
         else:
-            r = []
-            while n:
-                r.insert(0, self._chr(n & 0xff))
-                n >>= 8
-            r.insert(0, self._chr(0x80 | len(r)))
-            self.emit(bytearray().join(r))
+            lol = (n.bit_length() + 7) // 8
+            self.emit(_int_to_bytes(n, lol, signed=False))
+            self.emit_byte(0x80 | lol)
 
     def emit_tag(self, tag, flags=0):
         if tag < 0x1f:
-            self.emit(self._chr(tag | flags))
+            self.emit_byte(tag | flags)
         else:
             while tag:
                 if tag < 0x80:
-                    self.emit(self._chr(tag))
+                    self.emit_byte(tag)
                 else:
-                    self.emit(self._chr((tag & 0x7f) | 0x80))
+                    self.emit_byte((tag & 0x7f) | 0x80)
                 tag >>= 7
-            self.emit(self._chr(0x1f | flags))
+            self.emit_byte(0x1f | flags)
 
     def TLV(self, tag, flags=0):
         return EncoderContext(self, tag, flags)
 
     def done(self):
-        return bytearray().join(self.r)
+        return self.buffer[self.size - self.length:]
+
+    # copy the encoding into <buffer> (bytearray, memoryview, mmap...) at
+    #  <offset>, and return its length.
+    def done_into(self, buffer, offset=0):
+        n = self.length
+        if offset < 0 or offset + n > len(buffer):
+            raise ValueError('%d bytes at offset %d: buffer too small' % (n, offset))
+        data = memoryview(self.buffer)[self.size - n:]
+        try:
+            buffer[offset:offset + n] = data
+        except (TypeError, IndexError):
+            # python 2's mmap only takes a str.
+            buffer[offset:offset + n] = data.tobytes()
+        return n
+
+    def reset(self):
+        self.length = 0
 
     # base types
 
     # encode an integer, ASN1 style.
     # two's complement with the minimum number of bytes.
     def emit_integer(self, n):
-        i = 0
-        n0 = n
-        byte = 0x80
-        r = []
-        while 1:
-            n >>= 8
-            if n0 == n:
-                if n == -1 and ((not byte & 0x80) or i == 0):
-                    # negative, but high bit clear
-                    r.insert(0, self._chr(0xff))
-                    i = i + 1
-                elif n == 0 and (byte & 0x80):
-                    # positive, but high bit set
-                    r.insert(0, self._chr(0x00))
-                    i = i + 1
-                break
-            else:
-                byte = n0 & 0xff
-                r.insert(0, self._chr(byte))
-                i += 1
-                n0 = n
-        self.emit(bytearray().join(r))
+        if n < 0:
+            nbytes = (~n).bit_length() // 8 + 1
+        else:
+            nbytes = n.bit_length() // 8 + 1
+        self.emit(_int_to_bytes(n, nbytes))
 
     def emit_INTEGER(self, n):
         with self.TLV(TAG.INTEGER):
@@ -300,24 +365,70 @@ class Encoder:
     def emit_BOOLEAN(self, v):
         with self.TLV(TAG.BOOLEAN):
             if v:
-                self.emit(b'\xff')
+                self.emit_byte(0xff)
             else:
-                self.emit(b'\x00')
+                self.emit_byte(0x00)
+
 
+# these are slotted so that classes generated with --compact can do without
+#  a __dict__: SEQUENCE subclasses have one slot per field, the rest a single
+#  'value' slot.  other generated classes add '__dict__' and '__weakref__'
+#  (or just leave out __slots__), so their instances take any attribute.
 
-class ASN1:
+# each thread keeps an Encoder for ASN1.encode() and encode_into(), so
+#  encoding a message doesn't allocate a new buffer.  it is first sized
+#  from the message's max_size (up to MAX_POOLED_SIZE), and dropped if it
+#  grows past MAX_POOLED_SIZE.
+
+MAX_POOLED_SIZE = 1 << 16
+_encoders = threading.local()
+
+
+def get_encoder(size):
+    # (a bigger message starts with the pooled encoder too, and grows it)
+    size = min(size, MAX_POOLED_SIZE)
+    e = getattr(_encoders, 'encoder', None)
+    if e is not None and e.size >= size:
+        # (taken out while in use, in case _encode() encodes something else)
+        _encoders.encoder = None
+        e.length = 0
+        return e
+    return Encoder(max(16, size))
+
+
+def put_encoder(e):
+    if e.size <= MAX_POOLED_SIZE:
+        _encoders.encoder = e
+
+
+class ASN1(object):
+    __slots__ = ()
     value = None
+    # generated classes know better.
+    max_size = 1024
 
     def __init__(self, value=None):
         self.value = value
 
     def encode(self):
-        e = Encoder()
-        self._encode(e)
-        return e.done()
-
-    def decode(self, data):
-        b = Decoder(data)
+        e = get_encoder(self.max_size)
+        try:
+            self._encode(e)
+            return e.done()
+        finally:
+            put_encoder(e)
+
+    # encode straight into <buffer> at <offset>: see Encoder.done_into().
+    def encode_into(self, buffer, offset=0):
+        e = get_encoder(self.max_size)
+        try:
+            self._encode(e)
+            return e.done_into(buffer, offset)
+        finally:
+            put_encoder(e)
+
+    def decode(self, data, views=False):
+        b = Decoder(data, views=views)
         self._decode(b)
 
     def __repr__(self):
@@ -328,27 +439,32 @@ class SEQUENCE(ASN1):
     __slots__ = ()
 
     def __init__(self, **args):
-        for k, v in args.iteritems():
+        for k, v in args.items():
             setattr(self, k, v)
 
     def __repr__(self):
         r = []
         for name in self.__slots__:
-            r.append('%s=%r' % (name, getattr(self, name)))
+            if not name.startswith('__'):
+                r.append('%s=%r' % (name, getattr(self, name)))
         return '<%s %s>' % (self.__class__.__name__, ' '.join(r))
 
 
 class CHOICE(ASN1):
+    __slots__ = ('value',)
     tags_f = {}
     tags_r = {}
 
     def _decode(self, src):
         tag, src = src.next_APPLICATION()
-        self.value = self.tags_r[tag]()
+        klass = self.tags_r.get(tag)
+        if klass is None:
+            raise BadChoice(tag)
+        self.value = klass()
         self.value._decode(src)
 
     def _encode(self, dst):
-        for klass, tag in self.tags_f.iteritems():
+        for klass, tag in self.tags_f.items():
             if isinstance(self.value, klass):
                 with dst.TLV(tag, FLAG.APPLICATION | FLAG.STRUCTURED):
                     self.value._encode(dst)
@@ -356,15 +472,40 @@ class CHOICE(ASN1):
         raise BadChoice(self.value)
 
 
+def _read_only(self, *args):
+    raise AttributeError('shared %s instances are read-only' % (self.__class__.__name__,))
+
+
 class ENUMERATED(ASN1):
+    __slots__ = ('value',)
     tags_f = {}
     tags_r = {}
-    value = 'NoValueDefined'
 
     def _decode(self, src):
         v = src.next_ENUMERATED()
         self.value = self.tags_r[v]
 
+    # the one instance for encoded value <v>.  decoders generated with
+    #  --compact share these between messages, so they are read-only:
+    #  instances of a subclass (of the same name) that refuses setattr.
+    @classmethod
+    def shared(cls, v):
+        instances = cls.__dict__.get('_instances')
+        if instances is None:
+            frozen = type(cls.__name__, (cls,), {
+                '__slots__': (),
+                '__module__': cls.__module__,
+                '__setattr__': _read_only,
+                '__delattr__': _read_only,
+            })
+            instances = {}
+            for n, name in cls.tags_r.items():
+                ob = object.__new__(frozen)
+                object.__setattr__(ob, 'value', name)
+                instances[n] = ob
+            cls._instances = instances
+        return instances[v]
+
     def _encode(self, dst):
         with dst.TLV(TAG.ENUMERATED):
             dst.emit_integer(self.tags_f[self.value])
@@ -373,6 +514,295 @@ class ENUMERATED(ASN1):
         return '<%s %s>' % (self.__class__.__name__, self.value)
 
 
+# batch interfaces: one Decoder/Encoder for many back-to-back messages.
+
+# decode every <klass> message in <data>.  returns a list holding, for
+#  each message in order, either the decoded object or the exception
+#  that stopped it.  a bad outer header ends the list, since the rest
+#  of the buffer can no longer be framed.
+def decode_many(klass, data, views=False):
+    src = Decoder(data, views=views)
+    total = src.end
+    result = []
+    while src.pos < total:
+        start = src.pos
+        try:
+            src.get_tag()
+            length = src.get_length()
+        except DecodingError as e:
+            result.append(e)
+            break
+        end = src.pos + length
+        if end > total:
+            result.append(Underflow(src))
+            break
+        # let the message decode itself from the shared decoder,
+        #  fenced to its own TLV.
+        src.pos = start
+        src.end = end
+        try:
+            msg = klass()
+            msg._decode(src)
+        except Exception as e:
+            result.append(e)
+        else:
+            result.append(msg)
+        src.pos = end
+        src.end = total
+    return result
+
+
+# encode <objs> back-to-back into a single buffer.  returns (data, errors),
+#  where <errors> lists (index, exception) for each object that could not
+#  be encoded; those are left out of <data>.
+def encode_many(objs):
+    dst = Encoder()
+    items = list(objs)
+    errors = []
+    # the encoder works backward, so start with the last object.
+    for i in range(len(items) - 1, -1, -1):
+        mark = dst.length
+        try:
+            items[i]._encode(dst)
+        except Exception as e:
+            dst.length = mark
+            errors.append((i, e))
+    errors.reverse()
+    return dst.done(), errors
+
+
+# the longest TLV header we handle: a 5-byte tag and a 5-byte length.
+MAX_HEADER_SIZE = 10
+
+
+# decode the tag and length of the TLV that starts at <pos> in <data>,
+#  which may be any sliceable buffer.  returns (tag, flags, header_size, length).
+#  raises Underflow if <data> ends before the header does.
+def get_header(data, pos=0):
+    window = data[pos:pos + MAX_HEADER_SIZE]
+    if not isinstance(window, bytes):
+        window = bytes(bytearray(window))
+    src = Decoder(window)
+    try:
+        tag, flags = src.get_tag()
+        length = src.get_length()
+    except Underflow:
+        if len(window) == MAX_HEADER_SIZE:
+            raise ElementTooLarge(data, pos)
+        raise
+    return tag, flags, src.pos, length
+
+
+class StreamDecoder:
+
+    # reassemble back-to-back messages of type <klass> (usually a generated
+    #  top-level CHOICE) from a byte stream that arrives in arbitrary pieces:
+    #
+    #    stream = StreamDecoder(ThingMsg)
+    #    for chunk in chunks:
+    #        stream.feed(chunk)
+    #        for msg in stream:
+    #            handle(msg)
+    #
+    # each chunk is appended to the buffer once and each message's outer
+    #  header is parsed once.  the bytes of a complete message are copied
+    #  once more, into the immutable object it is decoded from (so that
+    #  views=True values stay valid after later feeds).
+    #
+    # a message that fails to decode is raised from the iterator, and has
+    #  already been skipped: iterating again resumes with the next one.
+    #  an unparseable header leaves the stream stuck on that error.
+
+    def __init__(self, klass, views=False):
+        self.klass = klass
+        self.views = views
+        self.buffer = bytearray()
+        self.pos = 0
+        # size of the next message, once its header has been seen.
+        self.need = 0
+
+    def feed(self, data):
+        self.buffer.extend(data)
+
+    def pending(self):
+        return len(self.buffer) - self.pos
+
+    def compact(self):
+        # drop consumed bytes once they make up at least half the buffer,
+        #  so each byte is moved at most a constant number of times.
+        if self.pos and self.pos * 2 >= len(self.buffer):
+            del self.buffer[:self.pos]
+            self.pos = 0
+
+    def __iter__(self):
+        while 1:
+            if not self.need:
+                try:
+                    tag, flags, header_size, length = get_header(self.buffer, self.pos)
+                except Underflow:
+                    break
+                self.need = header_size + length
+            end = self.pos + self.need
+            if end > len(self.buffer):
+                break
+            data = memoryview(self.buffer)[self.pos:end].tobytes()
+            self.pos = end
+            self.need = 0
+            self.compact()
+            msg = self.klass()
+            msg.decode(data, self.views)
+            yield msg
+        self.compact()
+
+
+class RecordFile:
+
+    # back-to-back records (e.g. a log of a generated top-level CHOICE) in
+    #  a file, read through a read-only mmap:
+    #
+    #    with RecordFile('log.ber') as f:
+    #        for msg in f.decode(ThingMsg):
+    #            handle(msg)
+    #
+    # only the outer header of each record is parsed to find the next one,
+    #  and the OS pages the file in (and drops it again) as the walk goes,
+    #  so memory use doesn't grow with the size of the file.
+    #
+    # records() yields (offset, view) without copying anything: a view is
+    #  a read-only memoryview of the map (a buffer on python 2), valid
+    #  until close().  decode() runs the python Decoder directly over the
+    #  map; the cython Decoder needs bytes, and is given a copy of one
+    #  record at a time.  with views=True the OCTET STRINGs of decoded
+    #  objects are views of the map too.  on python 3 the map can't be
+    #  closed while any view of it is alive - bytes() the ones to keep.
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.size = os.fstat(f.fileno()).st_size
+            if self.size:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                # mmap won't map an empty file.
+                self.map = b''
+        advice = getattr(mmap, 'MADV_SEQUENTIAL', None)
+        if advice is not None and hasattr(self.map, 'madvise'):
+            self.map.madvise(advice)
+        try:
+            self.whole = memoryview(self.map)
+        except TypeError:
+            # python 2's mmap has only the old buffer interface.
+            self.whole = None
+
+    def close(self):
+        if self.size:
+            if self.whole is not None:
+                self.whole.release()
+            self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def headers(self, pos=0):
+        # (offset, tag, flags, header_size, length) of each record from <pos>.
+        #  a truncated last record raises Underflow.
+        while pos < self.size:
+            tag, flags, header_size, length = get_header(self.map, pos)
+            end = pos + header_size + length
+            if end > self.size:
+                raise Underflow(self)
+            yield pos, tag, flags, header_size, length
+            pos = end
+
+    def view(self, offset, size):
+        if self.whole is None:
+            return buffer(self.map, offset, size)
+        else:
+            return self.whole[offset:offset + size]
+
+    def records(self, pos=0):
+        for offset, tag, flags, header_size, length in self.headers(pos):
+            yield offset, self.view(offset, header_size + length)
+
+    def decoder(self, offset, size, views=False):
+        try:
+            return Decoder(self.map, offset, offset + size, views)
+        except TypeError:
+            # the cython Decoder (or views=True over python 2's mmap).
+            return Decoder(self.map[offset:offset + size], 0, size, views)
+
+    def decode(self, klass, views=False, pos=0):
+        for offset, tag, flags, header_size, length in self.headers(pos):
+            msg = klass()
+            msg._decode(self.decoder(offset, header_size + length, views))
+            yield msg
+
+    def decode_at(self, klass, offset, views=False):
+        # the one record at <offset> (e.g. from tinyber.index).
+        tag, flags, header_size, length = get_header(self.map, offset)
+        if offset + header_size + length > self.size:
+            raise Underflow(self)
+        msg = klass()
+        msg._decode(self.decoder(offset, header_size + length, views))
+        return msg
+
+
+# lazy construction of generated classes (tinyber_gen --lazy).
+#  a lazy module defines a maker function per type instead of the class
+#  itself, and hands them to lazy_module(), which swaps the module in
+#  sys.modules for a LazyModule: each class is built the first time it
+#  is looked up, along with the classes its methods refer to.  (a plain
+#  module __getattr__ would only do on python 3.7+.)
+
+class LazyModule(types.ModuleType):
+
+    def __init__(self, module, makers):
+        types.ModuleType.__init__(self, module.__name__, module.__doc__)
+        self.__dict__.update(module.__dict__)
+        # keep the real module alive: python 2 clears the globals of a
+        #  dead module, and the generated methods still use them.
+        self._module = module
+        self._makers = makers
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name not in self._makers:
+            raise AttributeError(name)
+        return self._build(name)
+
+    def __dir__(self):
+        return sorted(set(self.__dict__) | set(self._makers))
+
+    def _build(self, name):
+        namespace = self._module.__dict__
+        if name not in namespace:
+            make, uses = self._makers[name]
+            for other in uses:
+                self._build(other)
+            klass = make()
+            klass.__qualname__ = name
+            namespace[name] = klass
+            self.__dict__[name] = klass
+        return namespace[name]
+
+    def build_all(self):
+        for name in self._makers:
+            self._build(name)
+
+
+# <makers> maps each type name to (maker, [names of the types it uses]).
+def lazy_module(name, makers):
+    module = LazyModule(sys.modules[name], makers)
+    sys.modules[name] = module
+    return module
+
+
+# generated decoders check tag and length bytes inline when running over
+#  the pure-python Decoder.  the cython module sets this to False.
+FUSED_DECODE = True
+
 # try to pull in cython version if available.
 try:
     from tinyber._codec import *
@@ -0,0 +1,408 @@
+# -*- Mode: Python -*-
+
+# generate a cython module: one cdef class per type, with typed fields and
+#  _decode/_encode methods that call straight into tinyber._codec.
+
+from tinyber import nodes
+from tinyber.c_nodes import int_max_size_type
+from tinyber.writer import Writer, OutputFile
+import os
+import sys
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+def psafe (s):
+    return s.replace ('-', '_')
+
+class FunctionWriter (Writer):
+
+    # cython wants all cdef declarations at the top of a function, so the
+    #  body is written here first while the typed locals are collected.
+
+    def __init__ (self, indent_level):
+        Writer.__init__ (self, StringIO(), indent_size=4)
+        self.indent_level = indent_level
+        self.decls = []
+
+    def local (self, ctype, prefix):
+        name = '%s%d' % (prefix, len (self.decls))
+        self.decls.append ((ctype, name))
+        return name
+
+class c_base_type (nodes.c_base_type):
+
+    def field_type (self):
+        type_name, min_size, max_size = self.attrs
+        if type_name == 'INTEGER':
+            if min_size is None or max_size is None:
+                return 'object'
+            try:
+                ctype = int_max_size_type (min_size, max_size)
+            except NotImplementedError:
+                return 'object'
+            if ctype == 'uint64_t':
+                # does not fit in the int64_t the codec works with.
+                return 'object'
+            return ctype
+        elif type_name == 'BOOLEAN':
+            return 'bint'
+        elif type_name == 'OCTET STRING':
+            # bytes, or a memoryview when decoded with views=True.
+            return 'object'
+        else:
+            raise NotImplementedError (type_name)
+
+    def emit_decode (self, out, lval, src):
+        type_name, min_size, max_size = self.attrs
+        if type_name == 'INTEGER':
+            if self.field_type() == 'object':
+                out.writelines ('%s = %s.next_INTEGER (%s, %s)' % (lval, src, min_size, max_size))
+            else:
+                out.writelines ('%s = %s.next_int (%s, %s)' % (lval, src, min_size, max_size))
+        elif type_name == 'OCTET STRING':
+            out.writelines ('%s = %s.next_OCTET_STRING (%s, %s)' % (lval, src, min_size, max_size))
+        elif type_name == 'BOOLEAN':
+            out.writelines ('%s = %s.next_BOOLEAN ()' % (lval, src))
+        else:
+            raise NotImplementedError (type_name)
+
+    def emit_encode (self, out, dst, val):
+        type_name, min_size, max_size = self.attrs
+        if type_name == 'INTEGER':
+            if self.field_type() == 'object':
+                out.writelines ('%s.emit_INTEGER (%s)' % (dst, val))
+            else:
+                out.writelines ('%s.emit_int (%s, TAGS_INTEGER)' % (dst, val))
+        elif type_name == 'OCTET STRING':
+            out.writelines ('%s.emit_OCTET_STRING (%s)' % (dst, val))
+        elif type_name == 'BOOLEAN':
+            out.writelines ('%s.emit_BOOLEAN (%s)' % (dst, val))
+        else:
+            raise NotImplementedError (type_name)
+
+class c_sequence (nodes.c_sequence):
+
+    def fields (self):
+        name, slots = self.attrs
+        return [(psafe (slots[i]), self.subs[i].field_type()) for i in range (len (slots))]
+
+    def emit_decode (self, out, lval, src):
+        name, slots = self.attrs
+        types = self.subs
+        src0 = out.local ('Decoder', 'src')
+        out.writelines ('%s = %s.next (TAGS_SEQUENCE, FLAGS_STRUCTURED)' % (src0, src))
+        for i in range (len (slots)):
+            types[i].emit_decode (out, '%s.%s' % (lval, psafe (slots[i])), src0)
+        out.writelines ('%s.assert_done ()' % (src0,))
+
+    def emit_encode (self, out, dst, val):
+        name, slots = self.attrs
+        types = self.subs
+        mark = out.local ('unsigned int', 'mark')
+        out.writelines ('%s = %s.pos' % (mark, dst))
+        for i in reversed (range (len (slots))):
+            types[i].emit_encode (out, dst, '%s.%s' % (val, psafe (slots[i])))
+        out.writelines ('%s.emit_TLV (%s, TAGS_SEQUENCE, FLAGS_STRUCTURED)' % (dst, mark))
+
+class c_sequence_of (nodes.c_sequence_of):
+
+    TAG_NAME = 'TAGS_SEQUENCE'
+    container = 'list'
+    add = 'append'
+
+    def field_type (self):
+        return self.container
+
+    def emit_decode (self, out, lval, src):
+        min_size, max_size, = self.attrs
+        [seq_type] = self.subs
+        src0 = out.local ('Decoder', 'src')
+        a = out.local (self.container, 'a')
+        v = out.local (seq_type.field_type(), 'v')
+        out.writelines (
+            '%s = %s.next (%s, FLAGS_STRUCTURED)' % (src0, src, self.TAG_NAME),
+            '%s = %s()' % (a, self.container),
+            'while not %s.done ():' % (src0,),
+        )
+        with out.indent():
+            seq_type.emit_decode (out, v, src0)
+            out.writelines ('%s.%s (%s)' % (a, self.add, v))
+        if min_size:
+            out.writelines (
+                'if len (%s) < %d:' % (a, min_size),
+                '    raise ConstraintViolation (%s, %d)' % (a, min_size),
+            )
+        if max_size is not None:
+            out.writelines (
+                'if len (%s) > %d:' % (a, max_size),
+                '    raise ConstraintViolation (%s, %d)' % (a, max_size),
+            )
+        out.writelines ('%s = %s' % (lval, a))
+
+    def emit_encode (self, out, dst, val):
+        [seq_type] = self.subs
+        mark = out.local ('unsigned int', 'mark')
+        v = out.local (seq_type.field_type(), 'v')
+        out.writelines (
+            '%s = %s.pos' % (mark, dst),
+            'for %s in %s:' % (v, self.reverse (val)),
+        )
+        with out.indent():
+            seq_type.emit_encode (out, dst, v)
+        out.writelines ('%s.emit_TLV (%s, %s, FLAGS_STRUCTURED)' % (dst, mark, self.TAG_NAME))
+
+    def reverse (self, val):
+        # the encoder works backward.
+        return 'reversed (%s)' % (val,)
+
+class c_set_of (c_sequence_of):
+
+    TAG_NAME = 'TAGS_SET'
+    container = 'set'
+    add = 'add'
+
+    def reverse (self, val):
+        return val
+
+class c_choice (nodes.c_choice):
+
+    def field_type (self):
+        return 'object'
+
+    def emit_decode (self, out, lval, src):
+        name, slots, tags = self.attrs
+        types = self.subs
+        tag = out.local ('uint32_t', 'tag')
+        src0 = out.local ('Decoder', 'src')
+        out.writelines ('%s, %s = %s.next_APPLICATION ()' % (tag, src0, src))
+        for i in range (len (slots)):
+            out.writelines ('%s %s == %s:' % ('if' if i == 0 else 'elif', tag, tags[i]))
+            with out.indent():
+                v = out.local (types[i].field_type(), 'v')
+                types[i].emit_decode (out, v, src0)
+                out.writelines ('%s = %s' % (lval, v))
+        out.writelines (
+            'else:',
+            '    raise BadChoice (%s)' % (tag,),
+        )
+
+    def emit_encode (self, out, dst, val):
+        name, slots, tags = self.attrs
+        types = self.subs
+        mark = out.local ('unsigned int', 'mark')
+        tag = out.local ('uint32_t', 'tag')
+        out.writelines ('%s = %s.pos' % (mark, dst))
+        for i in range (len (slots)):
+            type_name = types[i].name()
+            out.writelines ('%s isinstance (%s, %s):' % ('if' if i == 0 else 'elif', val, type_name))
+            with out.indent():
+                out.writelines (
+                    '(<%s> %s)._encode (%s)' % (type_name, val, dst),
+                    '%s = %s' % (tag, tags[i]),
+                )
+        out.writelines (
+            'else:',
+            '    raise BadChoice (%s)' % (val,),
+            '%s.emit_TLV (%s, %s, FLAGS_APPLICATION | FLAGS_STRUCTURED)' % (dst, mark, tag),
+        )
+
+class c_enumerated (nodes.c_enumerated):
+
+    def field_type (self):
+        return 'object'
+
+    def values (self):
+        # like C, an alternative without a value follows the one before it.
+        defname, alts, = self.attrs
+        r = []
+        n = 0
+        for name, val in alts:
+            if val is not None:
+                n = int (val)
+            r.append ((name, n))
+            n += 1
+        return r
+
+    def emit_decode (self, out, lval, src):
+        n = out.local ('int64_t', 'n')
+        out.writelines ('%s = %s.next_ENUMERATED ()' % (n, src))
+        for i, (name, val) in enumerate (self.values()):
+            out.writelines (
+                '%s %s == %d:' % ('if' if i == 0 else 'elif', n, val),
+                "    %s = '%s'" % (lval, name),
+            )
+        out.writelines (
+            'else:',
+            '    raise ConstraintViolation (%s)' % (n,),
+        )
+
+    def emit_encode (self, out, dst, val):
+        n = out.local ('int64_t', 'n')
+        for i, (name, v) in enumerate (self.values()):
+            out.writelines (
+                "%s %s == '%s':" % ('if' if i == 0 else 'elif', val, name),
+                '    %s = %d' % (n, v),
+            )
+        out.writelines (
+            'else:',
+            '    raise ValueError (%s)' % (val,),
+            '%s.emit_int (%s, TAGS_ENUMERATED)' % (dst, n),
+        )
+
+class c_defined (nodes.c_defined):
+
+    def field_type (self):
+        return self.name()
+
+    def emit_decode (self, out, lval, src):
+        type_name, max_size = self.attrs
+        # __new__ skips the keyword __init__, the fields are all set here.
+        out.writelines (
+            '%s = %s.__new__ (%s)' % (lval, type_name, type_name),
+            '%s._decode (%s)' % (lval, src),
+        )
+
+    def emit_encode (self, out, dst, val):
+        type_name, max_size = self.attrs
+        # a typed None would crash the direct call below.
+        out.writelines (
+            'if %s is None:' % (val,),
+            "    raise TypeError ('%s: %s is None')" % (type_name, val),
+            '%s._encode (%s)' % (val, dst),
+        )
+
+class CythonBackend:
+
+    def __init__ (self, args, walker, module_name, path):
+        self.args = args
+        self.walker = walker
+        self.module_name = module_name
+        self.path = path
+        self.base_path = os.path.join(path, module_name)
+
+    def emit_function (self, sig, emit):
+        # write a method whose body is produced by <emit>, cdef-ing its locals.
+        body = FunctionWriter (self.out.indent_level + 1)
+        emit (body)
+        self.out.newline()
+        self.out.writelines (sig)
+        with self.out.indent():
+            for ctype, name in body.decls:
+                self.out.writelines ('cdef %s %s' % (ctype, name))
+            self.out.write (body.stream.getvalue())
+
+    def gen_decoder (self, type_name, type_decl, node, lval):
+        self.emit_function (
+            'cpdef _decode (self, Decoder src):',
+            lambda out: node.emit_decode (out, lval, 'src')
+        )
+
+    def gen_encoder (self, type_name, type_decl, node, lval):
+        self.emit_function (
+            'cpdef _encode (self, Encoder dst):',
+            lambda out: node.emit_encode (out, 'dst', lval)
+        )
+
+    def gen_class (self, type_name, type_decl, node):
+        out = self.out
+        if isinstance (node, c_sequence):
+            fields = node.fields()
+            lval = 'self'
+        else:
+            fields = [('value', node.field_type())]
+            lval = 'self.value'
+        out.newline()
+        out.newline()
+        out.writelines ('cdef class %s (ASN1):' % (type_name,))
+        with out.indent():
+            for name, ctype in fields:
+                out.writelines ('cdef public %s %s' % (ctype, name))
+            out.newline()
+            out.writelines ('max_size = %d' % (node.max_size(),))
+            out.newline()
+            if isinstance (node, c_sequence):
+                out.writelines ('def __init__ (self, **args):')
+                with out.indent():
+                    out.writelines (
+                        'for k, v in args.items():',
+                        '    setattr (self, k, v)',
+                    )
+                out.newline()
+                out.writelines ('def __repr__ (self):')
+                with out.indent():
+                    out.writelines ("return '<%s %s>' %% (%s)" % (
+                        type_name,
+                        ' '.join ('%s=%%r' % (name,) for name, ctype in fields),
+                        ''.join ('self.%s, ' % (name,) for name, ctype in fields),
+                    ))
+            else:
+                out.writelines ('def __init__ (self, value=None):')
+                with out.indent():
+                    out.writelines ('self.value = value')
+                out.newline()
+                out.writelines ('def __repr__ (self):')
+                with out.indent():
+                    if isinstance (node, c_enumerated):
+                        out.writelines ("return '<%s %%s>' %% (self.value,)" % (type_name,))
+                    else:
+                        out.writelines ("return '<%s %%r>' %% (self.value,)" % (type_name,))
+            self.gen_decoder (type_name, type_decl, node, lval)
+            self.gen_encoder (type_name, type_decl, node, lval)
+
+    def gen_header (self):
+        command = os.path.basename(sys.argv[0])
+        self.out.writelines (
+            '# -*- Mode: Cython -*-',
+            '# generated by: %s %s' % (command, " ".join(sys.argv[1:])),
+            '# *** do not edit ***',
+            '',
+            'from libc.stdint cimport int8_t, int16_t, int32_t, int64_t, uint8_t, uint16_t, uint32_t',
+            'from tinyber._codec cimport *',
+            'from tinyber._codec import (',
+            '    DecodingError, IndefiniteLength, ElementTooLarge, Underflow, UnexpectedType,',
+            '    UnexpectedFlags, ConstraintViolation, BadChoice, ExtraData',
+            ')',
+            '',
+            'cdef class ASN1:',
+        )
+        # the base of all generated types.  _decode/_encode are cpdef so that
+        #  the python-level helpers (decode_many, StreamDecoder...) work too.
+        with self.out.indent():
+            for sig, body in (
+                ('cpdef _decode (self, Decoder src):', ['raise NotImplementedError']),
+                ('cpdef _encode (self, Encoder dst):', ['raise NotImplementedError']),
+                ('def decode (self, data, views=False):', ['self._decode (Decoder (data, views=views))']),
+                ('def encode (self):', [
+                    'cdef Encoder dst = pooled_encoder (self.max_size)',
+                    'try:',
+                    '    self._encode (dst)',
+                    '    return dst.done()',
+                    'finally:',
+                    '    release_encoder (dst)',
+                ]),
+                ('def encode_into (self, buffer, offset=0):', [
+                    'cdef Encoder dst = pooled_encoder (self.max_size)',
+                    'try:',
+                    '    self._encode (dst)',
+                    '    return dst.done_into (buffer, offset)',
+                    'finally:',
+                    '    release_encoder (dst)',
+                ]),
+            ):
+                self.out.newline()
+                self.out.writelines (sig)
+                with self.out.indent():
+                    self.out.writelines (*body)
+
+    def generate_code (self):
+        if self.walker.imports:
+            raise NotImplementedError ('cython output: references to other modules (%s)' % (', '.join (sorted (self.walker.imports)),))
+        self.out = Writer (OutputFile (self.base_path + '_ber.pyx'), indent_size=4)
+        self.gen_header()
+        self.tag_assignments = self.walker.tag_assignments
+        for (type_name, node, type_decl) in self.walker.defined_types:
+            self.gen_class (type_name, type_decl, node)
+        self.out.close()
@@ -5,6 +5,12 @@
 #include <stdint.h>
 #include "tinyber.h"
 
+// the one external copy of the inline defs, needed when compiled with
+//  inlining disabled.  (here rather than in each generated module, so that
+//  several modules can be linked together).
+extern void init_obuf (buf_t * self, uint8_t * buffer, unsigned int size);
+extern void init_ibuf (buf_t * self, uint8_t * buffer, unsigned int size);
+
 // --------------------------------------------------------------------------------
 //  buffer interface
 // --------------------------------------------------------------------------------
@@ -41,11 +47,12 @@ emit_byte (buf_t * self, uint8_t b)
 }
 
 // ensure there are at least <n> bytes of input available.
+// [written so that a huge <n> cannot wrap around]
 static
 int
 ensure_input (const buf_t * self, unsigned int n)
 {
-  if ((self->pos + n) <= self->size) {
+  if (n <= (self->size - self->pos)) {
     return 0;
   } else {
     return -1;
@@ -64,6 +71,44 @@ ensure_output (const buf_t * self, unsigned int n)
   }
 }
 
+// the number of significant bits in <n> (0 for 0).
+static inline
+int
+bit_length (uint64_t n)
+{
+#if defined(__GNUC__)
+  return n ? 64 - __builtin_clzll (n) : 0;
+#else
+  int r = 0;
+  while (n) {
+    n >>= 1;
+    r += 1;
+  }
+  return r;
+#endif
+}
+
+// --------------------------------------------------------------------------------
+//  statistics
+// --------------------------------------------------------------------------------
+
+#ifdef TYB_STATS
+
+static tyb_runtime_stats_t runtime_stats;
+
+void
+tyb_runtime_stats (tyb_runtime_stats_t * dst, int reset)
+{
+  if (dst) {
+    *dst = runtime_stats;
+  }
+  if (reset) {
+    memset (&runtime_stats, 0, sizeof(runtime_stats));
+  }
+}
+
+#endif // TYB_STATS
+
 // --------------------------------------------------------------------------------
 //  encoder
 // --------------------------------------------------------------------------------
@@ -76,15 +121,20 @@ length_of_length (asn1int_t n)
   if (n < 0x80) {
     return 1;
   } else {
-    int r = 1;
-    while (n) {
-      n >>= 8;
-      r += 1;
-    }
-    return r;
+    return 1 + (bit_length (n) + 7) / 8;
   }
 }
 
+// how many bytes encode_integer() emits for <n>: two's complement with
+//  the minimum number of bytes, i.e. room for the bits of <n> plus a sign bit.
+static
+int
+length_of_integer (asn1int_t n)
+{
+  uint64_t u = (n < 0) ? ~n : n;
+  return bit_length (u) / 8 + 1;
+}
+
 // encode length into a byte buffer.
 static
 void
@@ -109,33 +159,17 @@ static
 int
 encode_integer (buf_t * o, asn1int_t n)
 {
-  asn1int_t n0 = n;
-  asn1int_t i = 0;
-  uint8_t byte = 0x80; // for n==0
-  uint8_t result[16]; // plenty of room up to uint128_t
-  while (1) {
+  int i;
+  int length = length_of_integer (n);
+  uint8_t * p;
+  TYB_CHECK (ensure_output (o, length));
+  o->pos -= length;
+  p = o->buffer + o->pos;
+  // big-endian, the low byte last.
+  for (i = length - 1; i >= 0; i--) {
+    p[i] = n & 0xff;
     n >>= 8;
-    if (n0 == n) {
-      if ((n == -1) && (!(byte & 0x80) || (i == 0))) {
-	// negative, but high bit clear
-	result[15-i] = 0xff;
-	i += 1;
-      } else if ((n == 0) && (byte & 0x80)) {
-	// positive, but high bit set
-	result[15-i] = 0x00;
-	i += 1;
-      }
-      break;
-    } else {
-      byte = n0 & 0xff;
-      result[15-i] = byte;
-      i += 1;
-      n0 = n;
-    }
   }
-  // for machine-sized ints, lol is one byte, tag is one byte.
-  // Note: emit() works in reverse.
-  TYB_CHECK (emit (o, result + (16 - i), i));  // V
   return 0;
 }
 
@@ -163,7 +197,7 @@ int
 encode_INTEGER (buf_t * o, const asn1int_t * n)
 {
   unsigned int mark = o->pos;
-  encode_integer (o, *n);
+  TYB_CHECK (encode_integer (o, *n));
   TYB_CHECK (encode_TLV (o, mark, TAG_INTEGER, FLAG_UNIVERSAL));
   return 0;
 }
@@ -172,7 +206,7 @@ int
 encode_ENUMERATED (buf_t * o, const asn1int_t * n)
 {
   unsigned int mark = o->pos;
-  encode_integer (o, *n);
+  TYB_CHECK (encode_integer (o, *n));
   TYB_CHECK (encode_TLV (o, mark, TAG_ENUMERATED, FLAG_UNIVERSAL));
   return 0;
 }
@@ -198,35 +232,166 @@ encode_NULL (buf_t * o)
   return 0;
 }
 
+// OCTET STRING and UTF8String: the same encoding under a different tag.
+static
 int
-encode_OCTET_STRING (buf_t * o, const uint8_t * src, int src_len)
+encode_string (buf_t * o, uint32_t tag, const uint8_t * src, int src_len)
 {
   int mark = o->pos;
+#ifdef TYB_IOVEC
+  if (o->nrefs < o->max_refs && (unsigned int) src_len >= o->min_ref) {
+    // leave a hole for the payload, obuf_iovec() fills it in.
+    tyb_ref_t * ref = &o->refs[o->nrefs];
+    TYB_CHECK (ensure_output (o, src_len));
+    o->nrefs++;
+    o->pos -= src_len;
+    ref->pos = o->pos;
+    ref->base = src;
+    ref->len = src_len;
+    TYB_CHECK (encode_TLV (o, mark, tag, FLAG_UNIVERSAL));
+    return 0;
+  }
+#endif
   TYB_CHECK (emit (o, src, src_len));
-  TYB_CHECK (encode_TLV (o, mark, TAG_OCTETSTRING, FLAG_UNIVERSAL));
+  TYB_CHECK (encode_TLV (o, mark, tag, FLAG_UNIVERSAL));
   return 0;
 }
 
+int
+encode_OCTET_STRING (buf_t * o, const uint8_t * src, int src_len)
+{
+  return encode_string (o, TAG_OCTETSTRING, src, src_len);
+}
+
+int
+encode_UTF8String (buf_t * o, const uint8_t * src, int src_len)
+{
+  return encode_string (o, TAG_UTF8STRING, src, src_len);
+}
+
 // assuming the encoded value has already been emitted (starting at position <mark>),
 //  emit the length and tag for that value.
 int
 encode_TLV (buf_t * o, unsigned int mark, uint32_t tag, uint8_t flags)
 {
   int length = mark - o->pos;
-  uint8_t encoded_length[6];
   uint8_t lol;
+  TYB_STATS_ENTER (&runtime_stats.encode_TLV, o);
+  if (tag < 0x1f && length < 0x80) {
+    // the common case: one-byte tag, one-byte length.
+    TYB_CHECK_AS (ensure_output (o, 2), TYB_FAIL_UNDERFLOW);
+    o->pos -= 2;
+    o->buffer[o->pos] = tag | flags;
+    o->buffer[o->pos + 1] = length;
+    TYB_STATS_LEAVE (o);
+    return 0;
+  }
   // compute length of length
   lol = length_of_length (length);
+  if (tag < 0x1f) {
+    // one-byte tag: the whole header in one step.
+    TYB_CHECK_AS (ensure_output (o, 1 + lol), TYB_FAIL_UNDERFLOW);
+    o->pos -= 1 + lol;
+    o->buffer[o->pos] = tag | flags;
+    encode_length (length, lol, o->buffer + o->pos + 1);
+    TYB_STATS_LEAVE (o);
+    return 0;
+  }
   // ensure room for length
-  TYB_CHECK (ensure_output (o, lol));
+  TYB_CHECK_AS (ensure_output (o, lol), TYB_FAIL_UNDERFLOW);
   // encode & emit the length
-  encode_length (length, lol, encoded_length);
-  TYB_CHECK (emit (o, encoded_length, lol));
+  o->pos -= lol;
+  encode_length (length, lol, o->buffer + o->pos);
   // emit tag|flags
-  TYB_CHECK (encode_tag (o, tag, flags));
+  TYB_CHECK_AS (encode_tag (o, tag, flags), TYB_FAIL_UNDERFLOW);
+  TYB_STATS_LEAVE (o);
   return 0;
 }
 
+#ifdef TYB_IOVEC
+
+void
+init_obuf_refs (buf_t * self, uint8_t * buffer, unsigned int size,
+                tyb_ref_t * refs, unsigned int max_refs, unsigned int min_ref)
+{
+  self->buffer = buffer;
+  self->pos = size;
+  self->size = size;
+  self->refs = refs;
+  self->nrefs = 0;
+  self->max_refs = max_refs;
+  self->min_ref = min_ref;
+}
+
+// fill <iov> (of <n> entries) with the encoding in <self>: the pieces of the
+//  buffer between the holes, and the referenced payloads.  returns the number
+//  of entries used, or -1 if <n> is too small.
+int
+obuf_iovec (const buf_t * self, struct iovec * iov, int n)
+{
+  unsigned int pos = self->pos;
+  int r = 0;
+  int i;
+  // the encoder works backward, so the last ref is the first in the output.
+  for (i = self->nrefs - 1; i >= 0; i--) {
+    const tyb_ref_t * ref = &self->refs[i];
+    if (ref->pos > pos) {
+      TYB_FAILIF (r >= n);
+      iov[r].iov_base = self->buffer + pos;
+      iov[r].iov_len = ref->pos - pos;
+      r++;
+    }
+    TYB_FAILIF (r >= n);
+    iov[r].iov_base = (void *) ref->base;
+    iov[r].iov_len = ref->len;
+    r++;
+    pos = ref->pos + ref->len;
+  }
+  if (pos < self->size) {
+    TYB_FAILIF (r >= n);
+    iov[r].iov_base = self->buffer + pos;
+    iov[r].iov_len = self->size - pos;
+    r++;
+  }
+  return r;
+}
+
+#endif // TYB_IOVEC
+
+// --------------------------------------------------------------------------------
+//  sizes
+// --------------------------------------------------------------------------------
+
+// the exact encoded size of things, by the same rules as the encoder
+//  [and as length_of_integer() etc in ber.py].
+
+// how many bytes to represent tag <n> (the 'T' in TLV).
+static
+int
+length_of_tag (uint32_t tag)
+{
+  if (tag < 0x1f) {
+    return 1;
+  } else {
+    // the 0x1f byte, then base128.
+    return 1 + (bit_length (tag) + 6) / 7;
+  }
+}
+
+// the size of a TLV with <length> bytes of content.
+int
+size_TLV (uint32_t tag, unsigned int length)
+{
+  return length_of_tag (tag) + length_of_length (length) + length;
+}
+
+// the size of an encoded INTEGER (or ENUMERATED).
+int
+size_INTEGER (asn1int_t n)
+{
+  return size_TLV (TAG_INTEGER, length_of_integer (n));
+}
+
 // --------------------------------------------------------------------------------
 //  decoder
 // --------------------------------------------------------------------------------
@@ -301,14 +466,31 @@ decode_TLV (asn1raw_t * dst, buf_t * src)
   uint32_t tag;
   uint8_t flags;
   uint32_t length;
-  TYB_CHECK (decode_tag (src, &tag, &flags));
-  TYB_CHECK (decode_length (src, &length));
-  TYB_CHECK (ensure_input (src, length));
+  const uint8_t * p = src->buffer + src->pos;
+  TYB_STATS_ENTER (&runtime_stats.decode_TLV, src);
+  if ((src->size - src->pos) >= 2 && (p[0] & 0x1f) != 0x1f) {
+    // one-byte tag, with the first length byte checked along with it.
+    tag = p[0] & 0x1f;
+    flags = p[0] & 0xe0;
+    if (p[1] < 0x80) {
+      // ... and a one-byte length: the common case.
+      length = p[1];
+      src->pos += 2;
+    } else {
+      src->pos += 1;
+      TYB_CHECK_AS (decode_length (src, &length), TYB_FAIL_UNDERFLOW);
+    }
+  } else {
+    TYB_CHECK_AS (decode_tag (src, &tag, &flags), TYB_FAIL_UNDERFLOW);
+    TYB_CHECK_AS (decode_length (src, &length), TYB_FAIL_UNDERFLOW);
+  }
+  TYB_CHECK_AS (ensure_input (src, length), TYB_FAIL_UNDERFLOW);
   dst->type = tag;
   dst->flags = flags;
   dst->length = length;
   dst->value = src->buffer + src->pos;
   src->pos += length;
+  TYB_STATS_LEAVE (src);
   return 0;
 }
 
@@ -34,10 +34,28 @@ typedef struct {
   uint8_t * value;
 } asn1raw_t;
 
+#ifdef TYB_IOVEC
+#include <sys/uio.h>
+
+// an OCTET STRING payload that was not copied into the output buffer:
+//  <len> bytes at <pos> in the buffer stand for the bytes at <base>.
+typedef struct {
+  unsigned int pos;
+  const uint8_t * base;
+  unsigned int len;
+} tyb_ref_t;
+#endif
+
 typedef struct {
   uint8_t * buffer;
   unsigned int pos;
   unsigned int size;
+#ifdef TYB_IOVEC
+  tyb_ref_t * refs;
+  unsigned int nrefs;
+  unsigned int max_refs;
+  unsigned int min_ref;
+#endif
 } buf_t;
 
 // buffer interface
@@ -49,6 +67,10 @@ init_obuf (buf_t * self, uint8_t * buffer, unsigned int size)
   self->buffer = buffer;
   self->pos = size;
   self->size = size;
+#ifdef TYB_IOVEC
+  self->nrefs = 0;
+  self->max_refs = 0;
+#endif
 }
 
 inline
@@ -58,8 +80,25 @@ init_ibuf (buf_t * self, uint8_t * buffer, unsigned int size)
   self->buffer = buffer;
   self->pos = 0;
   self->size = size;
+#ifdef TYB_IOVEC
+  self->nrefs = 0;
+  self->max_refs = 0;
+#endif
 }
 
+#ifdef TYB_IOVEC
+// scatter-gather output: OCTET STRING payloads of at least <min_ref> bytes
+//  are recorded in <refs> (up to <max_refs> of them) rather than copied.
+//  this saves the copy, not the memory: each referenced payload leaves a
+//  hole of its own size in the buffer, so <size> must still cover the whole
+//  encoding (as for init_obuf(): X_MAX_SIZE or size_X()), headers and
+//  payloads alike.  the holes are never written.  obuf_iovec() then
+//  describes the encoding for writev()/sendmsg().
+void init_obuf_refs (buf_t * self, uint8_t * buffer, unsigned int size,
+                     tyb_ref_t * refs, unsigned int max_refs, unsigned int min_ref);
+int obuf_iovec (const buf_t * self, struct iovec * iov, int n);
+#endif
+
 // decoder
 int decode_BOOLEAN (asn1raw_t * src);
 asn1int_t decode_INTEGER (asn1raw_t * src);
@@ -71,12 +110,69 @@ int encode_TLV (buf_t * o, unsigned int mark, uint32_t tag, uint8_t flags);
 int encode_INTEGER (buf_t * o, const asn1int_t * n);
 int encode_BOOLEAN (buf_t * o, const asn1bool_t * value);
 int encode_OCTET_STRING (buf_t * o, const uint8_t * src, int src_len);
+int encode_UTF8String (buf_t * o, const uint8_t * src, int src_len);
 int encode_ENUMERATED (buf_t * o, const asn1int_t * n);
 int encode_NULL (buf_t * o);
 
+// sizes
+int size_TLV (uint32_t tag, unsigned int length);
+int size_INTEGER (asn1int_t n);
+
 //#include <stdio.h>
 //#define TYB_FAILIF(x) do { if (x) { fprintf (stderr, "*** line %d ***\\n", __LINE__); abort(); } } while(0)
 #define TYB_FAILIF(x) do { if (x) { return -1; } } while(0)
 #define TYB_CHECK(x) TYB_FAILIF(-1 == (x))
 
+// statistics.  with TYB_STATS defined, generated decode_X()/encode_X()
+//  functions (and decode_TLV()/encode_TLV()) count their calls, the bytes
+//  they consumed/produced and their failures, by reason.  without it, the
+//  macros below are the plain TYB_FAILIF()/TYB_CHECK() and nothing is kept.
+//  the counters are plain globals: not thread-safe.
+
+// failure reasons.
+#define TYB_FAIL_TAG        0 // unexpected tag (incl. unknown CHOICE tag)
+#define TYB_FAIL_CONSTRAINT 1 // a value/size/count outside its constraint
+#define TYB_FAIL_UNDERFLOW  2 // out of input (or a bad length), or output space
+#define TYB_FAIL_TRAILING   3 // data left over after the last slot
+#define TYB_FAIL_NESTED     4 // a nested type failed (counted there too)
+#define TYB_NFAIL           5
+
+#ifdef TYB_STATS
+
+typedef struct {
+  unsigned long calls;
+  unsigned long bytes;
+  unsigned long failures;
+  unsigned long fail[TYB_NFAIL];
+} tyb_counters_t;
+
+typedef struct {
+  tyb_counters_t decode_TLV;
+  tyb_counters_t encode_TLV;
+} tyb_runtime_stats_t;
+
+// copy the runtime counters into <dst> (if not NULL), then zero them if <reset>.
+void tyb_runtime_stats (tyb_runtime_stats_t * dst, int reset);
+
+// count a call, against <counters>, of a function working on <buf>.
+#define TYB_STATS_ENTER(counters, buf) \
+  tyb_counters_t * tyb_stats = (counters); \
+  unsigned int tyb_pos0 = (buf)->pos; \
+  tyb_stats->calls++
+// ... and its bytes, on success.
+#define TYB_STATS_LEAVE(buf) \
+  tyb_stats->bytes += ((buf)->pos > tyb_pos0) ? (buf)->pos - tyb_pos0 : tyb_pos0 - (buf)->pos
+#define TYB_FAIL(why) do { tyb_stats->failures++; tyb_stats->fail[why]++; return -1; } while(0)
+
+#else
+
+#define TYB_STATS_ENTER(counters, buf)
+#define TYB_STATS_LEAVE(buf) do { } while(0)
+#define TYB_FAIL(why) return -1
+
+#endif // TYB_STATS
+
+#define TYB_FAILIF_AS(x, why) do { if (x) { TYB_FAIL (why); } } while(0)
+#define TYB_CHECK_AS(x, why) TYB_FAILIF_AS(-1 == (x), why)
+
 #endif // _TINYBER_H_
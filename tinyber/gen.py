@@ -1,47 +1,212 @@
 #!/usr/bin/env python
 # -*- Mode: Python -*-
 
+import hashlib
+import multiprocessing
 import os
+import pickle
+import stat
+import sys
+import tempfile
 
+import asn1ate
 from asn1ate import parser
 from asn1ate.sema import build_semantic_model
+
+import tinyber
 from tinyber.walker import Walker
 
-def go (args):
-    with open (args.file) as f:
+def get_nodes (lang):
+    if lang == 'python':
+        from tinyber.py_nodes import PythonBackend as Backend
+        from tinyber import py_nodes as nodes
+    elif lang == 'c':
+        from tinyber.c_nodes import CBackend as Backend
+        from tinyber import c_nodes as nodes
+    elif lang == 'cython':
+        from tinyber.cy_nodes import CythonBackend as Backend
+        from tinyber import cy_nodes as nodes
+    elif lang == 'cbind':
+        from tinyber.cbind_nodes import CBindBackend as Backend
+        from tinyber import cbind_nodes as nodes
+    return Backend, nodes
+
+
+# os.replace() overwrites an existing file on windows too (python 3.3+).
+replace = getattr (os, 'replace', os.rename)
+
+def cache_dir_ok (cache_dir):
+    # unpickling runs whatever the file says, so only use a cache directory
+    #  that nobody else can write to: ours, and not group/world-writable.
+    #  (a missing one is created that way.)
+    try:
+        st = os.stat (cache_dir)
+    except OSError:
+        return not os.path.lexists (cache_dir)
+    if not stat.S_ISDIR (st.st_mode) or st.st_mode & 0o022:
+        return False
+    getuid = getattr (os, 'getuid', None)
+    return getuid is None or st.st_uid == getuid()
+
+def cache_key (asn1def):
+    # the semantic model depends on the spec, and on the versions of
+    #  everything that built (or will unpickle) it.
+    h = hashlib.sha1()
+    h.update (asn1def)
+    h.update (('|%s|%s|%d.%d' % ((tinyber.__version__, asn1ate.__version__) + tuple (sys.version_info[:2]))).encode ('ascii'))
+    return h.hexdigest()
+
+def load_file (filename, cache_dir=None):
+    # the modules in <filename>, from the semantic model cache if we can.
+    with open (filename, 'rb') as f:
         asn1def = f.read()
+    if cache_dir:
+        cache_path = os.path.join (cache_dir, cache_key (asn1def) + '.pickle')
+        # an entry is the sha1 of the pickle, then the pickle.  one that is
+        #  missing or damaged is rebuilt; unpickling a good one must work.
+        try:
+            with open (cache_path, 'rb') as f:
+                data = f.read()
+        except (IOError, OSError):
+            data = b''
+        if data[:20] == hashlib.sha1 (data[20:]).digest():
+            return pickle.loads (data[20:])
+    if not isinstance (asn1def, str):
+        asn1def = asn1def.decode ('utf-8')
+    modules = build_semantic_model (parser.parse_asn1 (asn1def))
+    if cache_dir:
+        # write and rename, so a parallel run never sees half an entry.
+        #  (a cache we can't write to just means parsing again next time.)
+        try:
+            if not os.path.isdir (cache_dir):
+                os.makedirs (cache_dir, 0o700)
+            fd, tmp_path = tempfile.mkstemp (dir=cache_dir)
+        except (IOError, OSError):
+            return modules
+        try:
+            data = pickle.dumps (modules, 2)
+            with os.fdopen (fd, 'wb') as f:
+                f.write (hashlib.sha1 (data).digest() + data)
+            replace (tmp_path, cache_path)
+        except (IOError, OSError):
+            os.unlink (tmp_path)
+        except BaseException:
+            os.unlink (tmp_path)
+            raise
+    return modules
+
+def load_file_args (args):
+    return load_file (*args)
+
+def get_pool (jobs):
+    # fork, so the workers see the walked modules without pickling them.
+    #  None where there is no fork (windows): run serially then.
+    try:
+        context = multiprocessing.get_context ('fork')
+    except AttributeError:
+        # python 2: always forks.
+        return multiprocessing.Pool (jobs)
+    except ValueError:
+        return None
+    return context.Pool (jobs)
+
+def pool_map (fun, items, jobs):
+    # [fun (x) for x in items], in <jobs> worker processes if we can.
+    pool = get_pool (jobs) if jobs > 1 else None
+    if pool is None:
+        return [fun (x) for x in items]
+    try:
+        return pool.map (fun, items)
+    finally:
+        pool.close()
+        pool.join()
+
+def module_order (modules):
+    # modules (name -> sema module) sorted so each comes after the ones it imports.
+    r = []
+    done = set()
+
+    def visit (name, stack):
+        if name in done:
+            return
+        if name in stack:
+            raise ValueError ('circular IMPORTS: %s' % (' -> '.join (stack + [name]),))
+        imports = modules[name].imports
+        if imports:
+            for module_ref in sorted (imports.imports, key=lambda x: x.module_ref.name):
+                if module_ref.module_ref.name in modules:
+                    visit (module_ref.module_ref.name, stack + [name])
+        done.add (name)
+        r.append (name)
+    for name in sorted (modules):
+        visit (name, [])
+    return r
+
+
+# the backends to run, filled in before the pool forks.
+_work = []
+
+def generate (i):
+    backend = _work[i]
+    backend.generate_code()
+    return backend.module_name
+
+def go (args):
+    files = args.file
+    cache_dir = getattr (args, 'cache_dir', None)
+    if cache_dir and not cache_dir_ok (cache_dir):
+        sys.stderr.write ('tinyber_gen: not using cache %s: not a directory of ours that only we can write to\n' % (cache_dir,))
+        cache_dir = None
+    jobs = max (1, min (args.jobs, len (files)))
+    file_modules = pool_map (load_file_args, [(filename, cache_dir) for filename in files], jobs)
+
+    # module name -> sema module, and module name -> output name.  a file with
+    #  one module is named after the file, as always; otherwise after each module.
+    modules = {}
+    names = {}
+    for filename, these in zip (files, file_modules):
+        base, ext = os.path.splitext (filename)
+        for module in these:
+            if module.name in modules:
+                raise ValueError ('module %s defined twice' % (module.name,))
+            modules[module.name] = module
+            if len (these) == 1:
+                names[module.name] = os.path.split (base)[-1]
+            else:
+                names[module.name] = module.name.replace ('-', '_')
+    args.module_names = names
 
-    parse_tree = parser.parse_asn1(asn1def)
-    modules = build_semantic_model(parse_tree)
-    assert (len(modules) == 1)
-    base, ext = os.path.splitext (args.file)
-    parts = os.path.split (base)
-    module_name = parts[-1]
     if args.outdir:
         path = args.outdir
     else:
         path = "."
 
-    if args.lang == 'python':
-        from tinyber.py_nodes import PythonBackend as Backend
-        from tinyber import py_nodes as nodes
-    elif args.lang == 'c':
-        from tinyber.c_nodes import CBackend as Backend
-        from tinyber import c_nodes as nodes
+    Backend, nodes = get_nodes (args.lang)
 
-    # pull in the python-specific node implementations
-    walker = Walker (modules[0], nodes)
-    walker.walk()
+    # walk in dependency order, each module seeing the walkers of the ones before it.
+    walkers = {}
+    del _work[:]
+    for module_name in module_order (modules):
+        walker = Walker (modules[module_name], nodes, walkers.copy())
+        walker.walk()
+        walkers[module_name] = walker
+        _work.append (Backend (args, walker, names[module_name], path))
 
-    backend = Backend (args, walker, module_name, path)
-    backend.generate_code()
+    jobs = max (1, min (args.jobs, len (_work)))
+    pool_map (generate, range (len (_work)), jobs)
 
 def main():
     import argparse
     p = argparse.ArgumentParser (description='tinyber ASN.1 BER/DER code generator.')
     p.add_argument ('-o', '--outdir', help="output directory (defaults to location of input file)", default='')
-    p.add_argument ('-l', '--lang', help="output language ('c' or 'python')", default='c')
+    p.add_argument ('-l', '--lang', help="output language ('c', 'python', 'cython' or 'cbind')", default='c')
     p.add_argument ('-ns', '--no-standalone', action='store_true', help="[python only] do not insert codec.py into output file.")
-    p.add_argument ('file', help="asn.1 spec", metavar="FILE")
+    p.add_argument ('--octet-pointers', action='store_true', help="[c/cbind only] decoded OCTET STRINGs point into the input instead of being copied.")
+    p.add_argument ('--soa', action='store_true', help="[c/cbind only] store a SEQUENCE OF records as one array per field (struct-of-arrays).")
+    p.add_argument ('--lazy', action='store_true', help="[python only] build each class on first use rather than at import.")
+    p.add_argument ('--compact', action='store_true', help="[python only] slot every class (no __dict__), decode SEQUENCE OF into array.array (INTEGER) or tuple, and share one (read-only) object per ENUMERATED value.")
+    p.add_argument ('-j', '--jobs', type=int, default=multiprocessing.cpu_count(), help="parse and generate this many files/modules at once (defaults to the number of CPUs).")
+    p.add_argument ('--cache-dir', help="keep parsed specs in this directory (created if needed; must not be writable by anyone else), to skip parsing unchanged specs next time.")
+    p.add_argument ('file', nargs='+', help="asn.1 spec(s); a module may IMPORT from any of the others", metavar="FILE")
     args = p.parse_args()
     go (args)
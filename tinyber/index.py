@@ -0,0 +1,206 @@
+# -*- Mode: Python -*-
+
+# a persistent index of a file of back-to-back BER records (see RecordFile
+#  in codec.py): the offset, size and outer tag of every record, built in
+#  one pass over the file and saved next to it (<file>.tyx by default), so
+#  that finding the Nth record, or every record of one CHOICE alternative,
+#  no longer means scanning the whole file.
+#
+#    index = get_index ('log.ber')       # load it, or build and save it
+#    index.counts()                      # {tag: number of records}
+#    with m.RecordFile ('log.ber') as f:
+#        for i in index.where (1):
+#            msg = f.decode_at (m.ThingMsg, index.offsets[i])
+#
+# the index records the size and mtime of the data file it was built
+#  from, and is only loaded if they still match.
+#
+# file format (little-endian):
+#   header:  8-byte magic, data file size, data file mtime (us), count
+#   then one column after another: offsets (u64), sizes (u64),
+#   tags (u32), flags (u8: class and constructed bits of the tag).
+
+import array
+import binascii
+import os
+import struct
+import sys
+
+from tinyber.codec import RecordFile
+
+MAGIC = b'TYBIDX\x00\x01'
+HEADER = struct.Struct ('<8sQQQ')
+
+# os.replace() overwrites an existing file on windows too (python 3.3+).
+replace = getattr (os, 'replace', os.rename)
+
+class StaleIndex (Exception):
+    pass
+
+def typecode (itemsize):
+    # the array typecode for unsigned ints of <itemsize> bytes
+    #  (python 2 has no 'Q', but its 'L' is 8 bytes on most platforms).
+    for code in 'BHILQ':
+        try:
+            if array.array (code).itemsize == itemsize:
+                return code
+        except ValueError:
+            pass
+    raise ValueError ('no array type of %d bytes' % (itemsize,))
+
+
+# (name, bytes per entry) of each column, in file order.
+COLUMNS = [('offsets', 8), ('sizes', 8), ('tags', 4), ('flags', 1)]
+
+def file_stamp (path):
+    # size and mtime in microseconds, which python 2's float st_mtime
+    #  still holds exactly (so both pythons agree on it).
+    st = os.stat (path)
+    mtime_ns = getattr (st, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        return st.st_size, int (round (st.st_mtime * 1e6))
+    return st.st_size, mtime_ns // 1000
+
+def default_index_path (path):
+    return path + '.tyx'
+
+class RecordIndex:
+
+    def __init__ (self, size, mtime):
+        # size and mtime of the data file.
+        self.size = size
+        self.mtime = mtime
+        for name, itemsize in COLUMNS:
+            setattr (self, name, array.array (typecode (itemsize)))
+
+    def __len__ (self):
+        return len (self.offsets)
+
+    def __getitem__ (self, i):
+        return self.offsets[i], self.sizes[i], self.tags[i], self.flags[i]
+
+    def counts (self):
+        r = {}
+        for tag in self.tags:
+            r[tag] = r.get (tag, 0) + 1
+        return r
+
+    def where (self, tag):
+        # the numbers of the records with outer tag <tag>.
+        return [i for i, t in enumerate (self.tags) if t == tag]
+
+    def bisect (self, f, klass, key, value, lo=0, hi=None):
+        # the first record number in [lo, hi) whose key (msg) >= value, for
+        #  a file ordered by key (e.g. by a timestamp field): a range of
+        #  records is then found with two bisects and log2(n) decodes each.
+        if hi is None:
+            hi = len (self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key (f.decode_at (klass, self.offsets[mid])) < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def check (self, path):
+        if file_stamp (path) != (self.size, self.mtime):
+            raise StaleIndex ('%s has changed since it was indexed' % (path,))
+
+    def save (self, path):
+        # write a new file and rename it over <path>, so a reader never sees
+        #  half an index.  (created with os.open rather than mkstemp, whose
+        #  0600 is too strict for something kept next to the data; the
+        #  umask applies as usual.)
+        tmp_path = '%s.%s.tmp' % (path, binascii.hexlify (os.urandom (6)).decode ('ascii'))
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr (os, 'O_BINARY', 0)
+        fd = os.open (tmp_path, flags, 0o666)
+        try:
+            with os.fdopen (fd, 'wb') as f:
+                f.write (HEADER.pack (MAGIC, self.size, self.mtime, len (self)))
+                for name, itemsize in COLUMNS:
+                    column = getattr (self, name)
+                    if sys.byteorder == 'big':
+                        column = array.array (column.typecode, column)
+                        column.byteswap()
+                    column.tofile (f)
+            replace (tmp_path, path)
+        except BaseException:
+            os.unlink (tmp_path)
+            raise
+
+def build_index (path):
+    # one pass over the outer headers of the records in <path>.
+    size, mtime = file_stamp (path)
+    index = RecordIndex (size, mtime)
+    with RecordFile (path) as f:
+        if f.size != size:
+            raise StaleIndex ('%s changed while being indexed' % (path,))
+        for offset, tag, flags, header_size, length in f.headers():
+            index.offsets.append (offset)
+            index.sizes.append (header_size + length)
+            index.tags.append (tag)
+            index.flags.append (flags)
+    return index
+
+def load_index (path, index_path=None):
+    # the saved index of <path>, which must match the file as it is now.
+    if index_path is None:
+        index_path = default_index_path (path)
+    with open (index_path, 'rb') as f:
+        header = f.read (HEADER.size)
+        if len (header) != HEADER.size:
+            raise StaleIndex ('%s: truncated header' % (index_path,))
+        magic, size, mtime, count = HEADER.unpack (header)
+        if magic != MAGIC:
+            raise StaleIndex ('%s: not an index' % (index_path,))
+        index = RecordIndex (size, mtime)
+        index.check (path)
+        for name, itemsize in COLUMNS:
+            column = getattr (index, name)
+            try:
+                column.fromfile (f, count)
+            except EOFError:
+                raise StaleIndex ('%s: truncated' % (index_path,))
+            if sys.byteorder == 'big':
+                column.byteswap()
+    return index
+
+def get_index (path, index_path=None, rebuild=False):
+    # load the index of <path>, or (re)build and save it.
+    if index_path is None:
+        index_path = default_index_path (path)
+    if not rebuild:
+        try:
+            return load_index (path, index_path)
+        except (IOError, OSError, StaleIndex):
+            pass
+    index = build_index (path)
+    try:
+        index.save (index_path)
+    except (IOError, OSError):
+        # an index we can't write just means scanning again next time.
+        pass
+    return index
+
+def main():
+    import argparse
+    p = argparse.ArgumentParser (description='index files of back-to-back BER records.')
+    p.add_argument ('-r', '--rebuild', action='store_true', help="rebuild the index even if it is up to date.")
+    p.add_argument ('-c', '--counts', action='store_true', help="print the number of records with each outer tag.")
+    p.add_argument ('-s', '--show', type=int, action='append', default=[], metavar='N', help="print the offset, size and tag of record N (may be repeated).")
+    p.add_argument ('file', nargs='+', help="record file(s); each index is kept in FILE.tyx", metavar="FILE")
+    args = p.parse_args()
+    for path in args.file:
+        index = get_index (path, rebuild=args.rebuild)
+        print ('%s: %d records' % (path, len (index)))
+        if args.counts:
+            counts = index.counts()
+            for tag in sorted (counts):
+                print ('  tag %d: %d' % (tag, counts[tag]))
+        for i in args.show:
+            print ('  record %d: offset %d size %d tag %d flags 0x%02x' % ((i,) + index[i]))
+
+
+if __name__ == '__main__':
+    main()
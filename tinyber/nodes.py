@@ -1,6 +1,6 @@
 # -*- Mode: Python -*-
 
-from tinyber.ber import length_of_length, length_of_integer
+from tinyber.ber import length_of_length, length_of_integer, length_of_tag
 
 class c_node:
 
@@ -104,9 +104,11 @@ class c_choice (c_node):
         name, slots, tags = self.attrs
         types = self.subs
         r = 0
-        for slot_type in types:
-            r = max (r, slot_type.max_size())
-        return 1 + length_of_length (r) + r
+        for i in range (len (slots)):
+            # tags from 31 up take more than one byte.
+            size = types[i].max_size()
+            r = max (r, length_of_tag (int (tags[i])) + length_of_length (size) + size)
+        return r
 
 class c_enumerated (c_node):
 
@@ -1,13 +1,18 @@
 # -*- Mode: Python -*-
 
 from tinyber import nodes
-from tinyber.writer import Writer
+from tinyber.ber import length_of_integer
+from tinyber.writer import Writer, OutputFile
 import os
 import sys
 
 def psafe (s):
     return s.replace ('-', '_')
 
+def prefix (tag, length):
+    # a bytes literal for a one-byte tag followed by a short-form length.
+    return "b'\\x%02x\\x%02x'" % (tag, length)
+
 def emit_pairs(out, tag, pairs, reversed=False):
     out.writelines('%s = {' % tag)
     with out.indent():
@@ -20,10 +25,72 @@ def emit_pairs(out, tag, pairs, reversed=False):
 
 class c_base_type (nodes.c_base_type):
 
+    tag_byte = {
+        'BOOLEAN': 0x01,
+        'INTEGER': 0x02,
+        'OCTET STRING': 0x04,
+    }
+
     def emit (self, out):
         pass
 
-    def emit_decode (self, out):
+    def fast_lengths (self):
+        # the (min, max) content length of a valid value, when both are known
+        #  here and fit in a one-byte length.  None if there is no fast path.
+        type_name, min_size, max_size = self.attrs
+        if type_name == 'BOOLEAN':
+            return 1, 1
+        elif type_name == 'INTEGER' and min_size is not None and max_size is not None:
+            return 1, max (length_of_integer (min_size), length_of_integer (max_size))
+        elif type_name == 'OCTET STRING' and max_size is not None and max_size < 0x80:
+            return min_size or 0, max_size
+        else:
+            return None
+
+    def emit_decode (self, out, fused=False):
+        # with <fused> (the FUSED_DECODE variant), check the tag and length
+        #  in one comparison against the prefixes the constraints allow,
+        #  then pick the value straight out of the input.  anything else
+        #  (bad tag, long-form length, underflow) falls back to the generic
+        #  decoder, which also reports the error.
+        type_name, min_size, max_size = self.attrs
+        lengths = self.fast_lengths()
+        if not fused or lengths is None:
+            self.emit_generic_decode (out)
+            return
+        tag = self.tag_byte[type_name]
+        lo, hi = lengths
+        out.writelines (
+            'p = src.pos',
+            # bytes(): <src.data> may be a memoryview, whose slices don't
+            #  compare with bytes.  (python 2 turns a memoryview into its
+            #  repr, which matches no prefix and takes the generic path.)
+            'h = bytes(src.data[p:p + 2])',
+        )
+        if lo == hi:
+            out.writelines ('q = p + %d if h == %s else 0' % (2 + lo, prefix (tag, lo)))
+        else:
+            out.writelines ('q = p + 2 + ord(h[1:2]) if %s <= h <= %s else 0' % (prefix (tag, lo), prefix (tag, hi)))
+        out.writelines ('if p < q <= src.end:')
+        with out.indent():
+            if type_name == 'INTEGER':
+                out.writelines (
+                    'v = int_from_bytes(src.data[p + 2:q])',
+                    'if v < %d:' % (min_size,),
+                    '    raise ConstraintViolation(v, %d)' % (min_size,),
+                    'if v > %d:' % (max_size,),
+                    '    raise ConstraintViolation(v, %d)' % (max_size,),
+                )
+            elif type_name == 'OCTET STRING':
+                out.writelines ('v = (src.data if src.view is None else src.view)[p + 2:q]')
+            elif type_name == 'BOOLEAN':
+                out.writelines ("v = src.data[p + 2:q] != b'\\x00'")
+            out.writelines ('src.pos = q')
+        out.writelines ('else:')
+        with out.indent():
+            self.emit_generic_decode (out)
+
+    def emit_generic_decode (self, out):
         type_name, min_size, max_size = self.attrs
         if type_name == 'INTEGER':
             out.writelines ('v = src.next_INTEGER(%s, %s)' % (min_size, max_size),)
@@ -57,16 +124,19 @@ class c_sequence (nodes.c_sequence):
         with out.indent():
             for x in slots:
                 out.writelines("'%s'," % psafe(x))
+            if not getattr (self, 'slotted', False):
+                # the fields are slots, but instances still take any attribute.
+                out.writelines ("'__dict__',", "'__weakref__',")
         out.writelines (')')
 
-    def emit_decode (self, out):
+    def emit_decode (self, out, fused=False):
         name, slots = self.attrs
         types = self.subs
         out.writelines ('src = src.next(TAG.SEQUENCE, FLAG.STRUCTURED)')
         for i in range (len (slots)):
             slot_name = slots[i]
             slot_type = types[i]
-            slot_type.emit_decode (out)
+            slot_type.emit_decode (out, fused)
             out.writelines ('self.%s = v' % (psafe(slot_name),))
         out.writelines ('src.assert_done()')
 
@@ -84,16 +154,17 @@ class c_sequence_of (nodes.c_sequence_of):
         min_size, max_size, = self.attrs
         [seq_type] = self.subs
 
-    def emit_decode (self, out):
+    def emit_decode (self, out, fused=False):
         min_size, max_size, = self.attrs
         [seq_type] = self.subs
+        typecode = getattr (self, 'typecode', None)
         out.writelines (
             'src, save = src.next(TAG.SEQUENCE, FLAG.STRUCTURED), src',
-            'a = []',
+            "a = array('%s')" % (typecode,) if typecode else 'a = []',
             'while not src.done():'
         )
         with out.indent():
-            seq_type.emit_decode (out)
+            seq_type.emit_decode (out, fused)
             out.writelines ('a.append(v)')
         if min_size is not None and min_size > 0:
             out.writelines ('if len(a) < %d:' % (min_size,))
@@ -103,7 +174,10 @@ class c_sequence_of (nodes.c_sequence_of):
             out.writelines ('if len(a) > %d:' % (max_size,))
             with out.indent():
                 out.writelines ('raise ConstraintViolation(a)')
-        out.writelines ('v, src = a, save')
+        if getattr (self, 'compact', False) and not typecode:
+            out.writelines ('v, src = tuple(a), save')
+        else:
+            out.writelines ('v, src = a, save')
 
     def emit_encode (self, out, val):
         min_size, max_size, = self.attrs
@@ -120,7 +194,7 @@ class c_set_of (nodes.c_sequence_of):
         min_size, max_size, = self.attrs
         [item_type] = self.subs
 
-    def emit_decode (self, out):
+    def emit_decode (self, out, fused=False):
         min_size, max_size, = self.attrs
         [item_type] = self.subs
         out.writelines (
@@ -129,7 +203,7 @@ class c_set_of (nodes.c_sequence_of):
             'while not src.done():'
         )
         with out.indent():
-            item_type.emit_decode (out)
+            item_type.emit_decode (out, fused)
             out.writelines ('a.add (v)')
         out.writelines ("# check constraints")
         out.writelines ('v, src = a, save')
@@ -156,6 +230,8 @@ class c_choice (nodes.c_choice):
         pairs = []
         for i in range (len (slots)):
             pairs.append ((types[i].name(), tags[i]))
+        if getattr (self, 'slotted', False):
+            out.writelines ('__slots__ = ()')
         emit_pairs(out, 'tags_f', pairs)
         emit_pairs(out, 'tags_r', pairs, reversed=True)
 
@@ -166,6 +242,8 @@ class c_enumerated (nodes.c_enumerated):
         pairs = []
         for name, val in alts:
             pairs.append (("'%s'" % name, val))
+        if getattr (self, 'slotted', False):
+            out.writelines ('__slots__ = ()')
         emit_pairs(out, 'tags_f', pairs)
         emit_pairs(out, 'tags_r', pairs, reversed=True)
 
@@ -178,17 +256,75 @@ class c_defined (nodes.c_defined):
     def emit (self, out):
         name, max_size = self.attrs
 
-    def emit_decode (self, out):
+    def emit_decode (self, out, fused=False):
         type_name, max_size = self.attrs
-        out.writelines (
-            'v = %s()' % (type_name,),
-            'v._decode(src)',
-        )
+        if getattr (self, 'shared', False):
+            out.writelines ('v = %s.shared(src.next_ENUMERATED())' % (type_name,))
+        else:
+            out.writelines (
+                'v = %s()' % (type_name,),
+                'v._decode(src)',
+            )
 
     def emit_encode (self, out, val):
         type_name, max_size = self.attrs
         out.writelines ('%s._encode(dst)' % (val,))
 
+def array_typecode (min_size, max_size):
+    # the smallest array.array type that holds every INTEGER in [min_size, max_size].
+    if min_size is None or max_size is None:
+        return None
+    for typecode, lo, hi in (
+            ('B', 0, 0xff), ('b', -0x80, 0x7f),
+            ('H', 0, 0xffff), ('h', -0x8000, 0x7fff),
+            ('I', 0, 0xffffffff), ('i', -0x80000000, 0x7fffffff),
+    ):
+        if lo <= min_size and max_size <= hi:
+            return typecode
+    return None
+
+def use_compact (node, types):
+    # decode into less memory, for tinyber_gen --compact: a SEQUENCE OF
+    #  constrained INTEGERs becomes an array.array, any other SEQUENCE OF
+    #  a tuple, and a reference to an ENUMERATED type shares one instance
+    #  per value.  <types> maps type
+    #  names to their nodes.
+    if isinstance (node, c_sequence_of):
+        [seq_type] = node.subs
+        node.compact = True
+        if seq_type.kind == 'base_type' and seq_type.attrs[0] == 'INTEGER':
+            node.typecode = array_typecode (seq_type.attrs[1], seq_type.attrs[2])
+    elif node.kind == 'defined':
+        # (None for a type from another module)
+        target = types.get (node.name())
+        if target is not None and target.kind == 'enumerated':
+            node.shared = True
+    for sub in node.subs:
+        use_compact (sub, types)
+
+def has_fast_path (node):
+    # does decoding <node> touch a base type with a fused fast path?
+    #  (defined types are decoded by their own class, so don't look inside)
+    if isinstance (node, c_base_type):
+        return node.fast_lengths() is not None
+    elif isinstance (node, c_defined):
+        return False
+    else:
+        for sub in node.subs:
+            if has_fast_path (sub):
+                return True
+        return False
+
+def defined_names (node, names):
+    # the defined types <node> refers to, in order, into <names>.
+    if isinstance (node, c_defined):
+        if node.name() not in names:
+            names.append (node.name())
+    else:
+        for sub in node.subs:
+            defined_names (sub, names)
+    return names
+
 class PythonBackend:
 
     def __init__ (self, args, walker, module_name, path):
@@ -200,12 +336,24 @@ class PythonBackend:
 
     def gen_decoder (self, type_name, type_decl, node):
         # generate a decoder for a type assignment.
+        self.emit_decoder (node)
+        if has_fast_path (node):
+            # a second version with the fused fast paths, picked when the
+            #  class is built.  it only pays off over the pure-python Decoder,
+            #  the cython one is quicker through its own next_XXX() methods.
+            self.out.newline()
+            self.out.writelines ('if FUSED_DECODE:')
+            with self.out.indent():
+                self.emit_decoder (node, fused=True)
+
+    def emit_decoder (self, node, fused=False):
         self.out.newline()
         self.out.writelines ('def _decode(self, src):')
         with self.out.indent():
-            node.emit_decode (self.out)
-            # this line is unecessary (but harmless) on normal defined sequence types
-            self.out.writelines ('self.value = v')
+            node.emit_decode (self.out, fused)
+            # a SEQUENCE has no 'value' slot, just its fields.
+            if not isinstance (node, c_sequence):
+                self.out.writelines ('self.value = v')
 
     def gen_encoder (self, type_name, type_decl, node):
         # generate an encoder for a type assignment
@@ -221,7 +369,7 @@ class PythonBackend:
             self.gen_encoder (type_name, type_decl, node)
 
     def generate_code (self):
-        self.out = Writer (open (self.base_path + '_ber.py', 'w'), indent_size=4)
+        self.out = Writer (OutputFile (self.base_path + '_ber.py'), indent_size=4)
         command = os.path.basename(sys.argv[0])
         self.out.writelines (
             '# -*- Mode: Python -*-',
@@ -240,7 +388,23 @@ class PythonBackend:
                     self.out.writelines (line[:-1])
             self.out.writelines('', '# --- end codec.py ---')
 
+        # the classes we use from other modules.
+        names = getattr (self.args, 'module_names', None) or {}
+        for module_name in sorted (self.walker.imports):
+            self.out.writelines ('from %s_ber import %s' % (
+                names.get (module_name, module_name), ', '.join (self.walker.imports[module_name])
+            ))
+
+        compact = getattr (self.args, 'compact', False)
+        if compact:
+            self.out.writelines ('from array import array')
+            for (type_name, node, type_decl) in self.walker.defined_types:
+                # no __dict__ (or weak references) for any instance.
+                node.slotted = True
+                use_compact (node, self.walker.type_nodes)
+
         self.tag_assignments = self.walker.tag_assignments
+        lazy = getattr (self.args, 'lazy', False)
         # generate typedefs and prototypes.
         for (type_name, node, type_decl) in self.walker.defined_types:
             if hasattr (node, 'parent_class'):
@@ -249,11 +413,38 @@ class PythonBackend:
                 parent_class = 'ASN1'
             self.out.newline()
             self.out.newline()
+            if lazy:
+                # the class is built by LazyModule on first use.
+                self.out.writelines ('def _make_%s():' % (type_name,))
+                self.out.indent_level += 1
             self.out.writelines ('class %s(%s):' % (type_name, parent_class))
             with self.out.indent():
                 self.out.writelines (
                     'max_size = %d' % (node.max_size())
                 )
+                if parent_class == 'ASN1' and compact:
+                    self.out.writelines ("__slots__ = ('value',)")
                 node.emit (self.out)
                 self.gen_codec_funs (type_name, type_decl, node)
+            if lazy:
+                self.out.writelines ('return %s' % (type_name,))
+                self.out.indent_level -= 1
+        if lazy:
+            self.gen_lazy_module()
         self.out.close()
+
+    def gen_lazy_module (self):
+        # hand the makers to lazy_module(), with the (local) types each one uses.
+        imported = set()
+        for names in self.walker.imports.values():
+            imported.update (names)
+        self.out.newline()
+        self.out.newline()
+        self.out.writelines ('lazy_module(__name__, {')
+        with self.out.indent():
+            for (type_name, node, type_decl) in self.walker.defined_types:
+                uses = [name for name in defined_names (node, []) if name not in imported]
+                self.out.writelines ("'%s': (_make_%s, [%s])," % (
+                    type_name, type_name, ', '.join ("'%s'" % (name,) for name in uses)
+                ))
+        self.out.writelines ('})')
@@ -8,11 +8,25 @@ from asn1ate.sema import (
 
 class Walker (object):
 
-    def __init__(self, sema_module, nodes):
+    def __init__(self, sema_module, nodes, imported=None):
         self.sema_module = sema_module
         self.tag_assignments = {}
+        # [(type_name, node, type_decl), ...], in dependency order
         self.defined_types = []
+        # type_name -> node, and type_name -> node.max_size()
+        self.type_nodes = {}
+        self.max_sizes = {}
         self.nodes = nodes
+        # module_name -> walker, for the (already walked) modules this one
+        #  may refer to, and the types it does refer to: module_name -> [type_name, ...]
+        self.imported = imported or {}
+        self.imports = {}
+        # type_name -> module_name, from the IMPORTS clause.
+        self.import_from = {}
+        if getattr (sema_module, 'imports', None):
+            for module_ref, symbols in sema_module.imports.imports.items():
+                for symbol in symbols:
+                    self.import_from[symbol] = module_ref.module_ref.name
 
     def gen_ChoiceType (self, ob, name=None):
         alts = []
@@ -73,6 +87,7 @@ class Walker (object):
         else:
             node = self.gen_dispatch (type_decl)
         self.defined_types.append ((type_name, node, type_decl))
+        self.type_nodes[type_name] = node
 
     def gen_SimpleType (self, ob):
         if ob.constraint:
@@ -90,11 +105,33 @@ class Walker (object):
                 alts.append ((sub.identifier, None))
         return self.nodes.c_enumerated (name, alts)
 
+    def max_size_of (self, type_name):
+        if type_name not in self.max_sizes:
+            node = self.type_nodes.get (type_name)
+            if node is None:
+                raise ValueError (type_name)
+            # computed once per type, not once per reference.
+            self.max_sizes[type_name] = node.max_size()
+        return self.max_sizes[type_name]
+
     def gen_DefinedType (self, ob):
-        for type_name, node, type_decl in self.defined_types:
-            if ob.type_name == type_name:
-                return self.nodes.c_defined (ob.type_name, node.max_size())
-        raise ValueError (ob.type_name)
+        type_name = ob.type_name
+        if ob.module_ref is not None:
+            module_name = ob.module_ref.name
+        elif type_name not in self.type_nodes and type_name in self.import_from:
+            module_name = self.import_from[type_name]
+        else:
+            module_name = self.sema_module.name
+        if module_name == self.sema_module.name:
+            max_size = self.max_size_of (type_name)
+        elif module_name in self.imported:
+            max_size = self.imported[module_name].max_size_of (type_name)
+            names = self.imports.setdefault (module_name, [])
+            if type_name not in names:
+                names.append (type_name)
+        else:
+            raise ValueError ('%s.%s' % (module_name, type_name))
+        return self.nodes.c_defined (type_name, max_size)
 
     def gen_SetOfType (self, ob):
         min_size, max_size = self.constraint_get_min_max_size (ob.size_constraint)
@@ -30,10 +30,10 @@ class Writer:
         return IndentContext (self, True)
 
     def writelines (self, *lines):
+        indent = self.base_indent * self.indent_level
+        write = self.stream.write
         for line in lines:
-            self.stream.write (self.base_indent * self.indent_level)
-            self.stream.write (line)
-            self.stream.write ('\n')
+            write (indent + line + '\n')
 
     def newline (self):
         self.stream.write ('\n')
@@ -45,3 +45,28 @@ class Writer:
 
     def close (self):
         self.stream.close()
+
+def update_file (path, data):
+    # write <data> to <path>, unless it already holds exactly that: an
+    #  unchanged output keeps its mtime, and doesn't trigger a rebuild.
+    try:
+        with open (path) as f:
+            if f.read() == data:
+                return False
+    except IOError:
+        pass
+    with open (path, 'w') as f:
+        f.write (data)
+    return True
+
+class OutputFile:
+
+    # a stream for Writer that goes through update_file() when closed.
+
+    def __init__ (self, path):
+        self.path = path
+        self.parts = []
+        self.write = self.parts.append
+
+    def close (self):
+        update_file (self.path, ''.join (self.parts))